@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import time
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+from chatbot.chatbot_app import load_csv_data_as_dfs, load_knowledge_base_tables
+from chatbot.chatbot_app_markdown import format_dfs_as_markdown
+from chatbot.prompt_encoding import GuidAliaser, encode_tables, collect_guids
+from chatbot.token_estimator import estimate_tokens
+
+def main():
+    """
+    Compares the reference-data payload in the current JSON format, the `tabulate`
+    markdown format and the compact alias-based format, and checks that every
+    GUID round-trips through the aliases.
+    """
+    dfs = load_csv_data_as_dfs()
+    if not dfs:
+        print("No CSV data found. Aborting.")
+        return
+    records = load_knowledge_base_tables().tables
+
+    start = time.perf_counter()
+    json_payload = json.dumps(records, indent=None, ensure_ascii=False, default=dict)
+    json_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    markdown_payload = format_dfs_as_markdown(dfs)
+    markdown_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    aliaser = GuidAliaser(records)
+    compact_payload = encode_tables(records, aliaser)
+    compact_ms = (time.perf_counter() - start) * 1000
+
+    json_bytes = len(json_payload.encode("utf-8"))
+    json_tokens = estimate_tokens(json_payload)
+
+    print("\n--- Reference Data Encoding Benchmark ---")
+    print(f"{'Format':<10} | {'Bytes':>8} | {'~Tokens':>8} | {'vs JSON':>8} | {'Encode ms':>9}")
+    for name, payload, ms in (
+        ("json", json_payload, json_ms),
+        ("markdown", markdown_payload, markdown_ms),
+        ("compact", compact_payload, compact_ms),
+    ):
+        size = len(payload.encode("utf-8"))
+        tokens = estimate_tokens(payload)
+        print(f"{name:<10} | {size:>8} | {tokens:>8} | {100 * tokens / json_tokens:>7.1f}% | {ms:>9.1f}")
+    print("--------------------------")
+
+    guids = set(collect_guids(records))
+    decoded = aliaser.decode_text(compact_payload)
+    missing = [guid for guid in guids if guid not in decoded]
+    print(f"GUIDs aliased: {len(aliaser.alias_by_guid)} (of {len(guids)} distinct)")
+    print(f"Round-trip: {'OK' if not missing else f'{len(missing)} GUIDs lost'}")
+    print(f"Bytes saved vs JSON: {json_bytes - len(compact_payload.encode('utf-8'))}")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import statistics
+import time
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+# Keep every benchmark message in memory, as the app did before the history was
+# virtualized (all messages lived in st.session_state)
+os.environ.setdefault("SESSION_MAX_MESSAGES", "100000")
+os.environ.setdefault("SETTINGS_HOT_RELOAD", "0")
+
+from streamlit.testing.v1 import AppTest
+
+import chatbot.chatbot_app as app
+from chatbot.kpi_graph import KPI_TABLE
+from chatbot.session_store import Conversation, SessionStore, get_session_store
+
+CONVERSATION_LENGTHS = (10, 50, 100, 200, 400)
+RERUNS = 10
+
+def history_script(conversation_id: str, virtualized: bool):
+    """The history part of main(): every message (before) or render_history() (after)."""
+    import chatbot.chatbot_app as app
+    from chatbot.session_store import get_session_store
+
+    conversation = get_session_store().get(conversation_id)
+    if virtualized:
+        app.render_history(conversation)
+    else:
+        for message in conversation.messages:
+            app.render_message(message)
+
+def make_conversation(length: int) -> Conversation:
+    """
+    A conversation of `length` messages: questions about the KPIs of the bundled
+    configuration and their local answers, which include the C# formulas.
+    """
+    artifact = app.get_tenants().get()
+    engine = artifact.indexes["local_answers"]
+    names = [row["Name"] for row in artifact.indexes["knowledge_base"].tables[KPI_TABLE] if row.get("Name")]
+    conversation = Conversation(id=SessionStore.new_id(), tenant=app.get_tenants().default, artifact=artifact,
+                                chat_session=None)
+    turns = []
+    for name in names:
+        question = f"Яка формула {name}?"
+        answer = engine.answer(question)
+        if answer is not None:
+            turns.append(({"role": "user", "content": question},
+                          {"role": "assistant", "content": answer.text, "local": True}))
+    for index in range(length // 2):
+        conversation.messages.extend(turns[index % len(turns)])
+    return get_session_store().add(conversation)
+
+def time_reruns(at: AppTest) -> float:
+    """Median wall time of a script rerun, in milliseconds."""
+    at.run()
+    samples = []
+    for _ in range(RERUNS):
+        start = time.perf_counter()
+        at.run()
+        samples.append((time.perf_counter() - start) * 1000)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return statistics.median(samples)
+
+def main():
+    """
+    Rerun time of the chat history as a function of conversation length: every
+    message rendered on each rerun (before), the last HISTORY_RECENT_MESSAGES only
+    (after), and the same with one page of earlier messages shown (its markdown
+    comes from the rendered page cache after the first rerun).
+    """
+    print("\n--- Chat History Rendering Benchmark ---")
+    print(f"Recent messages: {app.HISTORY_RECENT_MESSAGES}, page size: {app.HISTORY_PAGE_SIZE}, "
+          f"median of {RERUNS} reruns")
+    print(f"{'messages':>8} {'chars':>9} {'before (ms)':>12} {'after (ms)':>11} {'+ page (ms)':>12}")
+    for length in CONVERSATION_LENGTHS:
+        conversation = make_conversation(length)
+        chars = sum(len(message["content"]) for message in conversation.messages)
+        before = time_reruns(AppTest.from_function(history_script, args=(conversation.id, False)))
+        at = AppTest.from_function(history_script, args=(conversation.id, True))
+        after = time_reruns(at)
+        paged = None
+        if at.toggle:
+            at.toggle(key="show_earlier_messages").set_value(True)
+            paged = time_reruns(at)
+        paged_text = f"{paged:12.1f}" if paged is not None else f"{'-':>12}"
+        print(f"{length:>8} {chars:>9} {before:12.1f} {after:11.1f} {paged_text}")
+        get_session_store().discard(conversation.id)
+    stats = app.get_rendered_pages().stats()
+    print(f"Rendered page cache: {stats['pages']} pages, {stats['hits']} hits, {stats['misses']} misses")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
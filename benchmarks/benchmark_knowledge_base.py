@@ -0,0 +1,69 @@
+import os
+import sys
+import statistics
+import subprocess
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+TABLES_PATH = os.path.join(SRC_PATH, "chatbot", "config_data", "settings_tables")
+RUNS = 5
+
+# Each snippet runs in a fresh interpreter, so import cost is part of the measurement.
+# It prints the wall time (s) to import, load and serialize the tables, and the peak RSS (KB).
+PANDAS_SNIPPET = """
+import time, resource, os, json
+start = time.perf_counter()
+import pandas as pd
+tables = {}
+for filename in sorted(os.listdir(TABLES_PATH)):
+    if filename.endswith(".csv"):
+        tables[filename] = json.loads(pd.read_csv(os.path.join(TABLES_PATH, filename)).to_json(orient="records"))
+payload = json.dumps(tables, ensure_ascii=False)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+KNOWLEDGE_BASE_SNIPPET = """
+import time, resource, sys, json
+start = time.perf_counter()
+sys.path.insert(0, SRC_PATH)
+from chatbot.knowledge_base import load_knowledge_base
+kb = load_knowledge_base(TABLES_PATH)
+payload = json.dumps(kb.tables, ensure_ascii=False, default=dict)
+print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+BASELINE_SNIPPET = """
+import resource
+print(0.0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def run_snippet(snippet: str):
+    code = f"TABLES_PATH = {TABLES_PATH!r}\nSRC_PATH = {SRC_PATH!r}\n" + snippet
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    seconds, rss_kb = result.stdout.split()
+    return float(seconds), int(rss_kb)
+
+def main():
+    """
+    Compares cold-start time and peak RSS of loading the settings tables with
+    pandas (the previous path) and with the stdlib knowledge base.
+    """
+    print("\n--- Knowledge Base Load Benchmark ---")
+    print(f"{RUNS} fresh interpreter runs per path (import + parse + serialize)")
+    _, baseline_rss = run_snippet(BASELINE_SNIPPET)
+    print(f"Bare interpreter peak RSS: {baseline_rss / 1024:.1f} MB")
+
+    for name, snippet in (("pandas", PANDAS_SNIPPET), ("knowledge_base", KNOWLEDGE_BASE_SNIPPET)):
+        try:
+            runs = [run_snippet(snippet) for _ in range(RUNS)]
+        except RuntimeError as e:
+            print(f"  - {name:<15} | skipped: {e}")
+            continue
+        seconds = statistics.median(r[0] for r in runs) * 1000
+        rss = statistics.median(r[1] for r in runs) / 1024
+        print(f"  - {name:<15} | median {seconds:8.1f} ms | peak RSS {rss:6.1f} MB (+{rss - baseline_rss / 1024:.1f} MB)")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
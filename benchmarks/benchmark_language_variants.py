@@ -0,0 +1,90 @@
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import time
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+# The benchmark tenant lives in a temporary directory; nothing to watch
+os.environ.setdefault("SETTINGS_HOT_RELOAD", "0")
+
+import chatbot.chatbot_app as app
+from chatbot.kpi_graph import LOCALIZATION_TABLE
+from chatbot.prompt_languages import LanguageVariantCache, localization_for_language
+from chatbot.tenants import Tenant, TenantRegistry, TENANT_PROMPT_FILE, TENANT_TABLES_DIR
+
+# The bundled CustomLocalization only has en rows. The synthetic tenant gets
+# translations of a share of the KPIs in each of these languages, as a customer
+# with several UI languages would have
+LANGUAGE_COVERAGE = {"uk": 1.0, "cs": 0.9, "sk": 0.6, "pl": 0.3}
+LOOKUPS = 1000
+
+def make_multilingual_tenant(root: str) -> Tenant:
+    """A copy of the bundled configuration whose localization table also has the LANGUAGE_COVERAGE languages."""
+    tenant_dir = os.path.join(root, "multilingual")
+    os.makedirs(tenant_dir)
+    shutil.copy(app.PROMPT_FILE_PATH, os.path.join(tenant_dir, TENANT_PROMPT_FILE))
+    tables_dir = os.path.join(tenant_dir, TENANT_TABLES_DIR)
+    shutil.copytree(app.SETTINGS_TABLES_PATH, tables_dir)
+
+    path = os.path.join(tables_dir, LOCALIZATION_TABLE)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        columns, rows = reader.fieldnames, list(reader)
+    english = [row for row in rows if row["LocalizationCode"] == "en"]
+    for language, coverage in LANGUAGE_COVERAGE.items():
+        for index, row in enumerate(english[:int(len(english) * coverage)]):
+            rows.append(dict(row, Id=f"{language}-{index:05d}", LocalizationCode=language,
+                             VALUE=f"{row['VALUE']} ({language})"))
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return Tenant("multilingual", os.path.join(tenant_dir, TENANT_PROMPT_FILE), tables_dir)
+
+def main():
+    """
+    Builds a language-scoped prompt variant per UI language of a multilingual
+    tenant and compares each with the full prompt (every language's localization
+    rows): prompt size and estimated tokens saved, the one-off cost of building a
+    variant, and the cost of the cached lookup every later session pays.
+    """
+    print("\n--- Language-Scoped Prompt Variants Benchmark ---")
+    print(f"Prompt variant: {app.PROMPT_VARIANT}")
+    root = tempfile.mkdtemp()
+    try:
+        tenant = make_multilingual_tenant(root)
+        registry = TenantRegistry({tenant.name: tenant}, app.load_tenant, default=tenant.name)
+        artifact = registry.get(tenant.name)
+        languages = app.tenant_languages(artifact)
+        estimator = app.get_token_estimator()
+        full_tokens = estimator.estimate(artifact.text)
+        localization = artifact.indexes["knowledge_base"].tables[LOCALIZATION_TABLE]
+        localization_rows = len(localization)
+        print(f"Full prompt: {len(artifact.text)} chars, ~{full_tokens} tokens, "
+              f"{localization_rows} localization rows in {len(languages)} languages ({', '.join(languages)})")
+
+        variants = LanguageVariantCache(app.build_language_variant, count_tokens=estimator.estimate)
+        for language in languages:
+            variants.get(tenant.name, artifact, language)
+            start = time.perf_counter()
+            for _ in range(LOOKUPS):
+                variants.get(tenant.name, artifact, language)
+            lookup_us = (time.perf_counter() - start) / LOOKUPS * 1e6
+            report = variants.stats()["variants"][-1]
+            rows = len(localization_for_language(localization, language))
+            print(f"  - {language}: {report['chars']} chars ({100 * report['chars_saved'] / report['full_chars']:.1f}% "
+                  f"smaller), ~{report['tokens']} tokens ({report['tokens_saved']} saved), "
+                  f"build {report['build_seconds'] * 1000:.1f} ms, cached lookup {lookup_us:.1f} µs "
+                  f"({rows} localization rows)")
+        stats = variants.stats()
+        print(f"Variant cache: {stats['builds']} builds, {stats['hits']} hits")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import time
+import statistics
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+import chatbot.chatbot_app as app
+from chatbot.prompt_cache import get_prompt_cache
+from chatbot.stub_client import StubModelClient
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "replay_corpus.json")
+
+# Typical lookup questions, on top of the (mostly explanatory) replay corpus
+LOOKUP_QUESTIONS = [
+    "Який ID у kpi_Promo_Uplift_automatically?",
+    "Який тип даних у kpi_SentToApprove?",
+    "Яка формула kpi_ActNetRevenueSKU?",
+    "Звідки читається kpi_other_baseline?",
+    "Яка умова читання у kpi_WHS_Off_invoice?",
+    "Який тип і область застосування kpi_Manual_Adjustment_VBB?",
+    "Яка локалізована назва kpi_NumberOfPromotionsL9?",
+    "Яка формула Incremental Promo Volume?",
+    "Який тип даних у Sell Out?",
+    "What is the data type of kpi_ForecastPromoVolume?",
+    "What is the formula of kpi_SalesMargin_L9?",
+    "Яке джерело даних у kpi_factNumberOfPromoRead?",
+]
+
+def simulated_model_seconds(client, system_prompt, question) -> float:
+    """The stub's simulated latency (time to first token + streaming) for one first-turn question."""
+    slept = []
+    client._sleep = slept.append
+    session = client.start_chat_session(system_prompt, prompt_hash="benchmark")
+    for _ in session.send_message(question, stream=True):
+        pass
+    return sum(slept)
+
+def run(label, questions, engine, client, system_prompt):
+    answered, local_ms, saved = 0, [], 0.0
+    for question in questions:
+        answer = engine.answer(question)
+        if answer is None:
+            continue
+        answered += 1
+        local_ms.append(answer.seconds * 1000)
+        saved += max(0.0, simulated_model_seconds(client, system_prompt, question) - answer.seconds)
+    print(f"  - {label:<16} | {answered}/{len(questions)} answered locally ({answered / len(questions):.0%})"
+          + (f" | local p50 {statistics.median(local_ms):.3f} ms, max {max(local_ms):.3f} ms"
+             f" | model time saved {saved:.1f} s" if local_ms else ""))
+
+def main():
+    """
+    Measures how many questions the local answer engine handles without the model
+    (coverage), how long a local answer takes, and the model latency it saves
+    (simulated by the stub client with its default Gemini-like timings).
+    """
+    print("\n--- Local Answer Benchmark ---")
+    prompt_cache = get_prompt_cache(app.PROMPT_FILE_PATH, app.SETTINGS_TABLES_PATH, variant=app.PROMPT_VARIANT)
+    artifact = prompt_cache.get(app.build_final_prompt, incremental=True)
+    if artifact is None:
+        print("Failed to build the system prompt. Aborting.")
+        return
+    engine = artifact.indexes["local_answers"]
+    client = StubModelClient(seed=0)
+
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        corpus = [turn for conversation in json.load(f) for turn in conversation["turns"]]
+    run("replay corpus", corpus, engine, client, artifact.text)
+    run("lookup questions", LOOKUP_QUESTIONS, engine, client, artifact.text)
+
+    start = time.perf_counter()
+    for _ in range(100):
+        for question in corpus + LOOKUP_QUESTIONS:
+            engine.answer(question)
+    per_question_us = (time.perf_counter() - start) / (100 * len(corpus + LOOKUP_QUESTIONS)) * 1e6
+    print(f"  - Mean decision time (answered or not): {per_question_us:.1f} µs per question")
+    print(f"  - Fall-through reasons: { {k: v for k, v in engine.stats().items() if k.startswith('skipped')} }")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import os
+import sys
+import logging
+import statistics
+import tempfile
+import time
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+from chatbot.logger_setup import AsyncLogWriter, BatchedRotatingFileHandler, PayloadPolicy, attach_handler
+
+CALLS = 5000
+# A typical model answer logged with "LLM response"
+PAYLOAD = "Відповідь моделі про KPI з формулою та поясненням. " * 120
+
+def make_formatter() -> logging.Formatter:
+    try:
+        from pythonjsonlogger import jsonlogger
+        return jsonlogger.JsonFormatter('%(asctime)s %(name)s %(levelname)s %(message)s %(session_id)s',
+                                        json_ensure_ascii=False)
+    except ImportError:
+        return logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s %(session_id)s %(payload)s')
+
+def run(mode: str, logs_dir: str, max_payload_chars: int) -> dict:
+    logger = logging.getLogger(f"benchmark_{mode}_{max_payload_chars}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    log_path = os.path.join(logs_dir, f"{logger.name}.log")
+    handler = BatchedRotatingFileHandler(log_path, maxBytes=10*1024*1024, backupCount=100, encoding="utf-8")
+    handler.setFormatter(make_formatter())
+    logger.addFilter(PayloadPolicy(max_chars=max_payload_chars))
+    writer = AsyncLogWriter(max_queue_size=CALLS * 2) if mode == "async" else None
+    if writer:
+        writer.start()
+    attach_handler(logger, handler, mode=mode, writer=writer)
+
+    timings = []
+    for i in range(CALLS):
+        start = time.perf_counter()
+        logger.info("LLM response", extra={"session_id": f"s{i % 50}", "payload": PAYLOAD, "usage": "{}"})
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    if writer:
+        writer.stop()
+    handler.close()
+    drain_ms = (time.perf_counter() - start) * 1000
+
+    lines = 0
+    for name in os.listdir(logs_dir):
+        if name.startswith(logger.name):
+            with open(os.path.join(logs_dir, name), encoding="utf-8") as f:
+                lines += sum(1 for _ in f)
+    timings.sort()
+    return {
+        "mean_us": statistics.mean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6,
+        "drain_ms": drain_ms,
+        "written": lines,
+        "batches": writer.stats["batches"] if writer else CALLS,
+    }
+
+def main():
+    """
+    Measures the per-call cost of logging an "LLM response" record on the request
+    thread: synchronous file writes vs the queue-based background writer, with and
+    without payload truncation. Also checks that shutdown writes every record.
+    """
+    print("\n--- Logging Overhead Benchmark ---")
+    formatter_name = type(make_formatter()).__name__
+    print(f"{CALLS} calls per mode, {len(PAYLOAD)}-character payload, {formatter_name}")
+    with tempfile.TemporaryDirectory() as logs_dir:
+        for mode, max_chars in (("sync", 0), ("sync", 2000), ("async", 0), ("async", 2000)):
+            r = run(mode, logs_dir, max_chars)
+            label = f"{mode}, payload {'full' if not max_chars else f'<= {max_chars}'}"
+            print(f"  - {label:<24} | mean {r['mean_us']:7.1f} us | p50 {r['p50_us']:7.1f} us | "
+                  f"p99 {r['p99_us']:8.1f} us | shutdown {r['drain_ms']:6.1f} ms | "
+                  f"{r['written']}/{CALLS} written in {r['batches']} writes")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
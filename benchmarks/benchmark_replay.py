@@ -0,0 +1,193 @@
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import resource
+import statistics
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+import chatbot.chatbot_app as app
+from chatbot.metrics import get_metrics, MODEL_CALL, TIME_TO_FIRST_TOKEN
+from chatbot.prompt_cache import get_prompt_cache
+from chatbot.stub_client import StubModelClient
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "replay_corpus.json")
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(__file__), "replay_baseline.json")
+
+# Metric -> (direction, tolerance kind). "up" means a larger value is a regression.
+CHECKED_METRICS = {
+    "throughput_turns_per_s": ("down", "timing"),
+    "latency_p50_ms": ("up", "timing"),
+    "latency_p95_ms": ("up", "timing"),
+    "latency_p99_ms": ("up", "timing"),
+    "ttft_p95_ms": ("up", "timing"),
+    "system_prompt_bytes": ("up", "payload"),
+    "message_bytes_mean": ("up", "payload"),
+    "history_tokens_mean": ("up", "payload"),
+    "prompt_tokens_mean": ("up", "payload"),
+    "peak_rss_mb": ("up", "memory"),
+}
+# Payload sizes are deterministic with the stub client; only timings and memory vary between runs
+PAYLOAD_TOLERANCE = 0.01
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def replay_conversation(client, artifact, turns, results, lock):
+    """
+    Runs one conversation through the model path of chatbot_app.answer_question():
+    message composition, the history budget, streaming and answer decoding. Model
+    routing, the request scheduler, the answer cache and local answers are left
+    out, so every turn reaches the model.
+    """
+    session = client.start_chat_session(artifact.text, prompt_hash=artifact.content_hash)
+    metrics = get_metrics()
+    for question in turns:
+        start = time.perf_counter()
+        message = app.compose_user_message(question, artifact)
+        history_report = app.apply_history_budget(session)
+        response = session.send_message(message, stream=True)
+        ttft = None
+        text = ""
+        for chunk in response:
+            chunk_text = app.get_chunk_text(chunk)
+            if chunk_text and ttft is None:
+                ttft = time.perf_counter() - start
+            text += chunk_text
+        answer = app.decode_answer(text, artifact)
+        latency = time.perf_counter() - start
+        usage = response.usage_metadata
+        metrics.observe(TIME_TO_FIRST_TOKEN, ttft or latency, None, source="replay")
+        metrics.observe(MODEL_CALL, latency, None, source="replay")
+        metrics.record_usage(None, usage, history_tokens=history_report.history_tokens_sent, source="replay")
+        app.log_info("LLM response", payload=answer, usage=str(usage), ttft_seconds=ttft,
+                     generation_seconds=latency, history_tokens_sent=history_report.history_tokens_sent)
+        with lock:
+            results.append({
+                "latency": latency,
+                "ttft": ttft or latency,
+                "message_bytes": len(message.encode("utf-8")),
+                "answer_bytes": len(answer.encode("utf-8")),
+                "history_tokens": history_report.history_tokens_sent,
+                "prompt_tokens": usage.prompt_token_count,
+            })
+
+def run_replay(args) -> dict:
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        conversations = [c["turns"] for c in json.load(f)] * args.repeat
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    prompt_cache = get_prompt_cache(app.PROMPT_FILE_PATH, app.SETTINGS_TABLES_PATH, variant=app.PROMPT_VARIANT)
+    prompt_cache.invalidate()
+    artifact = prompt_cache.get(app.build_final_prompt, incremental=True)
+    if artifact is None:
+        raise RuntimeError("The system prompt could not be built")
+
+    client = StubModelClient(seed=args.seed, time_scale=args.time_scale)
+    results, lock = [], threading.Lock()
+    start = time.perf_counter()
+    # The app prints per-turn diagnostics; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = [executor.submit(replay_conversation, client, artifact, turns, results, lock)
+                       for turns in conversations]
+            for future in futures:
+                future.result()
+    wall_seconds = time.perf_counter() - start
+
+    latencies = [r["latency"] * 1000 for r in results]
+    return {
+        "config": {"prompt_variant": app.PROMPT_VARIANT, "workers": args.workers,
+                   "time_scale": args.time_scale, "seed": args.seed, "repeat": args.repeat},
+        "conversations": len(conversations),
+        "turns": len(results),
+        "wall_seconds": wall_seconds,
+        "prompt_build_ms": artifact.build_seconds * 1000,
+        "throughput_turns_per_s": len(results) / wall_seconds,
+        "latency_p50_ms": percentile(latencies, 0.5),
+        "latency_p95_ms": percentile(latencies, 0.95),
+        "latency_p99_ms": percentile(latencies, 0.99),
+        "ttft_p95_ms": percentile([r["ttft"] * 1000 for r in results], 0.95),
+        "system_prompt_bytes": len(artifact.text.encode("utf-8")),
+        "message_bytes_mean": statistics.mean(r["message_bytes"] for r in results),
+        "message_bytes_max": max(r["message_bytes"] for r in results),
+        "answer_bytes_mean": statistics.mean(r["answer_bytes"] for r in results),
+        "history_tokens_mean": statistics.mean(r["history_tokens"] for r in results),
+        "prompt_tokens_mean": statistics.mean(r["prompt_tokens"] for r in results),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_growth_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024,
+    }
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a description of every checked metric that regressed beyond its tolerance."""
+    regressions = []
+    for metric, (direction, kind) in CHECKED_METRICS.items():
+        if metric not in baseline:
+            continue
+        allowed = PAYLOAD_TOLERANCE if kind == "payload" else tolerance
+        old, new = baseline[metric], report[metric]
+        if direction == "up" and new > old * (1 + allowed) or direction == "down" and new < old * (1 - allowed):
+            regressions.append(f"{metric}: {old:.2f} -> {new:.2f} (allowed {allowed:.0%})")
+    return regressions
+
+def main():
+    """
+    Replays a corpus of PromoTool conversations through the app pipeline (prompt
+    build, message composition, history budget, streamed send, decoding, logging
+    and metrics) against the deterministic stub client, then reports throughput,
+    latency percentiles, payload sizes and memory. With --baseline, exits with
+    status 1 if a metric regressed beyond the tolerance.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--workers", type=int, default=4, help="Conversations replayed in parallel")
+    parser.add_argument("--repeat", type=int, default=10, help="How many times the corpus is replayed")
+    parser.add_argument("--time-scale", type=float, default=0.0,
+                        help="Multiplier for the stub's simulated model latency (0 = app overhead only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", nargs="?", const=DEFAULT_BASELINE_PATH,
+                        help="Compare with a stored baseline and fail on regressions")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE_PATH,
+                        help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative change for timing and memory metrics")
+    args = parser.parse_args()
+
+    report = run_replay(args)
+    print("\n--- Replay Benchmark ---")
+    print(f"{report['turns']} turns in {report['conversations']} conversations, config {report['config']}")
+    for key, value in report.items():
+        if key not in ("config", "conversations", "turns"):
+            print(f"  - {key:<24} {value:12.2f}")
+    print("--------------------------")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Warning: baseline config {baseline.get('config')} differs from this run")
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import statistics
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+from chatbot.chatbot_app import load_and_enrich_system_prompt, load_knowledge_base_tables, RETRIEVAL_DATA_NOTE
+from chatbot.kpi_retrieval import KpiRetriever
+from chatbot.token_estimator import estimate_tokens
+
+SAMPLE_QUESTIONS = [
+    "Як працює kpi_CombinationToRecommendInOutOfGuideline?",
+    "Як розраховується kpi_index?",
+    "Звідки береться базовий обсяг продажів (baseline)?",
+    "Які KPI передають дані у Forecast?",
+    "Що таке SPL price automatically і де він використовується?",
+    "Як розраховується маржа продажів?",
+    "Які правила умовного форматування є для ціни на полиці?",
+    "Explain the promo uplift KPI",
+]
+
+def main():
+    """
+    Compares the full reference-data dump with retrieval-based context selection:
+    prompt bytes and estimated tokens per request, and retrieval latency.
+    """
+    base_prompt = load_and_enrich_system_prompt()
+    if not base_prompt:
+        print("Failed to load the system prompt. Aborting.")
+        return
+    records = load_knowledge_base_tables().tables
+
+    start = time.perf_counter()
+    retriever = KpiRetriever(records)
+    index_build_ms = (time.perf_counter() - start) * 1000
+
+    header = "\n\n---\n# Reference Data (JSON Format)\n\n"
+    full_prompt = base_prompt + header + json.dumps(records, indent=None, ensure_ascii=False, default=dict)
+    retrieval_prompt = base_prompt + header + RETRIEVAL_DATA_NOTE
+
+    print("\n--- Retrieval Benchmark ---")
+    print(f"Index build time: {index_build_ms:.1f} ms ({len(retriever.kpis_by_id)} KPIs)")
+    print(f"Full mode system prompt: {len(full_prompt.encode('utf-8'))} bytes, ~{estimate_tokens(full_prompt)} tokens")
+    print(f"Retrieval mode system prompt: {len(retrieval_prompt.encode('utf-8'))} bytes, ~{estimate_tokens(retrieval_prompt)} tokens")
+    print("\n--- Per-question Context ---")
+
+    latencies = []
+    context_bytes = []
+    context_tokens = []
+    for question in SAMPLE_QUESTIONS:
+        start = time.perf_counter()
+        result = retriever.select_context(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+        context = result.to_json()
+        context_bytes.append(len(context.encode("utf-8")))
+        context_tokens.append(estimate_tokens(context))
+        top = retriever.kpi_name(result.hits[0][0]) if result.hits else "-"
+        print(f"  - {question[:60]:<60} | {len(result.kpi_ids):>3} KPIs | {context_bytes[-1]:>7} bytes | top: {top}")
+
+    full_bytes = len(full_prompt.encode("utf-8"))
+    avg_request_bytes = len(retrieval_prompt.encode("utf-8")) + statistics.mean(context_bytes)
+    print("--------------------------")
+    print(f"Retrieval latency: mean {statistics.mean(latencies):.2f} ms, max {max(latencies):.2f} ms")
+    print(f"Average request payload: {avg_request_bytes:.0f} bytes (full mode: {full_bytes} bytes)")
+    avg_request_tokens = estimate_tokens(retrieval_prompt) + statistics.mean(context_tokens)
+    print(f"Estimated tokens per request: ~{avg_request_tokens:.0f} (full mode: ~{estimate_tokens(full_prompt)})")
+    print(f"Payload reduction: {100 * (1 - avg_request_bytes / full_bytes):.1f}%")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import statistics
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+from chatbot.knowledge_base import load_knowledge_base
+from chatbot.kpi_retrieval import KpiRetriever
+from chatbot.metrics import MetricsRegistry, MODEL_CALL, tiered
+from chatbot.model_client import FAST_TIER, PRO_TIER
+from chatbot.model_router import ModelRouter, TieredChatSession
+from chatbot.stub_client import StubModelClient
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "replay_corpus.json")
+TABLES_PATH = os.path.join(SRC_PATH, "chatbot", "config_data", "settings_tables")
+SYSTEM_PROMPT = "Ви — асистент PromoTool. " * 2000
+
+# Flash-like and pro-like latency profiles of the stub (seconds, tokens per second)
+TIER_PROFILES = {FAST_TIER: {"ttft_seconds": 0.3, "tokens_per_second": 200.0},
+                 PRO_TIER: {"ttft_seconds": 0.8, "tokens_per_second": 80.0}}
+
+def make_client(tier, slept):
+    # Simulated delays are collected instead of slept, so the benchmark runs instantly
+    return StubModelClient(seed=0, sleep=slept.append, model_name=f"stub-{tier}", **TIER_PROFILES[tier])
+
+def replay(label, router, conversations, retriever):
+    metrics = MetricsRegistry()
+    decision_us = []
+    for turns in conversations:
+        slept = []
+        session = TieredChatSession(lambda tier: make_client(tier, slept), SYSTEM_PROMPT, prompt_hash="benchmark")
+        for question in turns:
+            start = time.perf_counter()
+            decision = router.route(question, len(retriever.mentioned_kpis(question)), len(session.history) // 2)
+            decision_us.append((time.perf_counter() - start) * 1e6)
+            session.use(decision.tier)
+            slept.clear()
+            response = session.send_message(question, stream=True)
+            for _ in response:
+                pass
+            metrics.observe(MODEL_CALL, sum(slept))
+            metrics.observe(tiered(MODEL_CALL, decision.tier), sum(slept))
+            metrics.record_usage(None, response.usage_metadata, tier=decision.tier)
+
+    summary = metrics.process_summary()
+    overall = summary["spans"][MODEL_CALL]
+    print(f"  - {label:<9} | {overall['count']} turns | simulated model time {overall['sum']:6.1f} s | "
+          f"p50 {overall['p50']:.2f} s, p95 {overall['p95']:.2f} s | routing {statistics.mean(decision_us):.1f} µs")
+    for tier in (FAST_TIER, PRO_TIER):
+        span = summary["spans"].get(tiered(MODEL_CALL, tier))
+        tokens = summary["tokens"].get(tiered("total", tier))
+        if span:
+            print(f"      {tier:<4}: {span['count']:3d} turns, p50 {span['p50']:.2f} s, p95 {span['p95']:.2f} s, "
+                  f"mean total tokens {tokens['sum'] / tokens['count']:.0f}")
+    return overall["sum"]
+
+def main():
+    """
+    Replays the conversation corpus with every question on the pro model and with
+    the local router choosing between the fast and the pro tier, and reports the
+    per-tier split, simulated model latency (stub tier profiles), token usage,
+    the reasons behind pro choices and the cost of the routing decision itself.
+    """
+    print("\n--- Model Routing Benchmark ---")
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        conversations = [c["turns"] for c in json.load(f)]
+    retriever = KpiRetriever(load_knowledge_base(TABLES_PATH).tables)
+
+    pro_seconds = replay("pro only", ModelRouter(mode=PRO_TIER), conversations, retriever)
+    router = ModelRouter()
+    routed_seconds = replay("routed", router, conversations, retriever)
+    print(f"  - Simulated model time saved by routing: {pro_seconds - routed_seconds:.1f} s "
+          f"({1 - routed_seconds / pro_seconds:.0%})")
+    print(f"  - Routing counters: {router.stats()}")
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
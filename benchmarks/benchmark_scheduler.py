@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import random
+import statistics
+import threading
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+from chatbot.metrics import MetricsRegistry, SCHEDULER_WAIT
+from chatbot.request_scheduler import RequestScheduler
+from chatbot.stub_client import StubModelClient
+
+SYSTEM_PROMPT = "Ви — асистент PromoTool. " * 2000
+ERROR_RATE = 0.2
+TIME_SCALE = 0.02
+# session id -> (parallel senders, questions per sender): one heavy session sending
+# many questions at once (like a batch job) and several light ones asking a few
+WORKLOAD = {"heavy": (6, 4), **{f"light-{i}": (1, 3) for i in range(8)}}
+
+def run_sender(send, session_id: str, count: int, results: dict):
+    outcomes = results.setdefault(session_id, [])
+    for i in range(count):
+        start = time.perf_counter()
+        try:
+            response = send(session_id, f"Як розраховується kpi_{session_id}_{i}?")
+            for _ in response:
+                pass
+            outcomes.append(("ok", time.perf_counter() - start))
+        except Exception as e:
+            outcomes.append((type(e).__name__, time.perf_counter() - start))
+
+def run(label: str, make_send):
+    client = StubModelClient(seed=1, time_scale=TIME_SCALE, error_rate=ERROR_RATE)
+    send, scheduler, metrics = make_send(client)
+    results, threads = {}, []
+    start = time.perf_counter()
+    for session_id, (senders, count) in WORKLOAD.items():
+        results[session_id] = []
+        for _ in range(senders):
+            thread = threading.Thread(target=run_sender, args=(send, session_id, count, results))
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    outcomes = [o for session in results.values() for o in session]
+    ok = sum(1 for status, _ in outcomes if status == "ok")
+    light = [seconds for sid, session in results.items() if sid != "heavy" for _, seconds in session]
+    heavy = [seconds for _, seconds in results["heavy"]]
+    print(f"  - {label:<10} | {ok}/{len(outcomes)} succeeded | {client.injected_errors} injected 429s | "
+          f"wall {wall:5.2f} s | mean latency light {statistics.mean(light):5.2f} s, heavy {statistics.mean(heavy):5.2f} s")
+    if scheduler is not None:
+        snapshot = scheduler.snapshot()
+        wait = metrics.process_summary()["spans"].get(SCHEDULER_WAIT, {})
+        print(f"    retries {snapshot['retries']}, failures {snapshot['failures']}, timeouts {snapshot['timeouts']}, "
+              f"max queue depth {snapshot['max_queue_depth']}, wait p50 {wait.get('p50', 0):.3f} s, "
+              f"p95 {wait.get('p95', 0):.3f} s, p99 {wait.get('p99', 0):.3f} s")
+
+def direct(client):
+    def send(session_id, message):
+        session = client.start_chat_session(SYSTEM_PROMPT, "hash")
+        return session.send_message(message, stream=True)
+    return send, None, None
+
+def scheduled(client):
+    metrics = MetricsRegistry()
+    scheduler = RequestScheduler(requests_per_minute=600, tokens_per_minute=60_000_000, max_concurrency=4,
+                                 max_retries=5, backoff_base_seconds=0.05, backoff_max_seconds=1.0,
+                                 metrics=metrics, rng=random.Random(0))
+    def send(session_id, message):
+        session = client.start_chat_session(SYSTEM_PROMPT, "hash")
+        return scheduler.send_message(session_id, session, message, estimated_tokens=8000)
+    return send, scheduler, metrics
+
+def main():
+    """
+    Sends a bursty multi-session workload to the stub client with injected 429s,
+    once with direct calls and once through the RequestScheduler, and reports
+    success rate, retries, queue depth, wait-time percentiles and how long the
+    light sessions wait next to a heavy one (fair queuing).
+    """
+    print("\n--- Request Scheduler Benchmark ---")
+    total = sum(senders * count for senders, count in WORKLOAD.values())
+    print(f"{total} requests from {len(WORKLOAD)} sessions, {ERROR_RATE:.0%} injected 429 rate")
+    run("direct", direct)
+    run("scheduled", scheduled)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import sys
+import statistics
+import subprocess
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+RUNS = 5
+# Network-bound steps the stub does not simulate: creating the Gemini client (SDK
+# import and configuration) and the remote count_tokens call of TOKEN_COUNT_VERIFY
+CLIENT_SETUP_SECONDS = 1.0
+COUNT_TOKENS_SECONDS = 0.4
+
+# Each snippet runs in a fresh interpreter (the caches are per process) and prints
+# the time until the UI can render and the time until the chat session is ready.
+SETUP_SNIPPET = """
+import atexit, os, shutil, sys, tempfile, time
+from concurrent.futures import Future
+os.environ.update(MODEL_CLIENT="stub", TOKEN_COUNT_VERIFY="1", SETTINGS_HOT_RELOAD="0")
+sys.path.insert(0, SRC_PATH)
+import chatbot.chatbot_app as app
+
+# The stub's token counts and the prompt copy must not reach the tracked files
+output_dir = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, output_dir, True)
+app.FINAL_PROMPT_OUTPUT_PATH = os.path.join(output_dir, "final_promt.md")
+app.get_token_estimator().calibration_path = os.path.join(output_dir, "token_calibration.json")
+
+get_model_client = app.get_model_client
+def slow_model_client(*args, **kwargs):
+    client = get_model_client(*args, **kwargs)
+    if not getattr(client, "benchmark_ready", False):
+        time.sleep(CLIENT_SETUP_SECONDS)
+        count_tokens = client.count_tokens
+        client.count_tokens = lambda text: (time.sleep(COUNT_TOKENS_SECONDS), count_tokens(text))[1]
+        client.benchmark_ready = True
+    return client
+app.get_model_client = slow_model_client
+if {warm}:
+    app.warm_up()
+tenant = app.get_tenants().default
+"""
+
+# Before: everything ran inside the script run, before the first render. The
+# build wrote the prompt copy itself, so background tasks run inline; the prompt
+# token count was the remote count when TOKEN_COUNT_VERIFY was set.
+BEFORE_SNIPPET = SETUP_SNIPPET + """
+class InlineExecutor:
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
+app.get_background_executor = InlineExecutor
+
+start = time.perf_counter()
+client = app.get_model_client()
+artifact = app.get_tenants().get(tenant)
+app.get_token_estimator().verify(artifact.text, label=f"system_prompt:{{artifact.content_hash[:12]}}",
+                                 counter=client.count_tokens)
+chat_session = app.new_chat_session(artifact)
+ready = time.perf_counter() - start
+print("RESULT", ready, ready)
+"""
+
+# After: the script run only creates the conversation; setup and diagnostics run in the background
+AFTER_SNIPPET = SETUP_SNIPPET + """
+start = time.perf_counter()
+conversation = app.start_conversation(tenant)
+interactive = time.perf_counter() - start
+conversation.session_ready.result()
+print("RESULT", interactive, time.perf_counter() - start)
+"""
+
+def run_snippet(snippet: str, warm: bool):
+    code = (f"SRC_PATH = {SRC_PATH!r}\nCLIENT_SETUP_SECONDS = {CLIENT_SETUP_SECONDS}\n"
+            f"COUNT_TOKENS_SECONDS = {COUNT_TOKENS_SECONDS}\n" + snippet.format(warm=warm))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    # Background tasks may print after the measurement
+    _, interactive, ready = next(line for line in result.stdout.splitlines() if line.startswith("RESULT")).split()
+    return float(interactive), float(ready)
+
+def report(label: str, snippet: str, warm: bool):
+    try:
+        timings = [run_snippet(snippet, warm) for _ in range(RUNS)]
+    except RuntimeError as e:
+        print(f"  - {label:<24} | skipped: {e}")
+        return
+    interactive = statistics.median(t[0] for t in timings)
+    ready = statistics.median(t[1] for t in timings)
+    print(f"  - {label:<24} | interactive {interactive * 1000:8.1f} ms | chat session ready {ready * 1000:8.1f} ms")
+
+def main():
+    """
+    Measures the time-to-interactive of a new browser session: how long the first
+    script run is blocked before the page and the chat input render, and when the
+    chat session is ready for the first model question. Synchronous setup (before)
+    vs. setup on the background executor (after), for a cold process and after the
+    server warm-up, with the stub client plus a simulated client setup
+    (CLIENT_SETUP_SECONDS) and remote token count (COUNT_TOKENS_SECONDS).
+    """
+    print("\n--- Session Initialization Benchmark ---")
+    print(f"{RUNS} fresh interpreter runs per measurement (median); client setup {CLIENT_SETUP_SECONDS:.1f} s, "
+          f"count_tokens {COUNT_TOKENS_SECONDS:.1f} s")
+    for warm in (False, True):
+        print(f"\n{'After warm-up' if warm else 'Cold process'}:")
+        report("before (synchronous)", BEFORE_SNIPPET, warm)
+        report("after (background)", AFTER_SNIPPET, warm)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+import chatbot.chatbot_app as app
+from chatbot.history_manager import HistoryManager
+from chatbot.model_router import TieredChatSession
+from chatbot.prompt_cache import PromptArtifactCache
+from chatbot.session_store import Conversation, SessionStore
+from chatbot.stub_client import StubModelClient
+from chatbot.transcripts import TranscriptStore
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "replay_corpus.json")
+SESSION_COUNTS = (1, 50, 500)
+TURNS_PER_SESSION = 40
+MAX_MESSAGES = 20
+# Share of sessions that went idle (abandoned tabs) and are evicted
+IDLE_SHARE = 0.8
+
+def fresh(text):
+    """A new string object with the same content, as text received over the network would be."""
+    return text.encode("utf-8").decode("utf-8")
+
+def make_turns(questions):
+    """Question/answer pairs from the stub, answered once and copied into every session."""
+    session = StubModelClient(time_scale=0).start_chat_session("")
+    return [(question, session.send_message(question).text) for question in questions]
+
+def final_history(turns, history_manager):
+    """The model-side history after all turns, trimmed to the history budget as the app does every turn."""
+    history = []
+    for question, answer in turns:
+        history = history_manager.compact(history + [{"role": "user", "parts": [question]},
+                                                     {"role": "model", "parts": [answer]}])[0]
+    return history
+
+def simulate(session, turns, history, append):
+    """Fills a session with the conversation: its own copies of the messages and of the trimmed history."""
+    for question, answer in turns:
+        append({"role": "user", "content": fresh(question)})
+        append({"role": "assistant", "content": fresh(answer)})
+    session.history = [{"role": m["role"], "parts": [fresh(part) for part in m["parts"]]} for m in history]
+
+def legacy_sessions(count, artifact, turns, history):
+    """Before: a client and a copy of the system prompt per session, unbounded messages, nothing evicted."""
+    sessions = []
+    for _ in range(count):
+        client = StubModelClient(time_scale=0)
+        # GenerativeModel(system_instruction=...) keeps its own copy of the prompt per session
+        chat_session = client.start_chat_session(fresh(artifact.text), prompt_hash=artifact.content_hash)
+        messages = []
+        simulate(chat_session, turns, history, messages.append)
+        sessions.append({"client": client, "chat_session": chat_session, "messages": messages})
+    return sessions
+
+def stored_sessions(count, artifact, turns, history, store):
+    """After: shared client and prompt, bounded messages, idle conversations evicted to the transcript store."""
+    client = StubModelClient(time_scale=0)
+    for _ in range(count):
+        chat_session = TieredChatSession(lambda tier: client, artifact.text, prompt_hash=artifact.content_hash)
+        conversation = store.add(Conversation(id=SessionStore.new_id(), tenant="default", artifact=artifact,
+                                              chat_session=chat_session))
+        simulate(chat_session, turns, history, lambda message: store.append(conversation, message))
+        store.save(conversation)
+    # The oldest conversations went idle
+    idle_before = time.monotonic()
+    active = round(count * (1 - IDLE_SHARE)) if count > 1 else count
+    for i, conversation in enumerate(list(store._conversations.values())):
+        conversation.last_active = idle_before - (store.idle_seconds + 1 if i < count - active else 0)
+    store.evict_idle(idle_before)
+    return client
+
+def measure(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    state = build()
+    seconds = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used, seconds, state
+
+def main():
+    """
+    Measures the memory held by chat state at 1, 50 and 500 simulated sessions of
+    40 turns each (tracemalloc, excluding the shared prompt artifact): the old
+    per-session layout vs. the session store with a shared client and prompt,
+    at most 20 messages in memory and 80% of the sessions evicted as idle to the
+    SQLite transcript store. Also measures resuming an evicted conversation.
+    """
+    print("\n--- Session Memory Benchmark ---")
+    with open(CORPUS_PATH, "r", encoding="utf-8") as f:
+        questions = [turn for c in json.load(f) for turn in c["turns"]]
+    turns = make_turns((questions * (TURNS_PER_SESSION // len(questions) + 1))[:TURNS_PER_SESSION])
+    artifact = PromptArtifactCache(app.PROMPT_FILE_PATH, app.SETTINGS_TABLES_PATH).get(app.build_final_prompt,
+                                                                                       incremental=True)
+    history = final_history(turns, HistoryManager(app.HISTORY_TOKEN_BUDGET, app.HISTORY_KEEP_TURNS,
+                                                  app.HISTORY_COMPACTION))
+    print(f"  - System prompt: {len(artifact.text)} chars; {TURNS_PER_SESSION} turns per session")
+
+    db_dir = tempfile.mkdtemp()
+    try:
+        for count in SESSION_COUNTS:
+            legacy_bytes, legacy_seconds, _ = measure(lambda: legacy_sessions(count, artifact, turns, history))
+            store = SessionStore(max_messages=MAX_MESSAGES,
+                                 transcripts=TranscriptStore(os.path.join(db_dir, f"transcripts_{count}.sqlite3")))
+            stored_bytes, stored_seconds, _ = measure(
+                lambda: stored_sessions(count, artifact, turns, history, store))
+            stats = store.stats()
+            print(f"  - {count:3d} sessions | before {legacy_bytes / 2**20:8.1f} MB "
+                  f"({legacy_bytes / count / 1024:6.0f} KB/session) | after {stored_bytes / 2**20:6.1f} MB "
+                  f"({stored_bytes / count / 1024:4.0f} KB/session), {stats['active']} in memory with "
+                  f"{stats['messages_in_memory']} messages, {stats.get('evicted', 0)} evicted")
+
+            if count == SESSION_COUNTS[-1]:
+                evicted_id = store.transcripts._conn.execute("SELECT id FROM conversations LIMIT 1").fetchone()[0]
+                start = time.perf_counter()
+                transcript = store.load(evicted_id)
+                chat_session = TieredChatSession(lambda tier: StubModelClient(time_scale=0), artifact.text,
+                                                 prompt_hash=artifact.content_hash)
+                chat_session.history = transcript["history"]
+                resume_ms = (time.perf_counter() - start) * 1000
+                print(f"  - Resume of an evicted conversation: {resume_ms:.1f} ms "
+                      f"({len(transcript['messages'])} messages, {len(transcript['history'])} history entries)")
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
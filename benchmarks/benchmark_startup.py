@@ -0,0 +1,92 @@
+import os
+import sys
+import statistics
+import subprocess
+
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+APP_PATH = os.path.join(SRC_PATH, "chatbot", "chatbot_app.py")
+RUNS = 5
+RERUNS = 50
+
+# Each snippet runs in a fresh interpreter and prints its measurements (seconds).
+IMPORT_SNIPPET = """
+import time, sys
+sys.path.insert(0, SRC_PATH)
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+# Everything a new session does before the first request, except the network calls:
+# build (or fetch) the prompt artifact, count its tokens and import the Gemini SDK.
+FIRST_SESSION_SNIPPET = """
+import time, sys
+sys.path.insert(0, SRC_PATH)
+import chatbot.chatbot_app as app
+if {warm}:
+    app.warm_up()
+start = time.perf_counter()
+artifact = app.get_prompt_cache(app.PROMPT_FILE_PATH, app.SETTINGS_TABLES_PATH,
+                                variant=app.PROMPT_VARIANT).get(app.build_final_prompt, incremental=True)
+app.get_token_estimator().estimate(artifact.text)
+import google.generativeai
+print(time.perf_counter() - start)
+"""
+
+# Streamlit re-executes the app script on every interaction; run_path does the same
+# (module-level code only, `main()` is skipped because __name__ is not "__main__").
+RERUN_SNIPPET = """
+import time, sys, runpy, statistics
+sys.path.insert(0, SRC_PATH)
+import chatbot.chatbot_app
+runpy.run_path(APP_PATH, run_name="__rerun__")
+timings = []
+for _ in range(RERUNS):
+    start = time.perf_counter()
+    runpy.run_path(APP_PATH, run_name="__rerun__")
+    timings.append(time.perf_counter() - start)
+print(statistics.median(timings))
+"""
+
+# Imported by the app only on first use (or not at all on the hot path)
+DEFERRED_MODULES = ["google.generativeai", "pandas", "tabulate", "dotenv", "pythonjsonlogger"]
+
+def run_snippet(snippet: str) -> float:
+    code = f"SRC_PATH = {SRC_PATH!r}\nAPP_PATH = {APP_PATH!r}\nRERUNS = {RERUNS}\n" + snippet
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+def report(label: str, snippet: str, runs: int = RUNS):
+    try:
+        timings = [run_snippet(snippet) for _ in range(runs)]
+    except RuntimeError as e:
+        print(f"  - {label:<32} | skipped: {e}")
+        return
+    print(f"  - {label:<32} | median {statistics.median(timings) * 1000:8.1f} ms")
+
+def main():
+    """
+    Reports the cold-start costs of the app: import time of the app module and of
+    the dependencies it defers, first-session latency with and without the
+    server warm-up, and the overhead of one Streamlit rerun.
+    """
+    print("\n--- Startup Benchmark ---")
+    print(f"{RUNS} fresh interpreter runs per measurement")
+
+    print("\nImport time:")
+    report("chatbot.chatbot_app", IMPORT_SNIPPET.format(module="chatbot.chatbot_app"))
+    for module in DEFERRED_MODULES:
+        report(f"{module} (deferred)", IMPORT_SNIPPET.format(module=module))
+
+    print("\nFirst-session latency (before the first model call):")
+    report("without warm-up", FIRST_SESSION_SNIPPET.format(warm=False))
+    report("after warm-up", FIRST_SESSION_SNIPPET.format(warm=True))
+
+    print(f"\nPer-rerun overhead (median of {RERUNS} script re-executions):")
+    report("module-level code", RERUN_SNIPPET, runs=1)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
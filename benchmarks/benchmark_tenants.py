@@ -0,0 +1,71 @@
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.append(SRC_PATH)
+
+import chatbot.chatbot_app as app
+from chatbot.tenants import Tenant, TenantRegistry, DEFAULT_TENANT, discover_tenants, TENANT_PROMPT_FILE, TENANT_TABLES_DIR
+
+TENANTS = 6
+# Room for about half of the tenants, so the idle ones are evicted
+MEMORY_CAP_TENANTS = 3
+
+def make_tenants(root, count):
+    """Creates `count` tenant directories, each a copy of the bundled configuration."""
+    for i in range(count):
+        tenant_dir = os.path.join(root, f"customer_{i + 1:02d}")
+        os.makedirs(tenant_dir)
+        shutil.copy(app.PROMPT_FILE_PATH, os.path.join(tenant_dir, TENANT_PROMPT_FILE))
+        shutil.copytree(app.SETTINGS_TABLES_PATH, os.path.join(tenant_dir, TENANT_TABLES_DIR))
+
+def main():
+    """
+    Loads several tenants side by side through the registry: per-tenant cold load
+    time and memory, the cost of a warm lookup (what every session of a loaded
+    tenant pays), sharing of one artifact across sessions, and LRU eviction of idle
+    tenants under a memory cap that fits about half of them.
+    """
+    print("\n--- Multi-Tenant Registry Benchmark ---")
+    root = tempfile.mkdtemp()
+    try:
+        make_tenants(root, TENANTS)
+        evicted = []
+        tenants = discover_tenants(root, Tenant(DEFAULT_TENANT, app.PROMPT_FILE_PATH, app.SETTINGS_TABLES_PATH))
+        registry = TenantRegistry(tenants, app.load_tenant, memory_cap_bytes=1 << 60, idle_seconds=0.0,
+                                  on_evict=lambda tenant: (evicted.append(tenant.name), app.unload_tenant(tenant)))
+
+        # Size the cap from the first tenant, then load everyone once
+        registry.get(DEFAULT_TENANT)
+        tenant_mb = registry.stats()["tenants"][DEFAULT_TENANT]["memory_mb"]
+        registry.memory_cap_bytes = int(tenant_mb * MEMORY_CAP_TENANTS * 1024 * 1024)
+        for name in registry.names():
+            registry.get(name)
+        for name, t in registry.stats()["tenants"].items():
+            print(f"  - {name:<12} cold load {t['load_seconds'] * 1000:6.1f} ms, {t['memory_mb']:5.2f} MB, "
+                  f"loaded now: {t['loaded']}")
+
+        start = time.perf_counter()
+        artifacts = [registry.get(registry.names()[-1]) for _ in range(100)]
+        warm_us = (time.perf_counter() - start) / len(artifacts) * 1e6
+        print(f"  - Warm lookup: {warm_us:.0f} µs; 100 sessions share one artifact: "
+              f"{len({id(a) for a in artifacts}) == 1}")
+
+        stats = registry.stats()
+        print(f"  - Memory cap {stats['memory_cap_mb']:.1f} MB: {stats['loaded']} of {len(tenants)} tenants loaded, "
+              f"{stats['memory_mb']:.1f} MB; evicted {evicted}")
+        first_evicted = evicted[0]
+        registry.get(first_evicted)
+        reload = registry.stats()["tenants"][first_evicted]
+        print(f"  - Reload of evicted {first_evicted}: {reload['load_seconds'] * 1000:.1f} ms "
+              f"(loads {reload['loads']}, evictions {reload['evictions']})")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print("--------------------------\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,67 @@
 
 import os
 import sys
+import argparse
 
 # Add the src directory to the Python path to allow for absolute imports
 SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "src"))
 sys.path.append(SRC_PATH)
 
 from dotenv import load_dotenv
-from chatbot.chatbot_app import load_and_enrich_system_prompt, load_csv_data_as_dfs
+from chatbot.chatbot_app import (load_and_enrich_system_prompt, load_knowledge_base_tables, format_table_segment,
+                                  PROMPT_DATA_FORMAT)
 from chatbot.debug_utils import analyze_prompt_token_usage
+from chatbot.prompt_encoding import GuidAliaser
+from chatbot.token_profiler import TokenProfiler
+
+def print_profile(profile, top: int):
+    """Prints the most expensive columns, value groups, rows and cells of the reference data."""
+    verified = f", {len(profile.verified_tables)} tables verified" if profile.verified_tables else ""
+    print(f"\n--- Token Attribution ({profile.data_format} format{verified}) ---")
+    print(f"Reference data: {profile.total_tokens:.0f} tokens")
+    sections = (
+        ("column", "Columns (tokens saved by dropping the column)",
+         lambda e: f"{e.table} / {e.column}"),
+        ("group", "Row groups by value", lambda e: f"{e.table} / {e.column} = {e.group} ({e.rows} rows)"),
+        ("row", "Rows", lambda e: f"{e.table} / {e.row}"),
+        ("cell", "Cells", lambda e: f"{e.table} / {e.row} / {e.column}"),
+    )
+    for level, title, describe in sections:
+        entries = profile.top(level, top)
+        if not entries:
+            continue
+        print(f"\nTop {len(entries)} {title}:")
+        for entry in entries:
+            print(f"  - {entry.tokens:9.0f} tokens {entry.share_pct:5.1f}%  {describe(entry)}")
+    print("--------------------------")
 
 def main():
     """
     Main function to run the token analysis and print the report.
+
+    By default token counts are estimated locally. Pass `--verify` to count with
+    the Gemini API instead; the real counts are recorded as calibration samples
+    for the local estimator.
+
+    Pass `--profile` to attribute the reference data tokens to tables, columns,
+    rows, cells and groups of rows (e.g. per localization language), in the
+    serialization the app sends, with the top offenders of each level. `--csv` /
+    `--json` write the full, sortable report.
     """
-    print("Starting token usage analysis...")
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--verify", action="store_true", help="Count with the Gemini API (one call per component)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Attribute the reference data tokens to tables, columns, rows and cells")
+    parser.add_argument("--top", type=int, default=10, help="Entries per level in the profile report")
+    parser.add_argument("--csv", help="Write the full profile to this CSV file (implies --profile)")
+    parser.add_argument("--json", help="Write the full profile to this JSON file (implies --profile)")
+    args = parser.parse_args()
+    verify = args.verify
+    print(f"Starting token usage analysis ({'verified with Gemini API' if verify else 'local estimate'})...")
     
     # Load environment variables to get the API key
     load_dotenv()
-    if not os.getenv("GEMINI_API_KEY"):
+    if verify and not os.getenv("GEMINI_API_KEY"):
         print("\nERROR: GEMINI_API_KEY not found in .env file.")
         print("Please ensure you have a .env file in the project root with your key.")
         return
@@ -30,16 +73,19 @@ def main():
         print("Failed to load the system prompt. Aborting.")
         return
         
-    csv_dfs = load_csv_data_as_dfs()
-    if not csv_dfs:
+    tables = load_knowledge_base_tables().tables
+    if not tables:
         print("No CSV data found or failed to load. Analysis will be incomplete.")
+    # The tables exactly as the app sends them (PROMPT_DATA_FORMAT)
+    aliaser = GuidAliaser(tables) if PROMPT_DATA_FORMAT == "compact" else None
+    table_segments = {name: format_table_segment(name, records, aliaser) for name, records in tables.items()}
 
     # Use a sample user question for a complete analysis
     sample_question = "Як працює kpi_CombinationToRecommendInOutOfGuideline?"
 
     # 2. Analyze token usage
-    print("Analyzing token counts with Gemini API...")
-    analysis_result = analyze_prompt_token_usage(base_prompt, csv_dfs, sample_question)
+    print("Analyzing token counts...")
+    analysis_result = analyze_prompt_token_usage(base_prompt, table_segments, sample_question, verify=verify)
 
     if "error" in analysis_result:
         print(f"\nERROR: {analysis_result['error']}")
@@ -49,14 +95,36 @@ def main():
     print("\n--- Token Usage Report ---")
     print(f"- Base System Prompt: {analysis_result['system_prompt_base']} tokens")
     print(f"- Sample User Question: {analysis_result['user_question']} tokens")
-    print("\n--- CSV Data Breakdown ---")
+    print(f"\n--- CSV Data Breakdown ({PROMPT_DATA_FORMAT} format) ---")
     for name, count in analysis_result['csv_data_breakdown'].items():
         print(f"  - {name}: {count} tokens")
     print("--------------------------")
     print(f"- Total for CSV data: {analysis_result['csv_data_total']} tokens")
     print("==========================")
     print(f"GRAND TOTAL (for one request): {analysis_result['grand_total']} tokens")
+    print("--------------------------")
+
+    error = analysis_result['estimator_error']
+    if error['samples']:
+        print(f"Estimator error over {error['samples']} calibration samples: "
+              f"mean {error['mean_abs_pct_error']:.1f}%, max {error['max_abs_pct_error']:.1f}%, "
+              f"bias {error['total_bias_pct']:+.1f}%")
+    else:
+        print("Estimator is uncalibrated (run with --verify to record real token counts).")
     print("--------------------------\n")
 
+    if args.profile or args.csv or args.json:
+        # With --verify the real per-table counts above rescale the attribution
+        verified_tables = analysis_result['csv_data_breakdown'] if verify else None
+        profile = TokenProfiler(PROMPT_DATA_FORMAT, aliaser).profile(tables, verified_tables)
+        print_profile(profile, args.top)
+        if args.csv:
+            profile.write_csv(args.csv)
+            print(f"Profile written to {args.csv}")
+        if args.json:
+            profile.write_json(args.json)
+            print(f"Profile written to {args.json}")
+        print()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,175 @@
+import os
+import sys
+import json
+import argparse
+
+# Add the src directory to the Python path to allow for absolute imports
+SRC_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "src"))
+sys.path.append(SRC_PATH)
+
+DEFAULT_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "batch_output.jsonl")
+
+def build_answerer(args, artifact):
+    """
+    Returns the function answering one batch item the way the app answers a first
+    question: reference data and dependency facts attached to the question, sent
+    through the process-wide request scheduler on a fresh chat session of the
+    shared prompt, with answers shared with the app's answer cache.
+    """
+    import time
+    import chatbot.chatbot_app as app
+    from chatbot.answer_cache import get_answer_cache
+    from chatbot.metrics import get_metrics, MODEL_CALL, TIME_TO_FIRST_TOKEN
+    from chatbot.model_client import get_model_client
+    from chatbot.model_router import TieredChatSession
+    from chatbot.request_scheduler import get_request_scheduler
+    from chatbot.token_estimator import get_token_estimator, estimate_tokens
+
+    answer_cache = get_answer_cache() if app.ANSWER_CACHE_ENABLED and not args.no_cache else None
+    kb_hash = app.answer_cache_key(artifact.content_hash, args.tier)
+    prompt_tokens = get_token_estimator().estimate(artifact.text)
+    scheduler = get_request_scheduler()
+    metrics = get_metrics()
+
+    def answer(item):
+        if answer_cache is not None:
+            cached_answer = answer_cache.get(item.question, kb_hash)
+            if cached_answer is not None:
+                return {"answer": cached_answer, "cached": True, "prompt_hash": artifact.content_hash}
+
+        chat_session = TieredChatSession(get_model_client, artifact.text, prompt_hash=artifact.content_hash,
+                                         tier=args.tier)
+        message = app.compose_user_message(item.question, artifact)
+        start = time.perf_counter()
+        response = scheduler.send_message(f"batch:{item.id}", chat_session, message,
+                                          prompt_tokens + estimate_tokens(message))
+        text, ttft_seconds = "", None
+        for chunk in response:
+            chunk_text = app.get_chunk_text(chunk)
+            if chunk_text and ttft_seconds is None:
+                ttft_seconds = time.perf_counter() - start
+            text += chunk_text
+        generation_seconds = time.perf_counter() - start
+        answer_text = app.decode_answer(text, artifact)
+        usage = response.usage_metadata
+        metrics.observe(MODEL_CALL, generation_seconds, None, tier=args.tier, source="batch")
+        if ttft_seconds is not None:
+            metrics.observe(TIME_TO_FIRST_TOKEN, ttft_seconds, None, tier=args.tier, source="batch")
+        metrics.record_usage(None, usage, tier=args.tier, source="batch")
+        if not answer_text:
+            raise RuntimeError("The model returned an empty answer")
+        if answer_cache is not None:
+            answer_cache.put(item.question, kb_hash, answer_text)
+        return {
+            "answer": answer_text,
+            "cached": False,
+            "tier": args.tier,
+            "ttft_seconds": ttft_seconds,
+            "generation_seconds": generation_seconds,
+            "prompt_tokens": usage.prompt_token_count,
+            "output_tokens": usage.candidates_token_count,
+            "prompt_hash": artifact.content_hash,
+        }
+
+    return answer
+
+def main():
+    """
+    Answers a batch of questions with the chatbot, e.g. to generate documentation
+    for every KPI of cnfg.kpi.csv, and streams the answers to a JSONL file.
+
+    Questions come from a JSONL file (--questions, one {"id", "question"} object per
+    line) or are generated, one per KPI (--kpis). Up to --workers questions run in
+    parallel through the shared prompt, answer cache and request scheduler. Every
+    finished item is written immediately, so an interrupted run started again with
+    the same output file skips the items already answered (--restart starts over).
+    Use `--client stub` to run offline against the deterministic stub model.
+    """
+    parser = argparse.ArgumentParser(description=main.__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", help="JSONL file with one {\"id\", \"question\"} object per line")
+    source.add_argument("--kpis", action="store_true", help="Ask one documentation question per KPI")
+    parser.add_argument("--template", help="Question template for --kpis, with a {name} placeholder")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="JSONL results file (also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=4, help="Questions answered in parallel")
+    parser.add_argument("--limit", type=int, help="Only the first N questions")
+    parser.add_argument("--tier", choices=("fast", "pro"), default="pro", help="Model tier to answer with")
+    parser.add_argument("--tenant", help="Tenant whose configuration to answer from (default tenant otherwise)")
+    parser.add_argument("--language", help="UI language of the KPI names (the language-scoped prompt variant); "
+                                           "DEFAULT_LANGUAGE otherwise")
+    parser.add_argument("--client", choices=("gemini", "stub"), help="Model client (MODEL_CLIENT otherwise)")
+    parser.add_argument("--time-scale", type=float,
+                        help="Multiplier for the stub's simulated model latency (STUB_TIME_SCALE)")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use or fill the answer cache")
+    parser.add_argument("--restart", action="store_true", help="Overwrite the output instead of resuming")
+    parser.add_argument("--summary", help="Also write the run summary to this JSON file")
+    args = parser.parse_args()
+
+    # Read by the model client factory and the stub
+    if args.client:
+        os.environ["MODEL_CLIENT"] = args.client
+    if args.time_scale is not None:
+        os.environ["STUB_TIME_SCALE"] = str(args.time_scale)
+    # A batch run has no use for the settings watcher
+    os.environ.setdefault("SETTINGS_HOT_RELOAD", "0")
+
+    import chatbot.chatbot_app as app
+    from chatbot.batch import BatchRunner, KPI_QUESTION_TEMPLATE, kpi_questions, load_questions
+
+    tenants = app.get_tenants()
+    tenant = args.tenant or tenants.default
+    if tenant not in tenants.tenants:
+        print(f"Error: unknown tenant {tenant!r} (available: {', '.join(tenants.names())})", file=sys.stderr)
+        sys.exit(2)
+    print(f"Loading the knowledge base of {tenant}...")
+    artifact = app.language_artifact(tenant, args.language or app.DEFAULT_LANGUAGE)
+    if artifact is None:
+        print("Error: the system prompt could not be built.", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.questions:
+            items = load_questions(args.questions)
+        else:
+            items = kpi_questions(artifact.indexes["knowledge_base"].tables, args.template or KPI_QUESTION_TEMPLATE)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+    if args.limit is not None:
+        items = items[:args.limit]
+
+    finished = [0]
+    def report_progress(record):
+        finished[0] += 1
+        status = "cached" if record.get("cached") else record["status"]
+        detail = f" ({record['error']})" if record.get("error") else ""
+        print(f"  [{finished[0]}] {record['id']}: {status}, {record['latency_seconds']:.2f} s{detail}", flush=True)
+
+    print(f"Answering {len(items)} questions with {args.workers} workers, results in {args.output}")
+    runner = BatchRunner(build_answerer(args, artifact), args.output, workers=args.workers, on_result=report_progress)
+    summary = runner.run(items, resume=not args.restart)
+
+    print("\n--- Batch Summary ---")
+    print(f"{summary['answered']} answered ({summary['cached']} from cache), {summary['failed']} failed, "
+          f"{summary['skipped']} already done, {summary['remaining']} remaining")
+    print(f"  - Wall time: {summary['wall_seconds']:.1f} s, throughput {summary['throughput_items_per_s']:.2f} items/s")
+    if summary["latency_p50_s"] is not None:
+        print(f"  - Latency per item (model answers): p50 {summary['latency_p50_s']:.2f} s, "
+              f"p95 {summary['latency_p95_s']:.2f} s, max {summary['latency_max_s']:.2f} s")
+    if summary["ttft_p50_s"] is not None:
+        print(f"  - Time to first token: p50 {summary['ttft_p50_s']:.2f} s")
+    print(f"  - Tokens: {summary['prompt_tokens']} prompt, {summary['output_tokens']} output")
+    if summary["interrupted"]:
+        print("Interrupted: run the same command again to continue.")
+    print("--------------------------\n")
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    if summary["interrupted"]:
+        sys.exit(130)
+    if summary["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
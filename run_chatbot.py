@@ -1,21 +1,24 @@
-import subprocess
 import sys
 import os
 
 def main():
     """
-    Executes the Streamlit chatbot application using a subprocess.
+    Runs the Streamlit chatbot application in this process.
 
-    This script ensures that the Streamlit app is run with the correct path
-    and from the project's root directory, which helps in resolving
-    module paths correctly.
+    The shared state (system prompt, knowledge base, indexes) is built by a
+    warm-up step before the server starts, so the first user does not wait for
+    it. Streamlit is then started in the same interpreter (no subprocess), which
+    keeps the warmed-up modules and caches. Extra command-line arguments are
+    passed on to `streamlit run` (e.g. `--server.port 8502`).
     """
     # Get the directory where this script is located (the project root)
     project_root = os.path.dirname(os.path.abspath(__file__))
-    
+
     # Add the 'src' directory to the Python path
     src_path = os.path.join(project_root, "src")
-    
+    if src_path not in sys.path:
+        sys.path.insert(0, src_path)
+
     # Construct the full, absolute path to the chatbot application script
     app_path = os.path.join(project_root, "src", "chatbot", "chatbot_app.py")
 
@@ -23,23 +26,29 @@ def main():
         print(f"Error: Chatbot application not found at {app_path}", file=sys.stderr)
         sys.exit(1)
 
-    command = [sys.executable, "-m", "streamlit", "run", app_path]
-
-    print(f"Starting chatbot application...")
-    print(f"Running command: {' '.join(command)}")
-
     try:
-        # We run the command from the project root to ensure `src` is in the Python path
-        env = os.environ.copy()
-        env["PYTHONPATH"] = src_path + os.pathsep + env.get("PYTHONPATH", "")
-        subprocess.run(command, check=True, cwd=project_root, env=env)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Streamlit: {e}", file=sys.stderr)
-        sys.exit(1)
-    except FileNotFoundError:
-        print("Error: 'streamlit' command not found.", file=sys.stderr)
+        from streamlit.web import cli as stcli
+    except ImportError:
+        print("Error: Streamlit is not installed.", file=sys.stderr)
         print("Please ensure Streamlit is installed in your environment (`pip install streamlit`).", file=sys.stderr)
         sys.exit(1)
 
+    # Run from the project root so relative paths resolve as with `streamlit run`
+    os.chdir(project_root)
+
+    print("Warming up shared state...")
+    try:
+        from chatbot.chatbot_app import warm_up
+        for step, result in warm_up().items():
+            status = f"failed: {result['error']}" if result["error"] else "ok"
+            print(f"  - {step}: {result['seconds']:.2f} s ({status})")
+    except Exception as e:
+        # The app can still start; the first session builds what is missing
+        print(f"Warm-up failed: {e}", file=sys.stderr)
+
+    print(f"Starting chatbot application...")
+    sys.argv = ["streamlit", "run", app_path] + sys.argv[1:]
+    sys.exit(stcli.main())
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,155 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache"))
+DEFAULT_DB_PATH = os.path.join(CACHE_DIR, "answer_cache.sqlite3")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = " ?!.,;:…"
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a question so trivially different spellings share a cache entry:
+    Unicode NFKC, case-folded, collapsed whitespace, no trailing punctuation.
+    """
+    normalized = unicodedata.normalize("NFKC", question).casefold()
+    normalized = _WHITESPACE_RE.sub(" ", normalized).strip()
+    return normalized.rstrip(_TRAILING_PUNCTUATION)
+
+
+def make_cache_key(question: str, kb_hash: str) -> str:
+    return hashlib.sha256(f"{kb_hash}\0{normalize_question(question)}".encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    A persistent SQLite cache of model answers to first-turn questions.
+
+    Entries are keyed by the normalized question and a hash of the knowledge base
+    (prompt template + settings tables), so any configuration change makes old
+    answers unreachable. Entries expire after `ttl_seconds`; when the cache grows
+    beyond `max_entries` or `max_bytes`, the least recently used entries are evicted.
+
+    Only history-independent (first-turn) questions should be cached: a follow-up
+    question means something different depending on the conversation before it.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_seconds: float = 7 * 24 * 3600,
+                 max_entries: int = 5000, max_bytes: int = 50 * 1024 * 1024):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                kb_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_access ON answers(last_access)")
+        self._conn.commit()
+
+    def get(self, question: str, kb_hash: str) -> Optional[str]:
+        """Returns the cached answer for the question, or None on a miss."""
+        key = make_cache_key(question, kb_hash)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT answer, created_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    self._conn.commit()
+                    self.counters["evictions"] += 1
+                self.counters["misses"] += 1
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.counters["hits"] += 1
+            return row[0]
+
+    def put(self, question: str, kb_hash: str, answer: str):
+        """Stores an answer and evicts expired and least recently used entries."""
+        key = make_cache_key(question, kb_hash)
+        now = time.time()
+        size = len(answer.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, kb_hash, question, answer, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, kb_hash, normalize_question(question), answer, size, now, now),
+            )
+            self.counters["stores"] += 1
+            self._evict(now)
+            self._conn.commit()
+
+    def record_bypass(self):
+        with self._lock:
+            self.counters["bypassed"] += 1
+
+    def _evict(self, now: float):
+        cursor = self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.counters["evictions"] += cursor.rowcount
+
+        count, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        if count <= self.max_entries and total_size <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM answers ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total_size <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+            count -= 1
+            total_size -= size
+            self.counters["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Returns hit-rate counters and the current size of the store."""
+        with self._lock:
+            count, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0,
+                "entries": count,
+                "bytes": total_size,
+            }
+
+
+_answer_cache: Optional[AnswerCache] = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Returns the process-wide answer cache."""
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache(
+                ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_HOURS", "168")) * 3600,
+                max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000")),
+            )
+        return _answer_cache
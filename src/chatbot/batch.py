@@ -0,0 +1,191 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from chatbot.kpi_graph import KPI_TABLE
+
+# The default question asked about every KPI of cnfg.kpi.csv
+KPI_QUESTION_TEMPLATE = ("Опиши KPI {name}: що він означає, як розраховується, від яких KPI та умов залежить "
+                         "і як налаштоване його умовне форматування.")
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+@dataclass
+class BatchItem:
+    """One question of a batch; `id` identifies it in the output and the checkpoint."""
+    id: str
+    question: str
+
+
+def load_questions(path: str) -> List[BatchItem]:
+    """
+    Reads batch questions from a JSONL file: one {"question": ...} object per line,
+    optionally with an "id" (the line number otherwise). Blank lines are skipped.
+
+    Raises:
+        ValueError: If a line is not a JSON object with a question, or an id repeats.
+    """
+    items, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({e})") from e
+            if not isinstance(record, dict) or not str(record.get("question") or "").strip():
+                raise ValueError(f"{path}:{line_number}: expected an object with a \"question\"")
+            item_id = str(record.get("id", line_number))
+            if item_id in seen:
+                raise ValueError(f"{path}:{line_number}: duplicate id {item_id!r}")
+            seen.add(item_id)
+            items.append(BatchItem(item_id, record["question"].strip()))
+    return items
+
+
+def kpi_questions(tables: Dict[str, List[dict]], template: str = KPI_QUESTION_TEMPLATE) -> List[BatchItem]:
+    """One question per KPI of cnfg.kpi.csv, identified by the KPI name, in table order."""
+    items, seen = [], set()
+    for row in tables.get(KPI_TABLE, []):
+        name = str(row.get("Name") or "").strip()
+        if name and name not in seen:
+            seen.add(name)
+            items.append(BatchItem(name, template.format(name=name)))
+    return items
+
+
+def read_checkpoint(output_path: str) -> Set[str]:
+    """
+    Returns the ids already answered successfully in an output file. Failed items
+    are not included, so a resumed run retries them; a line cut off by an
+    interruption is ignored.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == STATUS_OK:
+                done.add(str(record["id"]))
+    return done
+
+
+def _ends_mid_line(path: str) -> bool:
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BatchRunner:
+    """
+    Answers a batch of independent questions with bounded parallelism and streams
+    the results to a JSONL file, one line per item as soon as it finishes (flushed,
+    so the file is the checkpoint: see read_checkpoint()).
+
+    `answer` does the actual work for one question and returns the fields of its
+    result record (at least "answer"); an exception marks the item as failed and
+    the batch continues.
+    """
+
+    def __init__(self, answer: Callable[[BatchItem], dict], output_path: str, workers: int = 4,
+                 on_result: Optional[Callable[[dict], None]] = None):
+        self.answer = answer
+        self.output_path = output_path
+        self.workers = workers
+        self.on_result = on_result
+        self._write_lock = threading.Lock()
+        self.results: List[dict] = []
+
+    def _run_item(self, item: BatchItem, out) -> dict:
+        start = time.perf_counter()
+        try:
+            record = {"id": item.id, "question": item.question, "status": STATUS_OK, **self.answer(item)}
+        except Exception as e:
+            record = {"id": item.id, "question": item.question, "status": STATUS_ERROR,
+                      "error": f"{type(e).__name__}: {e}"}
+        record["latency_seconds"] = time.perf_counter() - start
+        record["finished_at"] = time.time()
+        with self._write_lock:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            self.results.append(record)
+        if self.on_result is not None:
+            self.on_result(record)
+        return record
+
+    def run(self, items: Iterable[BatchItem], resume: bool = True) -> dict:
+        """
+        Runs the items not answered yet (with `resume`, the ids already in the
+        output file are skipped; without it the file is overwritten). On
+        KeyboardInterrupt the queued items are cancelled, the running ones finish
+        and are written, and the summary is returned with "interrupted" set.
+
+        Returns:
+            The run summary (see summary()).
+        """
+        items = list(items)
+        done = read_checkpoint(self.output_path) if resume else set()
+        pending = [item for item in items if item.id not in done]
+        self.results = []
+        interrupted = False
+        start = time.perf_counter()
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(self.output_path, "a" if resume else "w", encoding="utf-8") as out:
+            if resume and _ends_mid_line(self.output_path):
+                # Terminate a line cut off by an interruption, so the next record is readable
+                out.write("\n")
+            executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+            try:
+                futures = [executor.submit(self._run_item, item, out) for item in pending]
+                for future in as_completed(futures):
+                    future.result()
+            except KeyboardInterrupt:
+                interrupted = True
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+        return self.summary(len(items), len(items) - len(pending), time.perf_counter() - start, interrupted)
+
+    def summary(self, total: int, skipped: int, wall_seconds: float, interrupted: bool = False) -> dict:
+        """Counts, throughput and per-item latency percentiles of this run (skipped items excluded)."""
+        answered = [r for r in self.results if r["status"] == STATUS_OK]
+        latencies = [r["latency_seconds"] for r in answered if not r.get("cached")]
+        ttfts = [r["ttft_seconds"] for r in answered if r.get("ttft_seconds") is not None]
+        return {
+            "total": total,
+            "skipped": skipped,
+            "answered": len(answered),
+            "cached": sum(1 for r in answered if r.get("cached")),
+            "failed": len(self.results) - len(answered),
+            "remaining": total - skipped - len(self.results),
+            "interrupted": interrupted,
+            "wall_seconds": wall_seconds,
+            "throughput_items_per_s": len(self.results) / wall_seconds if wall_seconds > 0 else 0.0,
+            "latency_p50_s": _percentile(latencies, 0.5),
+            "latency_p95_s": _percentile(latencies, 0.95),
+            "latency_max_s": max(latencies) if latencies else None,
+            "ttft_p50_s": _percentile(ttfts, 0.5),
+            "prompt_tokens": sum(r.get("prompt_tokens") or 0 for r in answered),
+            "output_tokens": sum(r.get("output_tokens") or 0 for r in answered),
+        }
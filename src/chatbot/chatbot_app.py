@@ -11,39 +11,129 @@ if src_path not in sys.path:
 
 import streamlit as st
 import os
-import pandas as pd
 import json
 import random
-from typing import Union, Dict
-from dotenv import load_dotenv
-from chatbot.gemini_api_client import GeminiApiClient
-from chatbot.logger_setup import detailed_logger, request_logger
+import time
+import functools
+from typing import Union, Dict, List
+from chatbot.model_client import get_model_client, PRO_TIER
+from chatbot.gemini_api_client import get_context_cache_managers
+from chatbot.model_router import TieredChatSession, get_model_router
+from chatbot.prompt_cache import PromptArtifactCache, get_prompt_cache, drop_prompt_cache
+from chatbot.settings_watcher import start_settings_watcher, stop_settings_watcher
+from chatbot.tenants import Tenant, TenantRegistry, DEFAULT_TENANT, get_tenant_registry
+from chatbot.prompt_languages import (FALLBACK_LANGUAGE, available_languages, detect_language,
+                                      get_language_variants, localization_for_language)
+from chatbot.session_store import Conversation, SessionStore, get_session_store
+from chatbot.resume_links import get_resume_links
+from chatbot.history_view import LOCAL_ANSWER_NOTE, get_rendered_pages, history_pages, message_notes, page_markdown
+from chatbot.kpi_retrieval import KpiRetriever
+from chatbot.kpi_graph import (KpiDependencyGraph, KPI_TABLE, LOCALIZATION_TABLE, CONDITION_METADATA_TABLE,
+                               CONDITIONAL_FORMATTING_TABLE)
+from chatbot.knowledge_base import KnowledgeBase, load_knowledge_base, load_table, diff_records
+from chatbot.answer_cache import get_answer_cache
+from chatbot.local_answers import LocalAnswerEngine
+from chatbot.history_manager import HistoryManager, content_to_dict
+from chatbot.token_estimator import get_token_estimator, estimate_tokens
+from chatbot.request_scheduler import get_request_scheduler, is_rate_limit_error, SchedulerTimeout
+from chatbot.prompt_encoding import GuidAliaser, encode_table, COMPACT_FORMAT_HEADER
+from chatbot.logger_setup import get_detailed_logger, get_request_logger
+from chatbot.startup import initialize_process, run_warm_up, get_background_executor
+from chatbot.metrics import (get_metrics, PROMPT_BUILD, SESSION_INIT, MODEL_CALL, TIME_TO_FIRST_TOKEN,
+                             RENDER_HISTORY, RENDER_STREAM, LOCAL_ANSWER, SETTINGS_RELOAD, SESSION_RESUME,
+                             TIME_TO_INTERACTIVE, tiered)
 
 # --- INITIALIZATION ---
 
-load_dotenv()
+# Loads .env once per process; a no-op on every later rerun
+initialize_process()
 
 PROMPT_FILE_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "config_data", "promotool_settings.md"))
 SETTINGS_TABLES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "config_data", "settings_tables"))
 WELCOME_MESSAGES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "config_data", "welcome_messages.json"))
 FINAL_PROMPT_OUTPUT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "final_promt.md"))
 
+# "full" ships every table in the system prompt; "retrieval" attaches only the
+# KPIs relevant to each question (plus their dependencies) to the user message.
+PROMPT_CONTEXT_MODE = os.getenv("PROMPT_CONTEXT_MODE", "full").lower()
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_MAX_KPIS = int(os.getenv("RETRIEVAL_MAX_KPIS", "40"))
+# How many best-matching KPIs get precomputed dependency facts when none is named explicitly
+DEPENDENCY_FACTS_TOP_K = int(os.getenv("DEPENDENCY_FACTS_TOP_K", "3"))
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+# "1" answers pure lookups (ID, type, data type, name, read source, formula) from the tables, without the model
+LOCAL_ANSWERS_ENABLED = os.getenv("LOCAL_ANSWERS_ENABLED", "1") == "1"
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+HISTORY_COMPACTION = os.getenv("HISTORY_COMPACTION", "summarize")
+# "json" sends records as JSON objects; "compact" sends header-once tab-separated rows
+# with empty fields dropped and GUIDs replaced by short aliases
+PROMPT_DATA_FORMAT = os.getenv("PROMPT_DATA_FORMAT", "json").lower()
+JSON_FORMAT_HEADER = "# Reference Data (JSON Format)"
+# Identifies how the prompt is built from the same sources (prompt and answer cache keys)
+PROMPT_VARIANT = f"{PROMPT_CONTEXT_MODE}:{PROMPT_DATA_FORMAT}"
+# "1" counts the initial prompt with the remote count_tokens API and records it for calibration
+TOKEN_COUNT_VERIFY = os.getenv("TOKEN_COUNT_VERIFY", "0") == "1"
+# "1" shows latency percentiles (this session and all sessions) in the sidebar
+SHOW_METRICS_PANEL = os.getenv("SHOW_METRICS_PANEL", "0") == "1"
+# "1" watches the prompt template and settings tables and rebuilds the prompt in the background when they change
+SETTINGS_HOT_RELOAD = os.getenv("SETTINGS_HOT_RELOAD", "1") == "1"
+SETTINGS_RELOAD_INTERVAL_SECONDS = float(os.getenv("SETTINGS_RELOAD_INTERVAL_SECONDS", "2"))
+# Messages rendered on every rerun; earlier ones are shown on request, a page at a time
+HISTORY_RECENT_MESSAGES = int(os.getenv("HISTORY_RECENT_MESSAGES", "20"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+# "1" builds the prompt per UI language: only the session language's CustomLocalization rows (falling back to en)
+PROMPT_LANGUAGE_SCOPED = os.getenv("PROMPT_LANGUAGE_SCOPED", "1") == "1"
+# Session language when neither the URL (?lang=) nor the browser names an available one
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", FALLBACK_LANGUAGE)
+LANGUAGE_NOTE = """Таблиця `cnfg.CustomLocalization.csv` у довідкових даних містить локалізовані назви лише мовою інтерфейсу користувача (`{language}`); якщо перекладу цією мовою немає, наведено назву мовою `{fallback}`. Якщо для KPI немає жодної локалізованої назви, в інтерфейсі відображається його системне ім'я (`KPI.Name`)."""
+RETRIEVAL_DATA_NOTE = """Довідкові дані не включені в цю інструкцію повністю. До кожного запитання користувача додаються довідкові дані у форматі, описаному вище, що містить лише KPI, релевантні запитанню, усі KPI, від яких вони залежать, та пов'язані з ними рядки з інших таблиць. Використовуйте дані з поточного та попередніх повідомлень."""
+
 # --- HELPER & LOGGING FUNCTIONS ---
 
-def get_session_id() -> str:
+def get_session_id() -> Union[str, None]:
     from streamlit.runtime.scriptrunner import get_script_run_ctx
     ctx = get_script_run_ctx()
-    return ctx.session_id
+    # Outside a script run (server warm-up, tools) there is no session
+    return ctx.session_id if ctx else None
 
 def log_info(message: str, **kwargs):
-    detailed_logger.info(message, extra={'session_id': get_session_id(), **kwargs})
+    get_detailed_logger().info(message, extra={'session_id': get_session_id(), **kwargs})
 
 def log_error(message: str, **kwargs):
-    detailed_logger.error(message, extra={'session_id': get_session_id(), **kwargs})
+    get_detailed_logger().error(message, extra={'session_id': get_session_id(), **kwargs})
+
+# --- DATA LOADING & FORMATTING FUNCTIONS ---
+
+def load_knowledge_base_tables(tables_dir: str = None, notices: List[str] = None) -> KnowledgeBase:
+    """
+    Loads the settings tables into the typed, stdlib-only knowledge base used to
+    build the prompt. An empty knowledge base is returned if loading fails.
 
-# --- DATA LOADING & FORMATTING FUNCTIONS (JSON OPTIMIZED) ---
+    Args:
+        tables_dir: The settings tables directory. Defaults to SETTINGS_TABLES_PATH.
+        notices: Receives the message to show the user if loading fails (the
+            prompt is built off the script thread, where `st.*` shows nothing).
+    """
+    tables_dir = tables_dir or SETTINGS_TABLES_PATH
+    notices = notices if notices is not None else []
+    try:
+        return load_knowledge_base(tables_dir)
+    except FileNotFoundError:
+        log_error(f"Settings tables directory not found at {tables_dir}")
+        notices.append(f"Settings tables directory not found at {tables_dir}. Proceeding without table data.")
+        return KnowledgeBase({})
+    except Exception as e:
+        log_error(f"Error loading CSV data: {e}")
+        notices.append(f"Error loading CSV data: {e}")
+        return KnowledgeBase({})
 
-def load_csv_data_as_dfs() -> Dict[str, pd.DataFrame]:
+def load_csv_data_as_dfs() -> Dict[str, "pd.DataFrame"]:
+    """
+    Loads the settings tables as pandas DataFrames. Only used by the debugging
+    and benchmark tools; the app itself uses load_knowledge_base_tables().
+    """
+    import pandas as pd
     dataframes = {}
     try:
         for filename in sorted(os.listdir(SETTINGS_TABLES_PATH)):
@@ -60,22 +150,64 @@ def load_csv_data_as_dfs() -> Dict[str, pd.DataFrame]:
         st.error(f"Error loading CSV data: {e}")
         return {}
 
-def format_data_for_prompt(dataframes: Dict[str, pd.DataFrame]) -> str:
+def dataframes_to_records(dataframes: Dict[str, "pd.DataFrame"]) -> Dict[str, List[dict]]:
+    """
+    Converts a dictionary of DataFrames into plain JSON-compatible records,
+    keyed by filename. This is the shape of the reference data sent to the model.
+    """
+    return {filename: json.loads(df.to_json(orient='records')) for filename, df in dataframes.items()}
+
+def format_data_for_prompt(dataframes: Dict[str, "pd.DataFrame"]) -> str:
     """
     Converts a dictionary of DataFrames into a compact JSON string where each key
     is the filename and the value is a list of records.
     """
-    final_json_obj = {}
-    for filename, df in dataframes.items():
-        # Convert dataframe to a list of records (dicts)
-        records = json.loads(df.to_json(orient='records'))
-        final_json_obj[filename] = records
     # Convert the final object to a compact JSON string
-    return json.dumps(final_json_obj, indent=None, ensure_ascii=False)
+    return json.dumps(dataframes_to_records(dataframes), indent=None, ensure_ascii=False)
+
+def format_table_segment(name: str, records: List[dict], aliaser: GuidAliaser = None) -> str:
+    """
+    Serializes one table in the configured PROMPT_DATA_FORMAT. Segments are cached
+    per table, so a reload only re-serializes the tables that changed.
+    """
+    if PROMPT_DATA_FORMAT == "compact":
+        return encode_table(name, records, aliaser)
+    # Knowledge-base records are read-only mappings; `default=dict` serializes them as objects
+    return (f"{json.dumps(name, ensure_ascii=False)}: "
+            f"{json.dumps(list(records), indent=None, ensure_ascii=False, default=dict)}")
+
+def join_table_segments(segments: Dict[str, str]) -> str:
+    """Joins table segments into the reference data section, including the section header."""
+    if PROMPT_DATA_FORMAT == "compact":
+        return f"{COMPACT_FORMAT_HEADER}\n\n" + "\n\n".join(segments.values())
+    # Same text as json.dumps() of the whole {filename: records} object
+    return f"{JSON_FORMAT_HEADER}\n\n{{" + ", ".join(segments.values()) + "}"
+
+def format_reference_data(tables: Dict[str, List[dict]], aliaser: GuidAliaser = None) -> str:
+    """
+    Serializes reference records in the configured PROMPT_DATA_FORMAT, including
+    the section header.
+    """
+    return join_table_segments({name: format_table_segment(name, records, aliaser)
+                                for name, records in tables.items()})
+
+COMPACT_DATA_FORMAT_INSTRUCTION = """
+## База Знань: Структура Даних PromoTool (Компактний Табличний Формат)
+
+Ви володієте знаннями про конфігурацію, надану у компактному табличному форматі. Кожна таблиця починається із заголовка `## <назва файлу>` (напр., `## cnfg.kpi.csv`) та рядка `columns:` з назвами колонок, розділеними табуляцією. Кожен наступний рядок — один запис: значення у тому ж порядку колонок, розділені табуляцією. Порожнє значення (або його відсутність у кінці рядка) означає, що поле не заповнене. Послідовності `\\n` та `\\t` всередині значень означають перенесення рядка та табуляцію.
+
+Ідентифікатори (GUID) замінені короткими псевдонімами: `K-…` — KPI, `C-…` — ConditionMetadata, `L-…` — CustomLocalization, `F-…` — KPIConditionalFormatting, `G-…` — інші. Посилання між таблицями використовують ті самі псевдоніми. Наводьте ідентифікатори у відповідях саме у вигляді псевдонімів — система автоматично замінить їх на повні GUID.
+"""
 
-def load_and_enrich_system_prompt() -> Union[str, None]:
+def load_and_enrich_system_prompt(prompt_path: str = None, notices: List[str] = None) -> Union[str, None]:
+    """
+    Loads the prompt template and adapts it to the data format. Returns None if
+    it cannot be read; the reason is logged and added to `notices`.
+    """
+    prompt_path = prompt_path or PROMPT_FILE_PATH
+    notices = notices if notices is not None else []
     try:
-        with open(PROMPT_FILE_PATH, 'r', encoding='utf-8') as f:
+        with open(prompt_path, 'r', encoding='utf-8') as f:
             base_prompt = f.read()
         
         # Update instructions to reflect the new JSON data format
@@ -89,23 +221,25 @@ def load_and_enrich_system_prompt() -> Union[str, None]:
         end_marker = "## Правила та Методологія Відповідей"
         prompt_parts = base_prompt.split(start_marker)
         after_part = prompt_parts[1].split(end_marker)
+        if PROMPT_DATA_FORMAT == "compact":
+            data_format_instruction = COMPACT_DATA_FORMAT_INSTRUCTION
         base_prompt = prompt_parts[0] + data_format_instruction + end_marker + after_part[1]
 
         deep_analysis_instruction = """
-8. **Критично Важливий Крок: Пошук Непрямих Зв'язків:**
-   Це ваше найважливіше аналітичне завдання. Коли ви описуєте KPI, ви **зобов'язані** просканувати поле `CalculationKPIFormula` **у всіх інших KPI** у наданих JSON-даних. Якщо ви знайдете там згадку системного імені (`Name`) поточного KPI, ви повинні детально описати цей зв'язок. Це покаже, як даний KPI насправді використовується в системі, впливаючи на інші розрахунки.
+8. **Критично Важливий Крок: Непрямі Зв'язки:**
+   Залежності між KPI вже обчислені системою заздалегідь і додаються до запитання користувача у блоці `Precomputed KPI Dependencies`: від яких KPI та полів залежить поточний KPI (`Depends on`) і в яких KPI він використовується (`Used in formulas of`, `Used as distribution KPI by`, `Used as formatting condition for`). Ви **зобов'язані** використати ці факти і детально описати кожен знайдений зв'язок — це покаже, як даний KPI насправді використовується в системі, впливаючи на інші розрахунки. Не шукайте згадки вручну у формулах усіх KPI: список у блоці є повним.
 """
         target_section = "## Правила та Методологія Відповідей"
         enriched_prompt = base_prompt.replace(target_section, f"{target_section}\n\n{deep_analysis_instruction}")
         return enriched_prompt
 
     except FileNotFoundError:
-        log_error(f"System prompt file not found at {PROMPT_FILE_PATH}")
-        st.error(f"System prompt file not found at {PROMPT_FILE_PATH}")
+        log_error(f"System prompt file not found at {prompt_path}")
+        notices.append(f"System prompt file not found at {prompt_path}")
         return None
     except Exception as e:
         log_error(f"Error loading system prompt: {e}")
-        st.error(f"Error loading system prompt: {e}")
+        notices.append(f"Error loading system prompt: {e}")
         return None
 
 def get_random_welcome_message() -> str:
@@ -117,94 +251,987 @@ def get_random_welcome_message() -> str:
         log_error(f"Could not load welcome messages: {e}")
         return "Hello! How can I help you with PromoTool today?"
 
-# --- SESSION INITIALIZATION ---
+# Tables each derived index is built from; an index is reused when none of them changed
+GRAPH_SOURCE_TABLES = frozenset({KPI_TABLE, CONDITION_METADATA_TABLE, CONDITIONAL_FORMATTING_TABLE})
+RETRIEVER_SOURCE_TABLES = GRAPH_SOURCE_TABLES | {LOCALIZATION_TABLE}
+
+def reload_changed_tables(knowledge_base: KnowledgeBase, changed_tables, tables_dir: str = None):
+    """
+    Re-parses only the changed settings tables (a deleted file drops its table).
 
-def initialize_chat_session():
-    if "chat_session" not in st.session_state:
-        log_info("New user session started.")
+    Returns:
+        The updated knowledge base and the added/removed/modified row counts per
+        table, or (None, None) if a table could not be parsed.
+    """
+    updates, row_changes = {}, {}
+    for filename in sorted(changed_tables):
         try:
-            st.session_state.client = GeminiApiClient()
-            enriched_prompt = load_and_enrich_system_prompt()
-            if enriched_prompt:
-                dfs = load_csv_data_as_dfs()
-                # Use the new JSON formatting function
-                tables_data_json_str = format_data_for_prompt(dfs)
-                final_prompt = enriched_prompt + "\n\n---\n# Reference Data (JSON Format)\n\n" + tables_data_json_str
-                
-                try:
-                    with open(FINAL_PROMPT_OUTPUT_PATH, 'w', encoding='utf-8') as f:
-                        f.write(final_prompt)
-                    log_info(f"Successfully saved final prompt to {FINAL_PROMPT_OUTPUT_PATH}")
-                except Exception as e:
-                    log_error(f"Failed to save final prompt to file: {e}")
-
-                initial_token_count = st.session_state.client.count_tokens(final_prompt)
-                print(f"--- INITIAL PROMPT TOKEN COUNT (JSON OPTIMIZED): {initial_token_count} ---")
-                log_info("Initial prompt token count", count=initial_token_count)
-
-                st.session_state.chat_session = st.session_state.client.start_chat_session(final_prompt)
-                log_info("Chat session initialized successfully.")
+            records = load_table(tables_dir or SETTINGS_TABLES_PATH, filename)
+        except FileNotFoundError:
+            records = None
+        except Exception as e:
+            log_error(f"Error reloading settings table {filename}: {e}")
+            return None, None
+        updates[filename] = records
+        row_changes[filename] = diff_records(knowledge_base.tables.get(filename, ()), records or ())
+    return knowledge_base.with_tables(updates), row_changes
+
+def build_final_prompt(previous=None, changed_files=None, tenant: Tenant = None):
+    """
+    Builds the complete system prompt (template + reference data), the KPI dependency
+    graph, the retrieval index and the local answer engine, and saves a copy of the prompt to FINAL_PROMPT_OUTPUT_PATH for debugging (in the background).
+    Only called on a prompt cache miss.
+
+    When the previous artifact and the changed source files are given (a reload),
+    only the changed tables are re-parsed and re-serialized, and the template
+    segment and the indexes that do not depend on a changed table are reused.
+
+    `tenant` selects another customer's template and tables (see prompt_builder());
+    by default PROMPT_FILE_PATH and SETTINGS_TABLES_PATH are used. The debugging
+    copy is only written for the default tenant.
+
+    The build runs off the script thread, so it shows nothing itself: problems the
+    user should see are raised, or kept in the `notices` index when the prompt
+    can still be built (see await_artifact()).
+
+    Returns:
+        A (prompt text, indexes) tuple for the prompt cache, or None if a changed
+        table could not be parsed.
+
+    Raises:
+        ValueError: If the prompt template cannot be loaded.
+    """
+    build_start = time.perf_counter()
+    prompt_path = tenant.prompt_path if tenant is not None else PROMPT_FILE_PATH
+    tables_dir = tenant.tables_dir if tenant is not None else SETTINGS_TABLES_PATH
+    tenant_name = tenant.name if tenant is not None else DEFAULT_TENANT
+    old = previous.indexes if previous is not None and "prompt_segments" in previous.indexes else None
+    changed = set(changed_files or ())
+    changed_tables = {name for name in changed if name.endswith(".csv")}
+    rebuilt, reused = [], []
+    notices = []
+
+    def reuse(name, source_tables=None):
+        unaffected = not (changed_tables & source_tables) if source_tables is not None else not changed_tables
+        (reused if old is not None and unaffected else rebuilt).append(name)
+        return old is not None and unaffected
+
+    if old is not None and os.path.basename(prompt_path) not in changed:
+        enriched_prompt = old["prompt_segments"]["template"]
+        reused.append("template")
+    else:
+        enriched_prompt = load_and_enrich_system_prompt(prompt_path, notices)
+        rebuilt.append("template")
+    if not enriched_prompt:
+        raise ValueError(notices[0] if notices else f"System prompt file is empty: {prompt_path}")
+
+    row_changes = {}
+    if old is None:
+        knowledge_base = load_knowledge_base_tables(tables_dir, notices)
+    elif changed_tables:
+        knowledge_base, row_changes = reload_changed_tables(old["knowledge_base"], changed_tables, tables_dir)
+        if knowledge_base is None:
+            return None
+    else:
+        knowledge_base = old["knowledge_base"]
+    records = knowledge_base.tables
+
+    kpi_graph = old["kpi_graph"] if reuse("kpi_graph", GRAPH_SOURCE_TABLES) else KpiDependencyGraph(records)
+    retriever = old["retriever"] if reuse("retriever", RETRIEVER_SOURCE_TABLES) else KpiRetriever(records, graph=kpi_graph)
+    aliaser = None
+    if PROMPT_DATA_FORMAT == "compact":
+        aliaser = old["aliaser"] if reuse("aliaser") else GuidAliaser(records)
+        if old is not None and aliaser is not old["aliaser"] and aliaser.alias_by_guid == old["aliaser"].alias_by_guid:
+            # Same aliases: keep the old object so the unchanged table segments stay valid
+            aliaser = old["aliaser"]
+    local_answers = old["local_answers"] if reuse("local_answers") else LocalAnswerEngine(knowledge_base, kpi_graph)
+
+    table_segments = {}
+    if PROMPT_CONTEXT_MODE != "retrieval":
+        old_segments = old["prompt_segments"]["tables"] if old is not None else {}
+        for name, table_records in records.items():
+            if name in old_segments and name not in changed_tables and aliaser is (old or {}).get("aliaser"):
+                table_segments[name] = old_segments[name]
+                reused.append(name)
             else:
-                st.session_state.chat_session = None
-                log_error("Chat session initialization failed: Enriched prompt was empty.")
-        except ValueError as e:
-            log_error(f"Initialization failed: {e}")
-            st.error(f"Initialization failed: {e}")
-            st.session_state.chat_session = None
+                table_segments[name] = format_table_segment(name, table_records, aliaser)
+                rebuilt.append(name)
+    final_prompt = compose_final_prompt(enriched_prompt, table_segments, aliaser)
+
+    if tenant_name == DEFAULT_TENANT:
+        # A diagnostic only: written in the background, off the build path
+        get_background_executor().submit(save_final_prompt_copy, final_prompt)
+
+    build_seconds = time.perf_counter() - build_start
+    get_metrics().observe(PROMPT_BUILD, build_seconds, get_session_id(), mode=PROMPT_CONTEXT_MODE,
+                          data_format=PROMPT_DATA_FORMAT, incremental=old is not None, tenant=tenant_name)
+    if old is not None:
+        log_info("Prompt artifact rebuilt incrementally", tenant=tenant_name, changed_files=sorted(changed),
+                 row_changes=row_changes, rebuilt=rebuilt, reused=reused, build_seconds=build_seconds)
+    return final_prompt, {
+        "knowledge_base": knowledge_base,
+        "retriever": retriever,
+        "kpi_graph": kpi_graph,
+        "aliaser": aliaser,
+        "local_answers": local_answers,
+        "prompt_segments": {"template": enriched_prompt, "tables": table_segments},
+        "row_changes": row_changes,
+        "languages": available_languages(records),
+        "notices": notices,
+    }
+
+def compose_final_prompt(template: str, table_segments: Dict[str, str], aliaser: GuidAliaser = None) -> str:
+    """Joins the enriched template and the serialized tables (in retrieval mode, the data note instead)."""
+    if PROMPT_CONTEXT_MODE == "retrieval":
+        header = COMPACT_FORMAT_HEADER if aliaser else JSON_FORMAT_HEADER
+        return template + f"\n\n---\n{header}\n\n" + RETRIEVAL_DATA_NOTE
+    return template + "\n\n---\n" + join_table_segments(table_segments)
+
+def save_final_prompt_copy(final_prompt: str):
+    """Writes the debugging copy of the default tenant's prompt to FINAL_PROMPT_OUTPUT_PATH."""
+    try:
+        with open(FINAL_PROMPT_OUTPUT_PATH, 'w', encoding='utf-8') as f:
+            f.write(final_prompt)
+        log_info(f"Successfully saved final prompt to {FINAL_PROMPT_OUTPUT_PATH}")
+    except Exception as e:
+        log_error(f"Failed to save final prompt to file: {e}")
+
+def current_conversation() -> Union[Conversation, None]:
+    """Returns the running session's conversation, if the session store holds it."""
+    conversation_id = st.session_state.get("conversation_id")
+    return get_session_store().get(conversation_id) if conversation_id else None
+
+def session_artifact():
+    """Returns the prompt artifact of the running session's conversation, if any."""
+    conversation = current_conversation()
+    return conversation.artifact if conversation is not None else None
+
+def compose_user_message(user_question: str, artifact=None) -> str:
+    """
+    Attaches the precomputed dependency facts for the KPIs the question is about
+    and, in retrieval mode, the reference rows relevant to the question.
+    Uses the session's prompt artifact unless one is given.
+    """
+    artifact = artifact or session_artifact()
+    if artifact is None:
+        return user_question
+    retriever = artifact.indexes["retriever"]
+    kpi_graph = artifact.indexes["kpi_graph"]
+
+    sections = []
+    if PROMPT_CONTEXT_MODE == "retrieval":
+        result = retriever.select_context(user_question, top_k=RETRIEVAL_TOP_K, max_kpis=RETRIEVAL_MAX_KPIS)
+        log_info("Retrieved reference data", kpis=[retriever.kpi_name(kpi_id) for kpi_id in result.kpi_ids])
+        tables = result.tables
+        language = artifact.indexes.get("language")
+        if language and LOCALIZATION_TABLE in tables:
+            tables = dict(tables, **{LOCALIZATION_TABLE: localization_for_language(tables[LOCALIZATION_TABLE], language)})
+        sections.append(format_reference_data(tables, artifact.indexes["aliaser"]))
+
+    focus_ids = retriever.mentioned_kpis(user_question) or [
+        kpi_id for kpi_id, _ in retriever.search(user_question, top_k=DEPENDENCY_FACTS_TOP_K)
+    ]
+    dependency_facts = kpi_graph.describe(focus_ids)
+    if dependency_facts:
+        sections.append(dependency_facts)
+
+    if not sections:
+        return user_question
+    sections.append(f"# Question\n\n{user_question}")
+    message = "\n\n---\n".join(sections)
+    aliaser = artifact.indexes["aliaser"]
+    return aliaser.encode_text(message) if aliaser else message
+
+def answer_locally(user_question: str, artifact=None):
+    """
+    Answers a pure KPI lookup from the settings tables, without a model call, and
+    records how long it took and how much model time it saved (the process-wide
+    median model call). Returns the LocalAnswer, or None if the model should answer.
+    """
+    artifact = artifact or session_artifact()
+    engine = artifact.indexes.get("local_answers") if artifact else None
+    if engine is None:
+        return None
+    answer = engine.answer(user_question)
+    metrics = get_metrics()
+    if answer is None:
+        metrics.increment("local_answer_fallthrough")
+        return None
+    metrics.observe(LOCAL_ANSWER, answer.seconds, get_session_id(), intents=",".join(answer.intents))
+    metrics.increment("local_answers")
+    model_p50 = metrics.span_quantile(MODEL_CALL, 0.5)
+    if model_p50:
+        metrics.increment("local_answer_seconds_saved", max(0.0, model_p50 - answer.seconds))
+    log_info("Local answer", kpi=answer.kpi_id, intents=list(answer.intents),
+             seconds=answer.seconds, **engine.stats())
+    return answer
+
+def route_question(user_question: str, chat_session, artifact=None, force_pro: bool = False):
+    """
+    Picks the model tier for a question from local signals (length, KPIs named,
+    dependency analysis, conversation depth) and switches a TieredChatSession to it.
+    Returns the RoutingDecision.
+    """
+    artifact = artifact or session_artifact()
+    retriever = artifact.indexes["retriever"] if artifact else None
+    kpi_count = len(retriever.mentioned_kpis(user_question)) if retriever else 0
+    depth = len(chat_session.history) // 2
+    decision = get_model_router().route(user_question, kpi_count, depth, force_pro=force_pro)
+    if isinstance(chat_session, TieredChatSession):
+        chat_session.use(decision.tier)
+    log_info("Model routing", **decision.as_dict())
+    return decision
+
+def decode_answer(text: str, artifact=None) -> str:
+    """Rewrites GUID aliases in a model answer back to the real GUIDs."""
+    artifact = artifact or session_artifact()
+    aliaser = artifact.indexes.get("aliaser") if artifact else None
+    return aliaser.decode_text(text) if aliaser else text
+
+def apply_history_budget(chat_session):
+    """
+    Trims the chat session history to HISTORY_TOKEN_BUDGET before the next request
+    and reports how many history tokens are sent and saved.
+    """
+    history_manager = HistoryManager(HISTORY_TOKEN_BUDGET, HISTORY_KEEP_TURNS, HISTORY_COMPACTION)
+    history, report = history_manager.compact([content_to_dict(c) for c in chat_session.history])
+    if report.changed:
+        chat_session.history = history
+    log_info("History budget applied", **report.as_dict())
+    return report
+
+def get_chunk_text(chunk) -> str:
+    """Returns the text of a streamed chunk; chunks without text parts yield ''."""
+    try:
+        return chunk.text
+    except ValueError:
+        return ""
+
+# --- SETTINGS HOT RELOAD ---
+
+def log_settings_reload(report: dict):
+    """Records a background reload of the settings tables (called by the watcher thread)."""
+    log_info("Settings tables reloaded", **report)
+    get_metrics().observe(SETTINGS_RELOAD, report["reload_seconds"], None, rows_changed=report["rows_changed"])
+    release_context_caches("settings reloaded")
+
+def start_settings_hot_reload(tenant: Tenant):
+    """Starts the settings watcher of a tenant once per process; later calls are no-ops."""
+    if SETTINGS_HOT_RELOAD:
+        start_settings_watcher(get_tenant_prompt_cache(tenant), prompt_builder(tenant),
+                               SETTINGS_RELOAD_INTERVAL_SECONDS,
+                               on_reload=lambda report: log_settings_reload(dict(report, tenant=tenant.name)),
+                               incremental=True)
+
+def release_context_caches(reason: str):
+    """
+    Deletes the server-side cached contexts of the prompts no conversation in
+    memory uses any more: replaced by a settings reload, of an evicted tenant, or
+    of a language variant nobody is on. Conversations still on an older prompt
+    keep theirs; it goes on a later release or when its TTL expires.
+    """
+    keep = get_session_store().prompt_hashes()
+    for manager in get_context_cache_managers():
+        deleted = manager.evict(keep_hashes=keep)
+        if deleted:
+            log_info("Context caches released", reason=reason, model=manager.model_name, prompt_hashes=deleted)
+
+# --- TENANTS ---
+# Each PromoTool customer (tenant) has its own prompt template and settings tables.
+# The bundled config_data is the default tenant; more are found in TENANTS_DIR.
+
+def prompt_builder(tenant: Tenant):
+    """Returns the prompt cache builder for a tenant (build_final_prompt bound to its sources)."""
+    return functools.partial(build_final_prompt, tenant=tenant)
+
+def get_tenant_prompt_cache(tenant: Tenant) -> PromptArtifactCache:
+    return get_prompt_cache(tenant.prompt_path, tenant.tables_dir, variant=PROMPT_VARIANT)
+
+def load_tenant(tenant: Tenant):
+    """Registry loader: the tenant's shared prompt artifact, kept fresh by its settings watcher."""
+    artifact = get_tenant_prompt_cache(tenant).get(prompt_builder(tenant), incremental=True)
+    if artifact is not None:
+        start_settings_hot_reload(tenant)
+    return artifact
+
+def log_tenant_load(tenant: Tenant, report: dict):
+    log_info("Tenant knowledge base loaded", tenant=tenant.name, **report)
+
+def unload_tenant(tenant: Tenant):
+    """Releases an evicted tenant's prompt cache and stops its settings watcher."""
+    prompt_cache = drop_prompt_cache(tenant.prompt_path, tenant.tables_dir, variant=PROMPT_VARIANT)
+    if prompt_cache is not None:
+        stop_settings_watcher(prompt_cache)
+    get_prompt_languages().drop_tenant(tenant.name)
+    log_info("Tenant knowledge base evicted", tenant=tenant.name)
+    release_context_caches("tenant evicted")
+
+def get_tenants() -> TenantRegistry:
+    """Returns the process-wide tenant registry."""
+    default = Tenant(DEFAULT_TENANT, PROMPT_FILE_PATH, SETTINGS_TABLES_PATH)
+    return get_tenant_registry(default, load_tenant, on_load=log_tenant_load, on_evict=unload_tenant)
+
+# --- LANGUAGE VARIANTS ---
+# CustomLocalization holds the KPI display names in several UI languages, but a
+# session only needs its own: each language gets a prompt variant with only its
+# rows (falling back to en), derived from the tenant's artifact and cached.
+
+def build_language_variant(artifact, language: str):
+    """
+    Variant builder: the artifact's prompt with the CustomLocalization segment
+    re-serialized for `language` and a note on the fallbacks. The other segments
+    and the indexes are shared with the full artifact.
+
+    Returns:
+        A (prompt text, indexes) tuple.
+    """
+    indexes = dict(artifact.indexes)
+    segments = indexes["prompt_segments"]
+    aliaser = indexes.get("aliaser")
+    tables = dict(segments["tables"])
+    if LOCALIZATION_TABLE in tables:
+        localization = indexes["knowledge_base"].tables.get(LOCALIZATION_TABLE, ())
+        tables[LOCALIZATION_TABLE] = format_table_segment(LOCALIZATION_TABLE,
+                                                          localization_for_language(localization, language), aliaser)
+    template = segments["template"] + "\n\n" + LANGUAGE_NOTE.format(language=language, fallback=FALLBACK_LANGUAGE)
+    indexes["prompt_segments"] = {"template": segments["template"], "tables": tables}
+    indexes["local_answers"] = LocalAnswerEngine(indexes["knowledge_base"], indexes["kpi_graph"], language=language)
+    indexes["language"] = language
+    return compose_final_prompt(template, tables, aliaser), indexes
+
+def log_language_variant(report: dict):
+    log_info("Language prompt variant built", **report)
+
+def get_prompt_languages():
+    """Returns the process-wide cache of language variants."""
+    return get_language_variants(build_language_variant, count_tokens=estimate_tokens, on_build=log_language_variant)
+
+def tenant_languages(artifact) -> List[str]:
+    """The UI languages of a tenant's CustomLocalization table."""
+    return list(artifact.indexes.get("languages", ())) if artifact is not None else []
+
+def language_artifact(tenant: str, language: str):
+    """
+    The tenant's prompt artifact for a session language: the cached variant with
+    only that language's localization rows, or the full artifact when variants are
+    off (PROMPT_LANGUAGE_SCOPED) or the tables have a single language. Languages
+    the tables do not have use the en variant. None if the prompt cannot be built.
+    """
+    artifact = get_tenants().get(tenant)
+    languages = tenant_languages(artifact)
+    if not PROMPT_LANGUAGE_SCOPED or len(languages) <= 1:
+        return artifact
+    if language not in languages:
+        language = FALLBACK_LANGUAGE
+    return get_prompt_languages().get(tenant, artifact, language)
+
+# --- PROCESS WARM-UP ---
+
+def warm_up() -> dict:
+    """
+    Builds the state shared by all sessions (prompt artifact with its indexes, token
+    estimator, answer cache, Gemini SDK import) once per process, so the first user
+    does not pay for it. Called by run_chatbot.py before the server starts; safe to
+    call again (later calls return the first report).
+
+    Returns:
+        Step name -> {"seconds", "error"} for each warm-up step.
+    """
+    def build_prompt_artifact():
+        # Only the default tenant is loaded up front; the others on their first session
+        artifact = get_tenants().get()
+        if artifact is None:
+            raise RuntimeError("The system prompt could not be built")
+        get_token_estimator().estimate(artifact.text)
+
+    steps = {"prompt_artifact": build_prompt_artifact}
+    if os.getenv("MODEL_CLIENT", "gemini").lower() == "gemini":
+        steps["gemini_sdk"] = lambda: __import__("google.generativeai")
+    if ANSWER_CACHE_ENABLED:
+        steps["answer_cache"] = get_answer_cache
+    report = run_warm_up(steps)
+    log_info("Warm-up finished", steps=report)
+    return report
+
+# --- SESSION INITIALIZATION ---
+
+def new_chat_session(artifact) -> TieredChatSession:
+    """Starts a conversation's model-side session on the process-wide clients and the shared prompt."""
+    # The pro session starts right away; the fast one on the first routed question
+    return TieredChatSession(get_model_client, artifact.text, prompt_hash=artifact.content_hash, tier=PRO_TIER)
+
+def start_conversation(tenant: str, language: str = DEFAULT_LANGUAGE) -> Conversation:
+    """
+    Starts a new conversation for a tenant and adds it to the session store right
+    away, with its welcome message, so the UI renders without waiting. The prompt
+    artifact, the model client and the chat session are set up on the background
+    executor (see prepare_conversation()); the first question waits only for the
+    parts it needs (await_artifact(), await_chat_session()).
+    """
+    log_info("New user session started.", tenant=tenant, language=language)
+    conversation = Conversation(id=SessionStore.new_id(), tenant=tenant, artifact=None, chat_session=None,
+                                language=language,
+                                messages=[{"role": "assistant", "content": get_random_welcome_message()}])
+    executor = get_background_executor()
+    conversation.artifact_ready = executor.submit(language_artifact, tenant, language)
+    conversation.session_ready = executor.submit(prepare_conversation, conversation, get_session_id())
+    return get_session_store().add(conversation)
+
+def prepare_conversation(conversation: Conversation, session_id: Union[str, None]):
+    """
+    Background part of start_conversation(): creates the model client while the
+    prompt artifact is fetched (or built), then starts the chat session. The token
+    count is estimated locally; with TOKEN_COUNT_VERIFY the remote count runs as a
+    separate background task and replaces the estimate when it arrives.
+
+    Raises:
+        ValueError: If the system prompt could not be built (shown by await_chat_session()).
+    """
+    init_start = time.perf_counter()
+    client = get_model_client()
+    artifact = conversation.artifact_ready.result()
+    if artifact is None:
+        raise ValueError(get_tenants().last_error(conversation.tenant)
+                         or "Chat session initialization failed: Enriched prompt was empty.")
+    tenants = get_tenants()
+    log_info("Prompt artifact ready", tenant=conversation.tenant, language=conversation.language,
+             **get_tenant_prompt_cache(tenants.tenants[conversation.tenant]).stats())
+
+    initial_token_count = get_token_estimator().estimate(artifact.text)
+    conversation.artifact = artifact
+    conversation.prompt_tokens = initial_token_count
+    conversation.chat_session = new_chat_session(artifact)
+    if TOKEN_COUNT_VERIFY:
+        get_background_executor().submit(verify_prompt_tokens, conversation, client, artifact)
+    if client.context_cache is not None:
+        log_info("Context cache state", **client.context_cache.snapshot())
+    get_metrics().observe(SESSION_INIT, time.perf_counter() - init_start, session_id)
+    log_info("Chat session initialized successfully.", conversation_id=conversation.id,
+             prompt_tokens=initial_token_count, init_seconds=time.perf_counter() - init_start)
+
+def verify_prompt_tokens(conversation: Conversation, client, artifact):
+    """Counts the prompt tokens with the model's tokenizer (a remote call) and updates the conversation."""
+    try:
+        token_count = get_token_estimator().verify(artifact.text, label=f"system_prompt:{artifact.content_hash[:12]}",
+                                                   counter=client.count_tokens)
+    except Exception as e:
+        log_error(f"Prompt token count verification failed: {e}", conversation_id=conversation.id)
+        return
+    # Unless the conversation was moved to reloaded settings in the meantime
+    if conversation.artifact is artifact:
+        conversation.prompt_tokens = token_count
+    log_info("Initial prompt token count", count=token_count, verified=True, conversation_id=conversation.id)
+
+def await_artifact(conversation: Conversation):
+    """
+    Waits for a new conversation's prompt artifact (not for its chat session) and
+    shows the problems met while building it. Returns None on failure.
+    """
+    if conversation.artifact is None and conversation.artifact_ready is not None:
+        try:
+            conversation.artifact = conversation.artifact_ready.result()
+        except Exception as e:
+            log_error(f"Prompt artifact could not be loaded: {e}", conversation_id=conversation.id)
+    # Once per conversation; the artifact may have arrived before the first question
+    if conversation.artifact is not None and st.session_state.get("notices_shown") != conversation.id:
+        st.session_state.notices_shown = conversation.id
+        for notice in conversation.artifact.indexes.get("notices", ()):
+            st.warning(notice)
+    return conversation.artifact
+
+def await_chat_session(conversation: Conversation) -> bool:
+    """
+    Waits for a new conversation's background setup to finish. If it failed, the
+    error it raised is shown here, on the script thread, and the conversation is
+    dropped, so the next run starts over.
+
+    Returns:
+        Whether the conversation has a chat session.
+    """
+    if conversation.chat_session is None and conversation.session_ready is not None:
+        try:
+            with st.spinner("Starting the chat session..."):
+                conversation.session_ready.result()
         except Exception as e:
-            log_error(f"An unexpected error occurred during initialization: {e}")
-            st.error(f"An unexpected error occurred during initialization: {e}")
-            st.session_state.chat_session = None
+            report_setup_failure(conversation, e)
+    return conversation.chat_session is not None
+
+def report_setup_failure(conversation: Conversation, error: Exception):
+    if isinstance(error, ValueError):
+        log_error(f"Initialization failed: {error}", conversation_id=conversation.id)
+        st.error(f"Initialization failed: {error}")
+    else:
+        log_error(f"An unexpected error occurred during initialization: {error}", conversation_id=conversation.id)
+        st.error(f"An unexpected error occurred during initialization: {error}")
+    reset_conversation()
+
+def resume_conversation(conversation_id: str) -> Union[Conversation, None]:
+    """
+    Rebuilds a conversation evicted from memory from its transcript: the displayed
+    messages and the model-side history are restored on the shared prompt artifact
+    of its tenant (the variant of the session's language), without a model call.
+    Returns None if there is no transcript.
+    """
+    store = get_session_store()
+    resume_start = time.perf_counter()
+    transcript = store.load(conversation_id)
+    tenants = get_tenants()
+    if transcript is None or transcript["tenant"] not in tenants.tenants:
+        return None
+    language = st.session_state.get("language", DEFAULT_LANGUAGE)
+    artifact = language_artifact(transcript["tenant"], language)
+    if artifact is None:
+        return None
+    conversation = Conversation(
+        id=conversation_id, tenant=transcript["tenant"], artifact=artifact, chat_session=None,
+        prompt_tokens=get_token_estimator().estimate(artifact.text), messages=transcript["messages"],
+        archived_messages=transcript["archived_messages"], persisted_messages=transcript["message_count"],
+        resumed=True, language=language,
+    )
+    # Registered before the chat session binds a context cache, as in prepare_conversation():
+    # release_context_caches() keeps the caches of the prompts held by the store
+    store.add(conversation)
+    try:
+        chat_session = new_chat_session(artifact)
+    except Exception:
+        store.discard(conversation_id)
+        raise
+    chat_session.history = transcript["history"]
+    conversation.chat_session = chat_session
+    resume_seconds = time.perf_counter() - resume_start
+    get_metrics().observe(SESSION_RESUME, resume_seconds, get_session_id())
+    # The settings may have been reloaded while the conversation was evicted
+    log_info("Conversation resumed from transcript", conversation_id=conversation_id, tenant=conversation.tenant,
+             messages=transcript["message_count"], settings_changed=transcript["prompt_hash"] != artifact.content_hash,
+             resume_seconds=resume_seconds)
+    return conversation
+
+def initialize_chat_session() -> Conversation:
+    """
+    Returns the session's conversation: the one held by the session store, the one
+    resumed from its transcript after an idle eviction (also after a page reload,
+    through the `?conversation=` URL parameter), or a new one. st.session_state
+    only keeps the conversation id, the tenant and the language. A new conversation is returned
+    before its chat session is ready (see start_conversation()).
+
+    The URL parameter is a signed link (see resume_links.py): a bare or forged
+    conversation id starts a new conversation. The URL gives access to the
+    conversation to whoever has it.
+    """
+    conversation_id = st.session_state.get("conversation_id")
+    if not conversation_id and st.query_params.get("conversation"):
+        conversation_id = get_resume_links().conversation_id(st.query_params.get("conversation"))
+        if conversation_id is None:
+            log_info("Conversation link rejected: invalid signature")
+    conversation = get_session_store().get(conversation_id) if conversation_id else None
+    if conversation is None and conversation_id:
+        conversation = resume_conversation(conversation_id)
+        if conversation is None and "conversation_id" in st.session_state:
+            st.info("The previous conversation expired after a period of inactivity, so a new one was started.")
+    setup = conversation.session_ready if conversation is not None else None
+    if setup is not None and setup.done() and setup.exception() is not None:
+        report_setup_failure(conversation, setup.exception())
+        conversation = None
+    if conversation is None:
+        conversation = start_conversation(st.session_state.tenant, st.session_state.get("language", DEFAULT_LANGUAGE))
+    st.session_state.conversation_id = conversation.id
+    st.session_state.tenant = conversation.tenant
+    st.query_params["conversation"] = get_resume_links().token(conversation.id)
+    return conversation
+
+def refresh_knowledge_base(conversation: Conversation, artifact):
+    """Moves a conversation onto a reloaded (or another language's) prompt artifact, keeping its history."""
+    conversation.chat_session.restart(artifact.text, prompt_hash=artifact.content_hash)
+    conversation.artifact = artifact
+    conversation.language = artifact.indexes.get("language", conversation.language)
+    conversation.prompt_tokens = get_token_estimator().estimate(artifact.text)
+    log_info("Session moved to reloaded settings", version=artifact.version, content_hash=artifact.content_hash,
+             language=conversation.language)
+    release_context_caches("session moved to another prompt")
 
 # --- UI RENDERING ---
 
+def reset_conversation():
+    """Leaves the session's conversation (its transcript is kept), so the next run starts a new one."""
+    conversation_id = st.session_state.pop("conversation_id", None)
+    if conversation_id:
+        get_session_store().discard(conversation_id)
+    st.query_params.pop("conversation", None)
+
+def resolve_tenant():
+    """Picks the tenant of a new session: the `?tenant=` URL parameter, or the default tenant."""
+    tenants = get_tenants()
+    if "tenant" not in st.session_state:
+        requested = st.query_params.get("tenant")
+        st.session_state.tenant = requested if requested in tenants.tenants else tenants.default
+
+def resolve_language():
+    """
+    Picks the UI language of a new session: the `?lang=` URL parameter, else the
+    browser's Accept-Language preference among the languages of the tenant's
+    CustomLocalization table, else DEFAULT_LANGUAGE.
+    """
+    if "language" in st.session_state:
+        return
+    requested = st.query_params.get("lang")
+    if requested:
+        st.session_state.language = requested
+        return
+    try:
+        accept_language = st.context.headers.get("Accept-Language")
+    except Exception:
+        accept_language = None
+    languages = tenant_languages(get_tenants().get(st.session_state.tenant)) if accept_language else []
+    st.session_state.language = detect_language(accept_language, languages) or DEFAULT_LANGUAGE
+
+def change_language(conversation: Conversation):
+    """Moves the conversation onto the prompt variant of the newly selected language."""
+    if conversation.chat_session is None:
+        return
+    artifact = language_artifact(conversation.tenant, st.session_state.language)
+    if artifact is not None and artifact.content_hash != conversation.prompt_hash:
+        refresh_knowledge_base(conversation, artifact)
+
+def render_language_selector(conversation: Conversation):
+    """
+    Shows the language selector when the tenant's localization has more than one
+    language and language-scoped prompts are on. The conversation continues on
+    the selected language's prompt variant.
+    """
+    if not PROMPT_LANGUAGE_SCOPED or conversation.artifact is None:
+        return
+    languages = tenant_languages(get_tenants().get(conversation.tenant))
+    if len(languages) <= 1:
+        return
+    if st.session_state.get("language") not in languages:
+        st.session_state.language = conversation.language if conversation.language in languages else FALLBACK_LANGUAGE
+    st.sidebar.selectbox("KPI names language", languages, key="language", on_change=change_language,
+                         args=(conversation,),
+                         help="Only this language's KPI localizations are sent to the model.")
+
+def render_tenant_selector():
+    """
+    Shows the tenant selector when there is more than one tenant. Switching
+    tenants starts a new conversation.
+    """
+    names = get_tenants().names()
+    if len(names) > 1:
+        st.sidebar.selectbox("Customer", names, key="tenant", on_change=reset_conversation,
+                             help="Whose PromoTool configuration to answer from. Starts a new conversation.")
+
+def render_settings_update_notice(conversation: Conversation):
+    """
+    Offers to move an existing conversation onto reloaded settings. New sessions
+    pick the reloaded prompt up automatically; running ones keep the prompt they
+    started with until the user opts in.
+    """
+    if conversation.chat_session is None:
+        return
+    # Also marks the tenant as in use. With the watcher running the artifact is kept
+    # fresh in the background; otherwise the files are checked here
+    latest = language_artifact(conversation.tenant, conversation.language)
+    if latest is None or latest.content_hash == conversation.prompt_hash:
+        return
+    with st.sidebar:
+        st.info(f"The PromoTool configuration was updated "
+                f"(version {conversation.artifact.version} → {latest.version}).")
+        if st.button("Refresh knowledge base", help="Continue this conversation with the updated tables."):
+            refresh_knowledge_base(conversation, latest)
+            st.success("This conversation now uses the updated configuration.")
+
+def render_message(message: dict):
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        for note in message_notes(message):
+            st.caption(note)
+
+def render_history(conversation: Conversation) -> int:
+    """
+    Renders the conversation's last HISTORY_RECENT_MESSAGES messages. Earlier
+    ones are behind a toggle, a page at a time (see render_earlier_messages()),
+    so a rerun costs the same however long the conversation is.
+
+    Returns:
+        The number of messages rendered.
+    """
+    total = conversation.message_count
+    recent_start = max(total - HISTORY_RECENT_MESSAGES, conversation.archived_messages)
+    # Messages moved out of memory can be shown from the transcript, if there is one
+    first = 0 if get_session_store().transcripts is not None else conversation.archived_messages
+    if first:
+        st.caption(f"{first} earlier messages are no longer kept.")
+    rendered = render_earlier_messages(conversation, first, recent_start) if recent_start > first else 0
+    for message in conversation.messages[recent_start - conversation.archived_messages:]:
+        render_message(message)
+    return rendered + total - recent_start
+
+def render_earlier_messages(conversation: Conversation, first: int, end: int) -> int:
+    """
+    Shows the messages from position `first` to `end` on request, one page of
+    HISTORY_PAGE_SIZE at a time (the newest page first). A page is rendered to
+    markdown once and reused on later reruns (see RenderedPageCache).
+
+    Returns:
+        The number of messages rendered.
+    """
+    if not st.toggle(f"Show {end - first} earlier messages", key="show_earlier_messages"):
+        return 0
+    pages = history_pages(first, end, HISTORY_PAGE_SIZE)
+    page = pages[-1]
+    if len(pages) > 1:
+        page = st.selectbox("Earlier messages", pages, index=len(pages) - 1, format_func=lambda p: p.label,
+                            label_visibility="collapsed")
+    store = get_session_store()
+    markdown = get_rendered_pages().get(
+        conversation.id, page,
+        lambda: page_markdown(store.messages_between(conversation, page.start, page.end), page.start),
+    )
+    with st.container(border=True):
+        st.markdown(markdown)
+    return page.end - page.start
+
+def render_metrics_panel():
+    """Shows p50/p95/p99 of every span, for this session and for all sessions of the process."""
+    metrics = get_metrics()
+    with st.sidebar.expander("Performance"):
+        for title, summary in (("This session", metrics.session_summary(get_session_id())),
+                               ("All sessions", metrics.process_summary())):
+            rows = [
+                {"span": name, "count": h["count"], "p50 (s)": h["p50"], "p95 (s)": h["p95"], "p99 (s)": h["p99"]}
+                for name, h in summary["spans"].items()
+            ]
+            if rows:
+                st.caption(title)
+                st.table(rows)
+        store_stats = get_session_store().stats()
+        st.caption(f"Conversations in memory: {store_stats['active']} ({store_stats['messages_in_memory']} messages), "
+                   f"evicted when idle: {store_stats.get('evicted', 0)}, resumed: {store_stats.get('resumed', 0)}")
+        page_stats = get_rendered_pages().stats()
+        st.caption(f"Rendered history pages: {page_stats['pages']} cached, {page_stats['hits']} hits, "
+                   f"{page_stats['misses']} misses")
+        tenant_stats = get_tenants().stats()
+        if len(tenant_stats["tenants"]) > 1:
+            st.caption(f"Tenants ({tenant_stats['memory_mb']:.1f} of {tenant_stats['memory_cap_mb']:.0f} MB)")
+            st.table([
+                {"tenant": name, "loaded": t["loaded"], "load (s)": t["load_seconds"], "memory (MB)": t["memory_mb"],
+                 "loads": t["loads"], "evictions": t["evictions"]}
+                for name, t in tenant_stats["tenants"].items()
+            ])
+        variants = get_prompt_languages().stats()["variants"]
+        if variants:
+            st.caption("Language prompt variants")
+            st.table([
+                {"tenant": v["tenant"], "language": v["language"], "chars": v["chars"],
+                 "chars saved": v["chars_saved"], "tokens": v.get("tokens"), "tokens saved": v.get("tokens_saved"),
+                 "build (s)": v["build_seconds"]}
+                for v in variants
+            ])
+        growth = metrics.session_summary(get_session_id())["prompt_growth"]
+        if growth:
+            st.caption("Prompt tokens per request (this session)")
+            st.line_chart({"prompt tokens": [tokens for _, tokens in growth]})
+
 def main():
+    script_start = time.perf_counter()
     st.set_page_config(page_title="PromoTool Chatbot", page_icon="🤖")
     st.title("🤖 PromoTool Assistant")
     st.caption("Я надаю підтримку з питань, що стосуються функціоналу та конфігурації PromoTool, використовуючи офіційну внутрішню інформацію")
 
-    initialize_chat_session()
+    resolve_tenant()
+    resolve_language()
+    conversation = initialize_chat_session()
+    render_tenant_selector()
+    render_language_selector(conversation)
+    render_settings_update_notice(conversation)
 
-    if "messages" not in st.session_state:
-        welcome_message = get_random_welcome_message()
-        st.session_state.messages = [{"role": "assistant", "content": welcome_message}]
+    if ANSWER_CACHE_ENABLED:
+        st.sidebar.checkbox("Bypass answer cache", key="bypass_answer_cache",
+                            help="Always ask the model, even if this question was answered before.")
+    st.sidebar.checkbox("Always use the pro model", key="force_pro_model",
+                        help="Skip routing simple questions to the faster model.")
 
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    render_start = time.perf_counter()
+    rendered = render_history(conversation)
+    get_metrics().observe(RENDER_HISTORY, time.perf_counter() - render_start, get_session_id(),
+                          messages=rendered, total_messages=conversation.message_count)
 
-    if user_question := st.chat_input("Ask about PromoTool..."):
-        st.session_state.messages.append({"role": "user", "content": user_question})
-        with st.chat_message("user"):
-            st.markdown(user_question)
+    if SHOW_METRICS_PANEL:
+        render_metrics_panel()
 
-        if st.session_state.chat_session is None:
-            st.error("The chat session is not available. Please check your API key and system prompt file.")
-            return
+    user_question = st.chat_input("Ask about PromoTool...")
+    if "interactive" not in st.session_state:
+        # The first run of a browser session: the page and the input are on screen
+        st.session_state.interactive = True
+        interactive_seconds = time.perf_counter() - script_start
+        get_metrics().observe(TIME_TO_INTERACTIVE, interactive_seconds, get_session_id())
+        log_info("Session interactive", seconds=interactive_seconds,
+                 chat_session_ready=conversation.chat_session is not None)
+
+    if user_question:
+        try:
+            answer_question(conversation, user_question)
+        finally:
+            if conversation.chat_session is not None:
+                # After every turn, so the conversation can be resumed if it is evicted
+                get_session_store().save(conversation)
+
+def answer_cache_key(prompt_hash: str, tier: str) -> str:
+    """The answer cache key of a prompt version and the model tier that answered (shared with run_batch.py)."""
+    return f"{PROMPT_VARIANT}:{tier}:{prompt_hash}"
+
+def export_metrics():
+    """Writes the Prometheus metrics file (rate-limited); a failure is only logged, the answer is already stored."""
+    try:
+        get_metrics().export()
+    except Exception as e:
+        log_error(f"Metrics export failed: {e}")
+
+def answer_question(conversation: Conversation, user_question: str):
+    """Answers one question of a conversation: locally, from the answer cache or from the model."""
+    store = get_session_store()
+    store.append(conversation, {"role": "user", "content": user_question})
+    with st.chat_message("user"):
+        st.markdown(user_question)
+
+    # On a new conversation's first question, wait only for what each path needs:
+    # a local answer needs the prompt artifact, a model answer the chat session too
+    artifact = await_artifact(conversation)
+    if artifact is None:
+        # Shows why the setup failed
+        await_chat_session(conversation)
+        st.error("The chat session is not available. Please check your API key and system prompt file.")
+        return
 
+    # Pure lookups are answered from the tables in milliseconds, without the model
+    local_answer = answer_locally(user_question, artifact) if LOCAL_ANSWERS_ENABLED else None
+    if local_answer is not None:
+        log_info("User request", payload=user_question, local_answer=True)
         with st.chat_message("assistant"):
+            st.markdown(local_answer.text)
+            st.caption(LOCAL_ANSWER_NOTE)
+        store.append(conversation, {"role": "assistant", "content": local_answer.text, "local": True})
+        if not await_chat_session(conversation):
+            return
+        chat_session = conversation.chat_session
+        # Keep the model-side history consistent for follow-up questions
+        chat_session.history = [content_to_dict(c) for c in chat_session.history] + [
+            {"role": "user", "parts": [user_question]},
+            {"role": "model", "parts": [local_answer.text]},
+        ]
+        export_metrics()
+        return
+
+    if not await_chat_session(conversation):
+        return
+    chat_session = conversation.chat_session
+    message_to_model = compose_user_message(user_question, artifact)
+    # Routed first: cached answers are only served for the tier that would answer now
+    routing = route_question(user_question, chat_session, artifact,
+                             force_pro=st.session_state.get("force_pro_model", False))
+
+    # Only first-turn questions are cached: a follow-up depends on the conversation
+    answer_cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+    kb_hash = answer_cache_key(conversation.prompt_hash, routing.tier)
+    use_answer_cache = answer_cache is not None and not chat_session.history
+    if use_answer_cache and st.session_state.get("bypass_answer_cache"):
+        answer_cache.record_bypass()
+        use_answer_cache = False
+
+    if use_answer_cache:
+        cached_answer = answer_cache.get(user_question, kb_hash)
+        if cached_answer is not None:
+            log_info("User request", payload=user_question, answer_cache="hit", tier=routing.tier)
+            with st.chat_message("assistant"):
+                st.markdown(cached_answer)
+            store.append(conversation, {"role": "assistant", "content": cached_answer, "cached": True})
+            # Keep the model-side history consistent for follow-up questions
+            chat_session.history = [
+                {"role": "user", "parts": [message_to_model]},
+                {"role": "model", "parts": [cached_answer]},
+            ]
+            log_info("Answer cache hit", **answer_cache.stats())
+            export_metrics()
+            return
+
+    with st.chat_message("assistant"):
+        placeholder = st.empty()
+        response_text = ""
+        request_start = time.perf_counter()
+        ttft_seconds = None
+        render_seconds = 0.0
+        try:
+            log_info("User request", payload=user_question)
+            get_request_logger().info("request")
+
             with st.spinner("Consulting the knowledge base..."):
+                history_report = apply_history_budget(chat_session)
+                # Shared rate limits: the scheduler reserves the known prompt size and retries 429s
+                estimated_tokens = (conversation.prompt_tokens + history_report.history_tokens_sent
+                                    + estimate_tokens(message_to_model))
+                response = get_request_scheduler().send_message(
+                    get_session_id(), chat_session, message_to_model, estimated_tokens
+                )
+
+            for chunk in response:
+                chunk_text = get_chunk_text(chunk)
+                if not chunk_text:
+                    continue
+                if ttft_seconds is None:
+                    ttft_seconds = time.perf_counter() - request_start
+                response_text += chunk_text
+                render_start = time.perf_counter()
+                placeholder.markdown(decode_answer(response_text, artifact) + "▌")
+                render_seconds += time.perf_counter() - render_start
+            generation_seconds = time.perf_counter() - request_start
+            # The model answers with GUID aliases; show and store the real GUIDs
+            render_start = time.perf_counter()
+            response_text = decode_answer(response_text, artifact)
+            placeholder.markdown(response_text)
+            render_seconds += time.perf_counter() - render_start
+
+            usage = response.usage_metadata
+            session_id = get_session_id()
+            metrics = get_metrics()
+            if ttft_seconds is not None:
+                metrics.observe(TIME_TO_FIRST_TOKEN, ttft_seconds, session_id, tier=routing.tier)
+                metrics.observe(tiered(TIME_TO_FIRST_TOKEN, routing.tier), ttft_seconds, session_id)
+            metrics.observe(MODEL_CALL, generation_seconds, session_id, tier=routing.tier)
+            metrics.observe(tiered(MODEL_CALL, routing.tier), generation_seconds, session_id)
+            metrics.observe(RENDER_STREAM, render_seconds, session_id)
+            metrics.record_usage(session_id, usage, history_tokens=history_report.history_tokens_sent,
+                                 tier=routing.tier)
+            log_info("LLM response", payload=response_text, usage=str(usage), tier=routing.tier,
+                     ttft_seconds=ttft_seconds, generation_seconds=generation_seconds,
+                     history_tokens_sent=history_report.history_tokens_sent,
+                     history_tokens_saved=history_report.tokens_saved)
+
+            store.append(conversation, {
+                "role": "assistant",
+                "content": response_text,
+                "metrics": {"ttft_seconds": ttft_seconds, "generation_seconds": generation_seconds,
+                            "tier": routing.tier},
+            })
+            if use_answer_cache and response_text:
+                answer_cache.put(user_question, kb_hash, response_text)
+            export_metrics()
+        except Exception as e:
+            log_error(f"An error occurred while communicating with the Gemini API: {e}",
+                      partial_length=len(response_text), ttft_seconds=ttft_seconds)
+            if response_text:
+                response_text = decode_answer(response_text, artifact)
+                # Keep what was already streamed; the broken turn is dropped from the
+                # model-side history so the chat session stays usable.
+                placeholder.markdown(response_text)
+                store.append(conversation, {"role": "assistant", "content": response_text, "interrupted": True})
                 try:
-                    log_info("User request", payload=user_question)
-                    request_logger.info("request")
-
-                    chat_session = st.session_state.chat_session
-                    response = chat_session.send_message(user_question)
-                    response_text = response.text
-
-                    usage = response.usage_metadata
-                    print(f"--- CURRENT TURN TOKEN USAGE ---")
-                    print(f"  - Input (Question): {usage.prompt_token_count} tokens")
-                    print(f"  - Output (Answer): {usage.candidates_token_count} tokens")
-                    print(f"  - Total History (so far): {usage.total_token_count} tokens")
-                    print("----------------------------")
-                    log_info("LLM response", payload=response_text, usage=str(usage))
-
-                    st.markdown(response_text)
-                    st.session_state.messages.append({"role": "assistant", "content": response_text})
-                except Exception as e:
-                    log_error(f"An error occurred while communicating with the Gemini API: {e}")
-                    st.error(f"An error occurred while communicating with the Gemini API: {e}")
+                    chat_session.rewind()
+                except Exception:
+                    pass
+            if isinstance(e, SchedulerTimeout) or is_rate_limit_error(e):
+                st.error("The model is busy right now (rate limit reached). Please try again in a minute.")
+            else:
+                st.error(f"An error occurred while communicating with the Gemini API: {e}")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,317 @@
+import datetime
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+@dataclass
+class CachedContextEntry:
+    """A server-side cached context created for one version of the system prompt."""
+    prompt_hash: str
+    handle: Any
+    created_at: float
+    expires_at: float
+    uses: int = 0
+    # A TTL update is in flight
+    refreshing: bool = False
+
+
+class GenaiCachingBackend:
+    """
+    Creates and manages cached contents through `google.generativeai.caching`.
+    """
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: float, display_name: str):
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=f"models/{model_name}",
+            display_name=display_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl_seconds),
+        )
+
+    def update_ttl(self, handle, ttl_seconds: float):
+        handle.update(ttl=datetime.timedelta(seconds=ttl_seconds))
+
+    def delete(self, handle):
+        handle.delete()
+
+    def model_for(self, handle):
+        import google.generativeai as genai
+        return genai.GenerativeModel.from_cached_content(cached_content=handle)
+
+
+class InMemoryCachingBackend:
+    """
+    An offline stand-in for GenaiCachingBackend that records every call.
+
+    `model_factory` is called with the cached system instruction to build the
+    model object returned by `model_for`. Set `fail_create` to simulate an
+    account or model without context caching support.
+    """
+
+    def __init__(self, model_factory: Callable[[str], Any], fail_create: bool = False):
+        self.model_factory = model_factory
+        self.fail_create = fail_create
+        self.created = []
+        self.updated = []
+        self.deleted = []
+
+    def create(self, model_name: str, system_instruction: str, ttl_seconds: float, display_name: str):
+        if self.fail_create:
+            raise RuntimeError("Context caching is not available")
+        handle = {"name": f"cachedContents/{len(self.created)}", "model": model_name,
+                  "system_instruction": system_instruction, "display_name": display_name}
+        self.created.append(handle)
+        return handle
+
+    def update_ttl(self, handle, ttl_seconds: float):
+        self.updated.append((handle["name"], ttl_seconds))
+
+    def delete(self, handle):
+        self.deleted.append(handle["name"])
+
+    def model_for(self, handle):
+        return self.model_factory(handle["system_instruction"])
+
+
+def is_cache_gone_error(error: Exception) -> bool:
+    """True for API errors saying a cached content no longer exists (expired or deleted)."""
+    message = str(error).lower()
+    return type(error).__name__ == "NotFound" or "cachedcontent" in message or "cached content" in message
+
+
+class CachedChatSession:
+    """
+    A chat session on a shared cached context that outlives the context's TTL.
+
+    Before each message the cached context is touched (its TTL extended near
+    expiry). If it expired or was evicted in the meantime, or the API reports it
+    gone when sending, the session is bound again with the history so far, to a
+    recreated cached context or, if that fails, to `fallback_model()` (a model
+    with the plain system instruction), and the message is sent once more.
+    Everything else is delegated to the underlying ChatSession.
+    """
+
+    def __init__(self, manager: "ContextCacheManager", prompt_hash: str, system_prompt: str,
+                 bound: Tuple[Any, Any], fallback_model: Callable[[], Any]):
+        self._manager = manager
+        self._prompt_hash = prompt_hash
+        self._system_prompt = system_prompt
+        self._fallback_model = fallback_model
+        self._handle, model = bound
+        self.session = model.start_chat(history=[])
+
+    def _rebind(self):
+        bound = self._manager.bind(self._prompt_hash, self._system_prompt)
+        if bound is not None:
+            self._handle, model = bound
+        else:
+            # Caching stopped working: stay on the plain system instruction
+            self._handle, model = None, self._fallback_model()
+        self.session = model.start_chat(history=list(self.session.history))
+
+    def send_message(self, content, stream: bool = False, **kwargs):
+        if self._handle is not None and not self._manager.touch(self._prompt_hash, self._handle):
+            self._rebind()
+        try:
+            return self.session.send_message(content, stream=stream, **kwargs)
+        except Exception as e:
+            if self._handle is None or not is_cache_gone_error(e):
+                raise
+            self._manager.discard(self._prompt_hash, self._handle)
+            self._rebind()
+            return self.session.send_message(content, stream=stream, **kwargs)
+
+    @property
+    def history(self):
+        return self.session.history
+
+    @history.setter
+    def history(self, history):
+        self.session.history = history
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+
+class ContextCacheManager:
+    """
+    Shares one server-side cached context per system prompt hash across sessions.
+
+    The static system prompt is uploaded once and every session with the same
+    prompt hash gets a model bound to that cached context. Entries are created
+    with `ttl_seconds` and extended when a session starts within
+    `refresh_margin_seconds` of expiry; an expired entry is recreated. When
+    creation fails (caching unsupported, prompt below the minimum cacheable size,
+    quota), the hash is remembered for `retry_after_seconds` and callers fall
+    back to a plain `system_instruction`.
+    """
+
+    def __init__(self, model_name: str, backend=None, ttl_seconds: float = 3600,
+                 refresh_margin_seconds: float = 600, retry_after_seconds: float = 300,
+                 clock: Callable[[], float] = time.time):
+        self.model_name = model_name
+        self.backend = backend or GenaiCachingBackend()
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.clock = clock
+        self._entries: Dict[str, CachedContextEntry] = {}
+        self._failures: Dict[str, float] = {}
+        # prompt hash -> set when the creation in progress finishes
+        self._creating: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"created": 0, "reused": 0, "refreshed": 0, "fallbacks": 0, "deleted": 0}
+
+    def get_model(self, prompt_hash: str, system_prompt: str):
+        """
+        Returns a model bound to the cached context for `prompt_hash`, creating
+        or refreshing the cached context as needed.
+
+        The remote calls run outside the lock: sessions of other prompts are not
+        held up, and concurrent sessions of a prompt being created wait for that
+        one creation instead of starting their own.
+
+        Returns:
+            The model object, or None if caching is unavailable and the caller
+            should fall back to sending the system prompt itself.
+        """
+        bound = self.bind(prompt_hash, system_prompt)
+        return bound[1] if bound is not None else None
+
+    def bind(self, prompt_hash: str, system_prompt: str) -> Optional[Tuple[Any, Any]]:
+        """
+        Like get_model(), but also returns the cached context handle the model is
+        bound to, for `touch()`. Returns a (handle, model) tuple or None.
+        """
+        while True:
+            with self._lock:
+                now = self.clock()
+                entry = self._entries.get(prompt_hash)
+                if entry is not None and entry.expires_at <= now:
+                    self._entries.pop(prompt_hash)
+                    entry = None
+                if entry is not None:
+                    break
+                failed_at = self._failures.get(prompt_hash)
+                if failed_at is not None and now - failed_at < self.retry_after_seconds:
+                    self.stats["fallbacks"] += 1
+                    return None
+                creating = self._creating.get(prompt_hash)
+                if creating is None:
+                    creating = self._creating[prompt_hash] = threading.Event()
+                    break
+            # Another session is creating it; use its result
+            creating.wait()
+
+        if entry is None:
+            entry = self._create(prompt_hash, system_prompt, now, creating)
+            if entry is None:
+                return None
+        else:
+            with self._lock:
+                self.stats["reused"] += 1
+                refresh = not entry.refreshing and entry.expires_at - now <= self.refresh_margin_seconds
+                entry.refreshing = entry.refreshing or refresh
+                entry.uses += 1
+            if refresh:
+                self._refresh(entry)
+
+        try:
+            return entry.handle, self.backend.model_for(entry.handle)
+        except Exception:
+            with self._lock:
+                self.stats["fallbacks"] += 1
+            return None
+
+    def touch(self, prompt_hash: str, handle) -> bool:
+        """
+        Called before a session bound to `handle` sends a message: extends the
+        TTL when it is within `refresh_margin_seconds` of expiry, so a long
+        conversation keeps its cached context without new sessions.
+
+        Returns:
+            False if `handle` is no longer usable (expired, evicted or replaced);
+            the session must be bound again.
+        """
+        with self._lock:
+            now = self.clock()
+            entry = self._entries.get(prompt_hash)
+            if entry is None or entry.handle is not handle or entry.expires_at <= now:
+                return False
+            refresh = not entry.refreshing and entry.expires_at - now <= self.refresh_margin_seconds
+            entry.refreshing = entry.refreshing or refresh
+        if refresh:
+            self._refresh(entry)
+        return True
+
+    def discard(self, prompt_hash: str, handle):
+        """Forgets the entry of `handle` (e.g. the API reports it gone), so it is recreated on next use."""
+        with self._lock:
+            entry = self._entries.get(prompt_hash)
+            if entry is not None and entry.handle is handle:
+                del self._entries[prompt_hash]
+
+    def _create(self, prompt_hash: str, system_prompt: str, now: float,
+                creating: threading.Event) -> Optional[CachedContextEntry]:
+        try:
+            handle = self.backend.create(
+                self.model_name, system_prompt, self.ttl_seconds,
+                display_name=f"promotool-{prompt_hash[:12]}",
+            )
+        except Exception:
+            handle = None
+        with self._lock:
+            del self._creating[prompt_hash]
+            creating.set()
+            if handle is None:
+                self._failures[prompt_hash] = now
+                self.stats["fallbacks"] += 1
+                return None
+            self._failures.pop(prompt_hash, None)
+            entry = CachedContextEntry(prompt_hash, handle, created_at=now, expires_at=now + self.ttl_seconds, uses=1)
+            self._entries[prompt_hash] = entry
+            self.stats["created"] += 1
+            return entry
+
+    def _refresh(self, entry: CachedContextEntry):
+        try:
+            self.backend.update_ttl(entry.handle, self.ttl_seconds)
+        except Exception:
+            # Could not extend it; keep using it until it expires, then recreate
+            with self._lock:
+                entry.refreshing = False
+            return
+        with self._lock:
+            entry.expires_at = self.clock() + self.ttl_seconds
+            entry.refreshing = False
+            self.stats["refreshed"] += 1
+
+    def evict(self, keep_hash: Optional[str] = None, keep_hashes: Iterable[str] = ()) -> List[str]:
+        """
+        Deletes every cached context except the ones for `keep_hash` and
+        `keep_hashes`, e.g. after the settings tables changed and the old prompt
+        is no longer used. Returns the prompt hashes deleted.
+        """
+        keep = set(keep_hashes) | ({keep_hash} if keep_hash else set())
+        with self._lock:
+            evicted = [self._entries.pop(h) for h in [h for h in self._entries if h not in keep]]
+        for entry in evicted:
+            try:
+                self.backend.delete(entry.handle)
+            except Exception:
+                continue
+            with self._lock:
+                self.stats["deleted"] += 1
+        return [entry.prompt_hash for entry in evicted]
+
+    def snapshot(self) -> dict:
+        """Returns counters and the remaining TTL of every live entry."""
+        with self._lock:
+            now = self.clock()
+            return {
+                **self.stats,
+                "entries": {h: round(e.expires_at - now) for h, e in self._entries.items()},
+            }
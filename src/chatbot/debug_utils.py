@@ -1,38 +1,45 @@
+from chatbot.token_estimator import get_token_estimator
 
-import pandas as pd
-from tabulate import tabulate
-from chatbot.gemini_api_client import GeminiApiClient
-
-def analyze_prompt_token_usage(base_prompt: str, csv_data: dict[str, pd.DataFrame], user_question: str) -> dict:
+def analyze_prompt_token_usage(base_prompt: str, table_segments: dict[str, str], user_question: str,
+                               verify: bool = False) -> dict:
     """
     Analyzes the token count for each component of the prompt.
 
+    Counts are estimated locally by the calibrated TokenEstimator. With `verify`,
+    every component is also counted with the Gemini API and recorded as a
+    calibration sample.
+
     Args:
         base_prompt: The base system prompt text.
-        csv_data: A dictionary where keys are filenames and values are pandas DataFrames.
+        table_segments: Filename -> the table serialized exactly as it is sent
+            (see chatbot_app.format_table_segment()).
         user_question: A sample user question.
+        verify: Count with the remote API instead of estimating.
 
     Returns:
         A dictionary with a detailed breakdown of token counts.
     """
-    try:
-        client = GeminiApiClient()
-        model = client.model
-    except Exception as e:
-        return {"error": f"Could not initialize Gemini API client: {e}"}
+    estimator = get_token_estimator()
+    if verify:
+        try:
+            from chatbot.gemini_api_client import GeminiApiClient
+            counter = GeminiApiClient().count_tokens
+        except Exception as e:
+            return {"error": f"Could not initialize Gemini API client: {e}"}
+        count = lambda text, label="": estimator.verify(text, label=label, counter=counter)
+    else:
+        count = lambda text, label="": estimator.estimate(text)
 
     analysis = {}
-    analysis['system_prompt_base'] = model.count_tokens(base_prompt).total_tokens
-    analysis['user_question'] = model.count_tokens(user_question).total_tokens
+    analysis['system_prompt_base'] = count(base_prompt, label="system_prompt_base")
+    analysis['user_question'] = count(user_question, label="user_question")
 
     csv_tokens = {}
     total_csv_tokens = 0
-    for name, df in csv_data.items():
-        # We count tokens based on the final markdown representation
-        markdown_table = tabulate(df, headers='keys', tablefmt='pipe')
-        count = model.count_tokens(markdown_table).total_tokens
-        csv_tokens[name] = count
-        total_csv_tokens += count
+    for name, segment in table_segments.items():
+        tokens = count(segment, label=f"table:{name}")
+        csv_tokens[name] = tokens
+        total_csv_tokens += tokens
 
     analysis['csv_data_breakdown'] = csv_tokens
     analysis['csv_data_total'] = total_csv_tokens
@@ -40,5 +47,10 @@ def analyze_prompt_token_usage(base_prompt: str, csv_data: dict[str, pd.DataFram
     # Calculate the grand total
     grand_total = analysis['system_prompt_base'] + analysis['user_question'] + total_csv_tokens
     analysis['grand_total'] = grand_total
+    analysis['verified'] = verify
+
+    if verify:
+        estimator.calibrate()
+    analysis['estimator_error'] = estimator.error_report()
 
     return analysis
@@ -1,43 +1,122 @@
-
 import os
+import threading
+from collections import OrderedDict
+from typing import List
 import streamlit as st
-import google.generativeai as genai
-from dotenv import load_dotenv
+from chatbot.context_cache import CachedChatSession, ContextCacheManager
+from chatbot.startup import initialize_process
+from chatbot.model_client import model_name_for_tier, PRO_TIER
+
+# google.generativeai is imported on first use: it is the slowest import in the app
+# and is not needed to render the UI
+
+# Models are configured per tier (GEMINI_FAST_MODEL / GEMINI_PRO_MODEL, see model_client)
+
+# Prompt versions whose uncached model (with its own copy of the system instruction) is kept
+_MAX_PROMPT_MODELS = 4
+
+def context_cache_enabled() -> bool:
+    """Server-side caching of the static system prompt (GEMINI_CONTEXT_CACHE, "1" to enable)."""
+    return os.getenv("GEMINI_CONTEXT_CACHE", "1") == "1"
+
+def context_cache_ttl_minutes() -> float:
+    return float(os.getenv("GEMINI_CONTEXT_CACHE_TTL_MINUTES", "60"))
+
+_context_cache_managers = {}
+_context_cache_lock = threading.Lock()
+
+def get_context_cache_manager(model_name: str = None) -> ContextCacheManager:
+    """
+    Returns the process-wide manager of a model, so cached contexts are shared by
+    all sessions. Cached contents are bound to one model, so each tier has its own.
+    """
+    model_name = model_name or model_name_for_tier(PRO_TIER)
+    with _context_cache_lock:
+        manager = _context_cache_managers.get(model_name)
+        if manager is None:
+            manager = _context_cache_managers[model_name] = ContextCacheManager(
+                model_name, ttl_seconds=context_cache_ttl_minutes() * 60
+            )
+        return manager
+
+def get_context_cache_managers() -> List[ContextCacheManager]:
+    """Returns the context cache managers created so far (one per model)."""
+    with _context_cache_lock:
+        return list(_context_cache_managers.values())
 
 class GeminiApiClient:
     """
     A client to interact with the Google Gemini API.
     """
 
-    def __init__(self):
+    def __init__(self, context_cache: ContextCacheManager = None, model_name: str = None):
         """
         Initializes the Gemini API client.
         It configures the API key from environment variables.
+
+        Args:
+            context_cache: Manager for server-side cached system prompts. Defaults to
+                the process-wide manager when GEMINI_CONTEXT_CACHE is enabled.
+            model_name: The Gemini model to use. Defaults to the pro tier model.
         """
-        load_dotenv()
+        import google.generativeai as genai
+        initialize_process()
         api_key = st.secrets["GEMINI_API_KEY"]
         if not api_key:
             raise ValueError("GEMINI_API_KEY not found in .env file or environment variables.")
-        
+
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-pro')
+        self.model_name = model_name or model_name_for_tier(PRO_TIER)
+        self.model = genai.GenerativeModel(self.model_name)
+        if context_cache is None and context_cache_enabled():
+            context_cache = get_context_cache_manager(self.model_name)
+        self.context_cache = context_cache
+        # prompt_hash -> GenerativeModel with that system instruction, shared by its sessions
+        self._prompt_models = OrderedDict()
+        self._prompt_models_lock = threading.Lock()
 
-    def start_chat_session(self, system_prompt: str):
+    def start_chat_session(self, system_prompt: str, prompt_hash: str = None):
         """
         Starts a new chat session with a system prompt.
 
+        When a prompt hash is given and context caching is enabled, the session is
+        bound to a server-side cached copy of the system prompt shared with other
+        sessions, kept alive (or recreated) while the session sends messages. If caching is unavailable, the prompt is sent as `system_instruction`
+        of a model that is shared by the sessions of the same prompt hash, so each
+        session does not hold its own copy of the prompt.
+
         Args:
             system_prompt: The initial system prompt to guide the conversation.
+            prompt_hash: Content hash identifying this version of the system prompt.
 
         Returns:
-            A ChatSession object.
+            A ChatSession object (a CachedChatSession when it uses a cached context).
         """
-        # The new API uses a `system_instruction` parameter in the model
-        model_with_prompt = genai.GenerativeModel(
-            'gemini-2.5-pro',
-            system_instruction=system_prompt
-        )
-        return model_with_prompt.start_chat(history=[])
+        if self.context_cache is not None and prompt_hash:
+            bound = self.context_cache.bind(prompt_hash, system_prompt)
+            if bound is not None:
+                return CachedChatSession(self.context_cache, prompt_hash, system_prompt, bound,
+                                         fallback_model=lambda: self._model_with_prompt(system_prompt, prompt_hash))
+
+        return self._model_with_prompt(system_prompt, prompt_hash).start_chat(history=[])
+
+    def _model_with_prompt(self, system_prompt: str, prompt_hash: str = None):
+        import google.generativeai as genai
+        if not prompt_hash:
+            return genai.GenerativeModel(self.model_name, system_instruction=system_prompt)
+        with self._prompt_models_lock:
+            model = self._prompt_models.get(prompt_hash)
+            if model is None:
+                # The new API uses a `system_instruction` parameter in the model
+                model = self._prompt_models[prompt_hash] = genai.GenerativeModel(
+                    self.model_name,
+                    system_instruction=system_prompt
+                )
+                if len(self._prompt_models) > _MAX_PROMPT_MODELS:
+                    self._prompt_models.popitem(last=False)
+            else:
+                self._prompt_models.move_to_end(prompt_hash)
+            return model
 
     def count_tokens(self, text: str) -> int:
         """
@@ -50,4 +129,3 @@ class GeminiApiClient:
             The total number of tokens.
         """
         return self.model.count_tokens(text).total_tokens
-
@@ -0,0 +1,160 @@
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Tuple
+
+from chatbot.token_estimator import estimate_tokens
+
+SUMMARY_MARKER = "# Summary of Earlier Conversation"
+SUMMARY_ACK = "Зрозуміло, я врахую попередню розмову."
+QUESTION_MARKER = "# Question\n\n"
+
+_SUMMARY_QUESTION_CHARS = 200
+_SUMMARY_ANSWER_CHARS = 300
+
+
+def content_to_dict(content) -> dict:
+    """Converts a `Content` from ChatSession.history into a plain {"role", "parts"} dict."""
+    if isinstance(content, dict):
+        return {"role": content["role"], "parts": [str(p) for p in content["parts"]]}
+    return {"role": content.role, "parts": [part.text for part in content.parts if getattr(part, "text", None)]}
+
+
+def _message_text(message: dict) -> str:
+    return "".join(message["parts"])
+
+
+def _question_of(user_text: str) -> str:
+    # Composed messages carry reference data before the question itself
+    if QUESTION_MARKER in user_text:
+        return user_text.rsplit(QUESTION_MARKER, 1)[1]
+    return user_text
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
+@dataclass
+class HistoryReport:
+    """How the history was trimmed for one turn."""
+    history_tokens_before: int
+    history_tokens_sent: int
+    turns_kept: int
+    turns_summarized: int
+    turns_dropped: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.history_tokens_before - self.history_tokens_sent
+
+    @property
+    def changed(self) -> bool:
+        return self.turns_summarized > 0 or self.turns_dropped > 0
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+class HistoryManager:
+    """
+    Keeps the conversation history sent with each request within a token budget.
+
+    The system prompt is not part of the chat history (it is the model's
+    `system_instruction` or cached context), so it is always kept. Within the
+    history, the last `keep_last_turns` user/model exchanges are kept verbatim.
+    When the history exceeds `token_budget`, older exchanges are compacted into a
+    single extractive summary turn (`mode="summarize"`) or removed (`mode="drop"`);
+    if that is still not enough, the oldest verbatim exchanges are dropped too,
+    but the latest exchange is always kept.
+    """
+
+    def __init__(self, token_budget: int = 16000, keep_last_turns: int = 4, mode: str = "summarize",
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        if mode not in ("summarize", "drop"):
+            raise ValueError(f"Unknown history compaction mode: {mode}")
+        self.token_budget = token_budget
+        self.keep_last_turns = keep_last_turns
+        self.mode = mode
+        self.token_counter = token_counter
+
+    def _tokens(self, messages: List[dict]) -> int:
+        return sum(self.token_counter(_message_text(m)) for m in messages)
+
+    @staticmethod
+    def _split_turns(history: List[dict]) -> Tuple[List[str], List[List[dict]]]:
+        """Splits history into an existing summary (if any) and user/model exchanges."""
+        summary_lines: List[str] = []
+        turns: List[List[dict]] = []
+        for message in history:
+            text = _message_text(message)
+            if message["role"] == "user" and text.startswith(SUMMARY_MARKER):
+                summary_lines.extend(line for line in text.splitlines()[1:] if line.strip())
+                continue
+            if message["role"] == "model" and text == SUMMARY_ACK:
+                continue
+            if message["role"] == "user" or not turns:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return summary_lines, turns
+
+    @staticmethod
+    def _summarize(turn: List[dict]) -> str:
+        question = next((_message_text(m) for m in turn if m["role"] == "user"), "")
+        answer = next((_message_text(m) for m in turn if m["role"] == "model"), "")
+        return (f"- Q: {_shorten(_question_of(question), _SUMMARY_QUESTION_CHARS)}"
+                f" → A: {_shorten(answer, _SUMMARY_ANSWER_CHARS)}")
+
+    def compact(self, history: List[dict]) -> Tuple[List[dict], HistoryReport]:
+        """
+        Applies the token budget to a chat history.
+
+        Args:
+            history: Messages as {"role": "user" | "model", "parts": [str, ...]} dicts.
+
+        Returns:
+            The history to send and a report of what was kept, summarized or dropped.
+        """
+        tokens_before = self._tokens(history)
+        if tokens_before <= self.token_budget:
+            return history, HistoryReport(tokens_before, tokens_before, len(self._split_turns(history)[1]), 0, 0)
+
+        summary_lines, turns = self._split_turns(history)
+        split_at = max(len(turns) - self.keep_last_turns, 0)
+        older, recent = turns[:split_at], turns[split_at:]
+
+        summarized = dropped = 0
+        if self.mode == "summarize":
+            summary_lines = summary_lines + [self._summarize(turn) for turn in older]
+            summarized = len(older)
+        else:
+            summary_lines = []
+            dropped = len(older)
+
+        def assemble(summary: List[str], kept: List[List[dict]]) -> List[dict]:
+            messages = []
+            if summary:
+                messages.append({"role": "user", "parts": [SUMMARY_MARKER + "\n" + "\n".join(summary)]})
+                messages.append({"role": "model", "parts": [SUMMARY_ACK]})
+            for turn in kept:
+                messages.extend(turn)
+            return messages
+
+        compacted = assemble(summary_lines, recent)
+        # Still over budget: drop the oldest summary lines, then the oldest verbatim turns
+        while self._tokens(compacted) > self.token_budget and (summary_lines or len(recent) > 1):
+            if summary_lines:
+                summary_lines = summary_lines[1:]
+            else:
+                recent = recent[1:]
+                dropped += 1
+            compacted = assemble(summary_lines, recent)
+
+        report = HistoryReport(
+            history_tokens_before=tokens_before,
+            history_tokens_sent=self._tokens(compacted),
+            turns_kept=len(recent),
+            turns_summarized=summarized,
+            turns_dropped=dropped,
+        )
+        return compacted, report
@@ -0,0 +1,112 @@
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+INTERRUPTED_NOTE = "⚠️ The answer was interrupted before it was complete."
+LOCAL_ANSWER_NOTE = "⚡ Answered directly from the PromoTool configuration tables."
+
+ROLE_LABELS = {"user": "🧑 **You**", "assistant": "🤖 **Assistant**"}
+
+
+@dataclass(frozen=True)
+class HistoryPage:
+    """A page of earlier messages: positions `start` to `end` (exclusive) in the conversation."""
+    start: int
+    end: int
+
+    @property
+    def label(self) -> str:
+        return f"Messages {self.start + 1}–{self.end}"
+
+
+def history_pages(first: int, end: int, page_size: int) -> List[HistoryPage]:
+    """
+    Splits the messages from position `first` to `end` into pages of `page_size`,
+    oldest first. Page bounds are multiples of `page_size`, so a page keeps its
+    bounds (and its cached rendering) as the conversation grows; only the newest
+    page can be shorter.
+    """
+    page_size = max(1, page_size)
+    pages = []
+    start = first
+    while start < end:
+        page_end = min(end, (start // page_size + 1) * page_size)
+        pages.append(HistoryPage(start, page_end))
+        start = page_end
+    return pages
+
+
+def message_notes(message: dict) -> List[str]:
+    """The notes shown under a displayed message."""
+    notes = []
+    if message.get("interrupted"):
+        notes.append(INTERRUPTED_NOTE)
+    if message.get("local"):
+        notes.append(LOCAL_ANSWER_NOTE)
+    return notes
+
+
+def page_markdown(messages: List[dict], start: int) -> str:
+    """
+    Renders a page of earlier messages as one markdown document: every message
+    under its role and position, with its notes, separated by rules.
+    """
+    blocks = []
+    for number, message in enumerate(messages, start=start + 1):
+        lines = [f"{ROLE_LABELS.get(message['role'], message['role'])} · #{number}", "", message["content"]]
+        lines.extend(f"\n*{note}*" for note in message_notes(message))
+        blocks.append("\n".join(lines))
+    return "\n\n---\n\n".join(blocks)
+
+
+class RenderedPageCache:
+    """
+    Rendered markdown of pages of earlier messages, keyed by (conversation id,
+    start, end). Messages never change once added, so a page is rendered (and
+    read from the transcript, if it is out of memory) once, however often the
+    script reruns. At most `max_pages` pages are kept, least recently used evicted.
+    """
+
+    def __init__(self, max_pages: int = 256):
+        self.max_pages = max_pages
+        self._pages: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str, page: HistoryPage, render: Callable[[], str]) -> str:
+        key = (conversation_id, page.start, page.end)
+        with self._lock:
+            markdown = self._pages.get(key)
+            if markdown is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return markdown
+            self.misses += 1
+        markdown = render()
+        with self._lock:
+            self._pages[key] = markdown
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return markdown
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pages": len(self._pages), "hits": self.hits, "misses": self.misses,
+                    "chars": sum(len(markdown) for markdown in self._pages.values())}
+
+
+_rendered_pages: Optional[RenderedPageCache] = None
+_rendered_pages_lock = threading.Lock()
+
+
+def get_rendered_pages() -> RenderedPageCache:
+    """Returns the process-wide rendered page cache, sized by HISTORY_PAGE_CACHE_SIZE."""
+    global _rendered_pages
+    with _rendered_pages_lock:
+        if _rendered_pages is None:
+            _rendered_pages = RenderedPageCache(max_pages=int(os.getenv("HISTORY_PAGE_CACHE_SIZE", "256")))
+        return _rendered_pages
@@ -0,0 +1,255 @@
+import csv
+import os
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Type
+
+
+def _str(value: str) -> Optional[str]:
+    return value if value != "" else None
+
+
+def _int(value: str):
+    if value == "":
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def _bool(value: str):
+    if value == "":
+        return None
+    lowered = value.strip().lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+    return value
+
+
+class Record(Mapping):
+    """
+    A read-only, slotted table row.
+
+    Subclasses declare their columns in `SCHEMA` (column name -> parser). Rows
+    behave like read-only mappings (`row["Name"]`, `row.get("Id")`, `dict(row)`),
+    so code written against JSON records works unchanged, while attribute access
+    (`row.Name`) and `__slots__` keep them compact in memory. Columns found in the
+    CSV but not in the schema are kept in `_extra`.
+    """
+    SCHEMA: Dict[str, Callable[[str], object]] = {}
+    __slots__ = ("_extra",)
+
+    @classmethod
+    def from_csv_row(cls, row: Dict[str, str]) -> "Record":
+        record = cls.__new__(cls)
+        extra = None
+        for column, value in row.items():
+            value = value if value is not None else ""
+            parser = cls.SCHEMA.get(column)
+            if parser is not None:
+                object.__setattr__(record, column, parser(value))
+            else:
+                if extra is None:
+                    extra = {}
+                extra[column] = _str(value)
+        for column in cls.SCHEMA:
+            if column not in row:
+                object.__setattr__(record, column, None)
+        object.__setattr__(record, "_extra", extra)
+        return record
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __reduce__(self):
+        # The default slot restore goes through __setattr__
+        return _restore_record, (type(self), {column: getattr(self, column) for column in self.SCHEMA}, self._extra)
+
+    def __getitem__(self, column: str):
+        if column in self.SCHEMA:
+            return getattr(self, column)
+        if self._extra is not None and column in self._extra:
+            return self._extra[column]
+        raise KeyError(column)
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self.SCHEMA
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return len(self.SCHEMA) + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+def _restore_record(cls: Type[Record], values: Dict[str, object], extra: Optional[Dict[str, str]]) -> Record:
+    record = cls.__new__(cls)
+    for column, value in values.items():
+        object.__setattr__(record, column, value)
+    object.__setattr__(record, "_extra", extra)
+    return record
+
+
+def _record_type(name: str, schema: Dict[str, Callable[[str], object]]) -> Type[Record]:
+    return type(name, (Record,), {"__module__": __name__, "SCHEMA": schema, "__slots__": tuple(schema)})
+
+
+KPI = _record_type("KPI", {
+    "Id": _str,
+    "Name": _str,
+    "Type": _int,
+    "ReadKPIConditionMetadataId": _str,
+    "ReadKPIForecastMetadataId": _str,
+    "ReadKPITimeFrame": _int,
+    "ReadKPIAggregationType": _int,
+    "BusinessObjectType": _int,
+    "CalculationKPIFormula": _str,
+    "Description": _str,
+    "HierarchyDistributionType": _int,
+    "HierarchyAggregationType": _int,
+    "DistributionKPIId": _str,
+    "DisaggregateMonthly": _bool,
+    "RelevantPeriodStart": _str,
+    "RelevantPeriodEnd": _str,
+    "DataType": _int,
+})
+
+ConditionMetadata = _record_type("ConditionMetadata", {
+    "Id": _str,
+    "Name": _str,
+    "Type": _int,
+    "Code": _int,
+})
+
+CustomLocalization = _record_type("CustomLocalization", {
+    "Id": _str,
+    "ObjectType": _str,
+    "ObjectId": _str,
+    "LocalizationCode": _str,
+    "VALUE": _str,
+})
+
+KPIConditionalFormatting = _record_type("KPIConditionalFormatting", {
+    "Id": _str,
+    "Name": _str,
+    "KPIId": _str,
+    "ConditionKPIId": _str,
+    "BackColor": _int,
+    "FontColor": _int,
+    "FontStyle": _int,
+    "Disabled": _bool,
+    "Priority": _int,
+})
+
+# Record type for each settings table file; other CSV files load as GenericRecord
+RECORD_TYPES: Dict[str, Type[Record]] = {
+    "cnfg.kpi.csv": KPI,
+    "cnfg.ConditionMetadata.csv": ConditionMetadata,
+    "cnfg.CustomLocalization.csv": CustomLocalization,
+    "cnfg.KPIConditionalFormatting.csv": KPIConditionalFormatting,
+}
+
+GenericRecord = _record_type("GenericRecord", {})
+
+
+def read_table(file_path: str, record_type: Type[Record] = GenericRecord) -> Tuple[Record, ...]:
+    """
+    Parses one settings table with the stdlib csv module. Handles the UTF-8 BOM
+    and quoted multiline fields such as `CalculationKPIFormula`.
+    """
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        return tuple(record_type.from_csv_row(row) for row in csv.DictReader(f))
+
+
+class KnowledgeBase:
+    """
+    The PromoTool settings tables as typed, immutable records with O(1) lookups.
+
+    `tables` keeps every table in file order (filename -> tuple of records), the
+    same shape as the reference data sent to the model. Indexes: KPIs and
+    ConditionMetadata by `Id` and `Name`, localizations by
+    `(ObjectId, LocalizationCode)` and conditional formatting rules by `KPIId`.
+    """
+
+    def __init__(self, tables: Dict[str, Tuple[Record, ...]]):
+        self.tables = tables
+        kpis = tables.get("cnfg.kpi.csv", ())
+        conditions = tables.get("cnfg.ConditionMetadata.csv", ())
+
+        self.kpi_by_id = {k.Id: k for k in kpis}
+        self.kpi_by_name = {k.Name: k for k in kpis}
+        self.condition_by_id = {c.Id: c for c in conditions}
+        self.condition_by_name = {c.Name: c for c in conditions}
+
+        self.localization: Dict[Tuple[str, str], CustomLocalization] = {}
+        for loc in tables.get("cnfg.CustomLocalization.csv", ()):
+            self.localization[(loc.ObjectId, loc.LocalizationCode)] = loc
+
+        self.formatting_by_kpi: Dict[str, List[KPIConditionalFormatting]] = {}
+        for rule in tables.get("cnfg.KPIConditionalFormatting.csv", ()):
+            self.formatting_by_kpi.setdefault(rule.KPIId, []).append(rule)
+
+    def with_tables(self, updates: Dict[str, Optional[Tuple[Record, ...]]]) -> "KnowledgeBase":
+        """
+        Returns a new knowledge base with some tables replaced (a None value drops
+        the table); the other tables are shared with this one. Used to apply a
+        re-parsed table without reading the unchanged ones again.
+        """
+        tables = dict(self.tables)
+        for name, records in updates.items():
+            if records is None:
+                tables.pop(name, None)
+            else:
+                tables[name] = records
+        return KnowledgeBase({name: tables[name] for name in sorted(tables)})
+
+    def localized_name(self, object_id: str, localization_code: str) -> Optional[str]:
+        """Returns the localized `VALUE` for an object, or None if there is none."""
+        loc = self.localization.get((object_id, localization_code))
+        value = loc.VALUE.strip() if loc is not None and loc.VALUE else ""
+        return value or None
+
+    def row_counts(self) -> Dict[str, int]:
+        return {name: len(records) for name, records in self.tables.items()}
+
+
+def diff_records(old: Tuple[Record, ...], new: Tuple[Record, ...]) -> Dict[str, int]:
+    """
+    Counts the rows added, removed and modified between two versions of a table.
+    Rows are matched by `Id` where the table has one, otherwise by their content.
+    """
+    def keyed(records):
+        return {(r.get("Id") if r.get("Id") is not None else tuple(r.items())): dict(r) for r in records}
+
+    old_rows, new_rows = keyed(old), keyed(new)
+    return {
+        "added": sum(1 for key in new_rows if key not in old_rows),
+        "removed": sum(1 for key in old_rows if key not in new_rows),
+        "modified": sum(1 for key, row in new_rows.items() if key in old_rows and old_rows[key] != row),
+    }
+
+
+def load_table(tables_dir: str, filename: str) -> Tuple[Record, ...]:
+    """Parses one settings table file with its record type."""
+    return read_table(os.path.join(tables_dir, filename), RECORD_TYPES.get(filename, GenericRecord))
+
+
+def load_knowledge_base(tables_dir: str) -> KnowledgeBase:
+    """
+    Loads every CSV file in the settings tables directory, in sorted filename order.
+
+    Raises:
+        FileNotFoundError: If the directory does not exist.
+    """
+    tables = {}
+    for filename in sorted(os.listdir(tables_dir)):
+        if filename.endswith(".csv"):
+            tables[filename] = load_table(tables_dir, filename)
+    return KnowledgeBase(tables)
@@ -0,0 +1,208 @@
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+# Table names as they appear in the reference data (CSV filenames)
+KPI_TABLE = "cnfg.kpi.csv"
+LOCALIZATION_TABLE = "cnfg.CustomLocalization.csv"
+CONDITION_METADATA_TABLE = "cnfg.ConditionMetadata.csv"
+CONDITIONAL_FORMATTING_TABLE = "cnfg.KPIConditionalFormatting.csv"
+
+# Edge kinds
+FORMULA = "formula"                            # KPI -> KPI named in CalculationKPIFormula
+DISTRIBUTION = "distribution"                  # KPI -> DistributionKPIId
+READ_CONDITION = "read_condition"              # KPI -> ConditionMetadata (ReadKPIConditionMetadataId)
+FORECAST_CONDITION = "forecast_condition"      # KPI -> ConditionMetadata (ReadKPIForecastMetadataId)
+FORMATTING_CONDITION = "formatting_condition"  # KPI -> ConditionKPIId of a KPIConditionalFormatting rule
+
+KPI_EDGE_KINDS = frozenset({FORMULA, DISTRIBUTION, FORMATTING_CONDITION})
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def extract_formula_references(formula: str, known_names: Dict[str, str], own_id: str = "") -> List[str]:
+    """
+    Finds the KPI names referenced in a C# formula.
+
+    Args:
+        formula: The `CalculationKPIFormula` text.
+        known_names: Mapping of KPI `Name` to KPI `Id`.
+        own_id: Id of the KPI the formula belongs to, excluded from the result.
+
+    Returns:
+        Ids of the referenced KPIs, in order of first appearance.
+    """
+    referenced = []
+    for identifier in _IDENTIFIER_RE.findall(formula):
+        kpi_id = known_names.get(identifier)
+        if kpi_id and kpi_id != own_id and kpi_id not in referenced:
+            referenced.append(kpi_id)
+    return referenced
+
+
+@dataclass(frozen=True)
+class Edge:
+    """A "source depends on target" relation between two configuration objects."""
+    source: str
+    target: str
+    kind: str
+    priority: Optional[int] = None
+
+
+class KpiDependencyGraph:
+    """
+    Forward and reverse dependency index over the PromoTool configuration.
+
+    Nodes are KPI and ConditionMetadata ids. Edges are built once from the
+    reference tables and cover KPI names used in formulas, `DistributionKPIId`,
+    the ConditionMetadata a KPI reads from or transfers through, and the
+    condition KPIs of conditional formatting rules. All lookups are dictionary
+    accesses, so "depends on" / "used by" queries take microseconds and never
+    require the model to scan formulas itself.
+    """
+
+    def __init__(self, tables: Dict[str, List[dict]]):
+        self.kpis_by_id: Dict[str, dict] = {_text(r.get("Id")): r for r in tables.get(KPI_TABLE, [])}
+        self.kpi_ids_by_name: Dict[str, str] = {
+            _text(r.get("Name")): kpi_id for kpi_id, r in self.kpis_by_id.items()
+        }
+        self.conditions_by_id: Dict[str, dict] = {
+            _text(r.get("Id")): r for r in tables.get(CONDITION_METADATA_TABLE, [])
+        }
+
+        self._forward: Dict[str, List[Edge]] = {}
+        self._reverse: Dict[str, List[Edge]] = {}
+
+        for kpi_id, row in self.kpis_by_id.items():
+            for target in extract_formula_references(_text(row.get("CalculationKPIFormula")), self.kpi_ids_by_name, kpi_id):
+                self._add(Edge(kpi_id, target, FORMULA))
+            distribution_id = _text(row.get("DistributionKPIId"))
+            if distribution_id in self.kpis_by_id:
+                self._add(Edge(kpi_id, distribution_id, DISTRIBUTION))
+            condition_id = _text(row.get("ReadKPIConditionMetadataId"))
+            if condition_id in self.conditions_by_id:
+                self._add(Edge(kpi_id, condition_id, READ_CONDITION))
+            forecast_id = _text(row.get("ReadKPIForecastMetadataId"))
+            if forecast_id in self.conditions_by_id:
+                self._add(Edge(kpi_id, forecast_id, FORECAST_CONDITION))
+
+        for rule in tables.get(CONDITIONAL_FORMATTING_TABLE, []):
+            kpi_id = _text(rule.get("KPIId"))
+            condition_kpi_id = _text(rule.get("ConditionKPIId"))
+            if kpi_id in self.kpis_by_id and condition_kpi_id in self.kpis_by_id:
+                priority = rule.get("Priority")
+                self._add(Edge(kpi_id, condition_kpi_id, FORMATTING_CONDITION,
+                               int(priority) if priority not in (None, "") else None))
+
+    def _add(self, edge: Edge):
+        self._forward.setdefault(edge.source, []).append(edge)
+        self._reverse.setdefault(edge.target, []).append(edge)
+
+    # --- Queries --- #
+
+    def depends_on(self, node_id: str, kinds: Optional[Iterable[str]] = None) -> List[Edge]:
+        """Returns the edges from `node_id` to everything it depends on."""
+        edges = self._forward.get(node_id, [])
+        return [e for e in edges if e.kind in kinds] if kinds is not None else list(edges)
+
+    def used_by(self, node_id: str, kinds: Optional[Iterable[str]] = None) -> List[Edge]:
+        """Returns the edges from every object that depends on `node_id`."""
+        edges = self._reverse.get(node_id, [])
+        return [e for e in edges if e.kind in kinds] if kinds is not None else list(edges)
+
+    def _walk(self, start: Iterable[str], index: Dict[str, List[Edge]], forward: bool,
+              kinds: Iterable[str], max_nodes: int) -> List[str]:
+        kinds = frozenset(kinds)
+        ordered: List[str] = []
+        seen: Set[str] = set()
+        queue = deque(start)
+        while queue and len(ordered) < max_nodes:
+            node_id = queue.popleft()
+            if node_id in seen:
+                continue
+            seen.add(node_id)
+            ordered.append(node_id)
+            for edge in index.get(node_id, []):
+                if edge.kind in kinds:
+                    queue.append(edge.target if forward else edge.source)
+        return ordered
+
+    def transitive_dependencies(self, kpi_ids: Iterable[str], kinds: Iterable[str] = KPI_EDGE_KINDS,
+                                max_nodes: int = 40) -> List[str]:
+        """
+        Breadth-first closure of everything the given KPIs depend on, including
+        the KPIs themselves. Stops after `max_nodes` nodes.
+        """
+        return self._walk(kpi_ids, self._forward, True, kinds, max_nodes)
+
+    def transitive_dependents(self, kpi_ids: Iterable[str], kinds: Iterable[str] = KPI_EDGE_KINDS,
+                              max_nodes: int = 40) -> List[str]:
+        """Breadth-first closure of everything that depends on the given KPIs."""
+        return self._walk(kpi_ids, self._reverse, False, kinds, max_nodes)
+
+    def name(self, node_id: str) -> str:
+        row = self.kpis_by_id.get(node_id) or self.conditions_by_id.get(node_id)
+        return _text(row.get("Name")) if row else node_id
+
+    # --- Prompt Rendering --- #
+
+    def _names(self, node_ids: Iterable[str]) -> str:
+        return ", ".join(f"`{self.name(node_id)}`" for node_id in node_ids)
+
+    def describe(self, kpi_ids: Iterable[str]) -> str:
+        """
+        Renders the precomputed "depends on" / "used by" facts for the given KPIs
+        as a markdown block for the model.
+
+        Returns:
+            The facts block, or an empty string if none of the ids is a known KPI.
+        """
+        blocks = []
+        for kpi_id in kpi_ids:
+            if kpi_id not in self.kpis_by_id:
+                continue
+            lines = [f"### `{self.name(kpi_id)}` ({kpi_id})"]
+            deps = self.depends_on(kpi_id)
+            used = self.used_by(kpi_id)
+
+            formula_deps = [e.target for e in deps if e.kind == FORMULA]
+            if formula_deps:
+                lines.append(f"- Depends on (formula): {self._names(formula_deps)}")
+            for edge in deps:
+                if edge.kind == DISTRIBUTION:
+                    lines.append(f"- Distribution KPI: {self._names([edge.target])}")
+                elif edge.kind == READ_CONDITION:
+                    writers = [e.source for e in self.used_by(edge.target, {FORECAST_CONDITION})]
+                    line = f"- Reads ConditionMetadata: {self._names([edge.target])}"
+                    if writers:
+                        line += f" (transit storage written by {self._names(writers)})"
+                    lines.append(line)
+                elif edge.kind == FORECAST_CONDITION:
+                    readers = [e.source for e in self.used_by(edge.target, {READ_CONDITION})]
+                    line = f"- Writes to Forecast transit storage: {self._names([edge.target])}"
+                    if readers:
+                        line += f" (read by {self._names(readers)})"
+                    lines.append(line)
+            formatting = sorted((e for e in deps if e.kind == FORMATTING_CONDITION),
+                                key=lambda e: (e.priority is None, e.priority))
+            for edge in formatting:
+                lines.append(f"- Conditional formatting condition (Priority {edge.priority}): {self._names([edge.target])}")
+
+            used_in_formula = [e.source for e in used if e.kind == FORMULA]
+            lines.append(f"- Used in formulas of: {self._names(used_in_formula) if used_in_formula else 'none'}")
+            used_for_distribution = [e.source for e in used if e.kind == DISTRIBUTION]
+            if used_for_distribution:
+                lines.append(f"- Used as distribution KPI by: {self._names(used_for_distribution)}")
+            used_for_formatting = [e.source for e in used if e.kind == FORMATTING_CONDITION]
+            if used_for_formatting:
+                lines.append(f"- Used as formatting condition for: {self._names(used_for_formatting)}")
+            blocks.append("\n".join(lines))
+
+        if not blocks:
+            return ""
+        return "# Precomputed KPI Dependencies\n\n" + "\n\n".join(blocks)
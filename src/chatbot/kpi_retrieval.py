@@ -0,0 +1,226 @@
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from chatbot.kpi_graph import (
+    KPI_TABLE, LOCALIZATION_TABLE, CONDITION_METADATA_TABLE, CONDITIONAL_FORMATTING_TABLE,
+    KpiDependencyGraph,
+)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Field weights: a match in the KPI name is worth more than one in the formula body
+_NAME_WEIGHT = 3
+_LOCALIZATION_WEIGHT = 2
+_EXACT_NAME_BONUS = 100.0
+
+
+def _text(value) -> str:
+    return "" if value is None else str(value)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase search terms.
+
+    System identifiers such as `kpi_ACT_Volume_index` are kept whole and are also
+    split on underscores and camelCase, so "volume index" matches them. Every word
+    additionally contributes character trigrams, which makes the index tolerant
+    to Ukrainian inflections and partial identifiers.
+    """
+    terms = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        terms.append(lowered)
+        parts = [p for chunk in word.split("_") for p in _CAMEL_RE.findall(chunk)]
+        if len(parts) > 1:
+            terms.extend(p.lower() for p in parts)
+        if len(lowered) >= 3:
+            padded = f"#{lowered}#"
+            terms.extend("3:" + padded[i:i + 3] for i in range(len(padded) - 2))
+    return terms
+
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    """The KPIs selected for a question and the reference rows that describe them."""
+    hits: Tuple[Tuple[str, float], ...]
+    kpi_ids: Tuple[str, ...]
+    tables: Dict[str, List[Mapping]]
+
+    def to_json(self) -> str:
+        return json.dumps(self.tables, indent=None, ensure_ascii=False, default=dict)
+
+
+class KpiRetriever:
+    """
+    An offline BM25 index over the KPI table.
+
+    Each KPI is indexed as one document built from its `Name`, `Description`,
+    `CalculationKPIFormula`, its `CustomLocalization.VALUE` values and the `Name`
+    of the ConditionMetadata rows it reads from. A question retrieves the best
+    matching KPIs plus the KPIs they depend on, so the model sees a small,
+    self-contained slice of the reference data instead of the full dump.
+
+    The index is built once and never mutated, so one instance can be shared by
+    all sessions.
+    """
+
+    def __init__(self, tables: Dict[str, List[dict]], graph: Optional[KpiDependencyGraph] = None,
+                 k1: float = 1.2, b: float = 0.75):
+        self.tables = tables
+        self.graph = graph or KpiDependencyGraph(tables)
+        self.k1 = k1
+        self.b = b
+
+        kpis = tables.get(KPI_TABLE, [])
+        self.kpis_by_id: Dict[str, dict] = {_text(r.get("Id")): r for r in kpis}
+        self.kpi_ids_by_name: Dict[str, str] = {_text(r.get("Name")): _text(r.get("Id")) for r in kpis}
+        self._names_lower: Dict[str, str] = {name.lower(): kpi_id for name, kpi_id in self.kpi_ids_by_name.items()}
+
+        self.localization_by_object: Dict[str, List[dict]] = {}
+        for row in tables.get(LOCALIZATION_TABLE, []):
+            self.localization_by_object.setdefault(_text(row.get("ObjectId")), []).append(row)
+
+        self.condition_metadata_by_id: Dict[str, dict] = {
+            _text(r.get("Id")): r for r in tables.get(CONDITION_METADATA_TABLE, [])
+        }
+
+        self.formatting_by_kpi: Dict[str, List[dict]] = {}
+        for row in tables.get(CONDITIONAL_FORMATTING_TABLE, []):
+            self.formatting_by_kpi.setdefault(_text(row.get("KPIId")), []).append(row)
+
+        self._build_index()
+
+    # --- Index Construction --- #
+
+    def _condition_names(self, row: dict) -> List[str]:
+        names = []
+        for column in ("ReadKPIConditionMetadataId", "ReadKPIForecastMetadataId"):
+            metadata = self.condition_metadata_by_id.get(_text(row.get(column)))
+            if metadata:
+                names.append(_text(metadata.get("Name")))
+        return names
+
+    def _document_terms(self, kpi_id: str, row: dict) -> Counter:
+        terms = Counter()
+        for term in tokenize(_text(row.get("Name"))):
+            terms[term] += _NAME_WEIGHT
+        for loc in self.localization_by_object.get(kpi_id, []):
+            for term in tokenize(_text(loc.get("VALUE"))):
+                terms[term] += _LOCALIZATION_WEIGHT
+        for field_text in (
+            _text(row.get("Description")),
+            _text(row.get("CalculationKPIFormula")),
+            " ".join(self._condition_names(row)),
+        ):
+            terms.update(tokenize(field_text))
+        return terms
+
+    def _build_index(self):
+        self._postings: Dict[str, List[Tuple[str, int]]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        for kpi_id, row in self.kpis_by_id.items():
+            terms = self._document_terms(kpi_id, row)
+            self._doc_lengths[kpi_id] = sum(terms.values())
+            for term, freq in terms.items():
+                self._postings.setdefault(term, []).append((kpi_id, freq))
+
+        doc_count = len(self._doc_lengths)
+        self._avg_doc_length = (sum(self._doc_lengths.values()) / doc_count) if doc_count else 0.0
+        self._idf = {
+            term: math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    # --- Querying --- #
+
+    def search(self, question: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """
+        Ranks KPIs by relevance to a question.
+
+        Args:
+            question: The user question.
+            top_k: Maximum number of KPIs to return.
+
+        Returns:
+            (KPI Id, score) pairs, best first. KPIs whose system name appears
+            verbatim in the question always rank first.
+        """
+        query_terms = Counter(tokenize(question))
+        scores: Dict[str, float] = {}
+        for term, query_freq in query_terms.items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf[term]
+            for kpi_id, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[kpi_id] / self._avg_doc_length)
+                scores[kpi_id] = scores.get(kpi_id, 0.0) + query_freq * idf * freq * (self.k1 + 1) / (freq + norm)
+
+        for kpi_id in self.mentioned_kpis(question):
+            scores[kpi_id] = scores.get(kpi_id, 0.0) + _EXACT_NAME_BONUS
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+    def mentioned_kpis(self, question: str) -> List[str]:
+        """Returns the ids of KPIs whose system name appears verbatim in the question."""
+        mentioned = []
+        for word in _WORD_RE.findall(question):
+            kpi_id = self._names_lower.get(word.lower())
+            if kpi_id and kpi_id not in mentioned:
+                mentioned.append(kpi_id)
+        return mentioned
+
+    def dependency_closure(self, kpi_ids: Iterable[str], max_kpis: int = 40) -> List[str]:
+        """
+        Expands a set of KPIs with everything they depend on, transitively.
+
+        Dependencies are KPI names referenced in `CalculationKPIFormula`,
+        `DistributionKPIId` and the `ConditionKPIId` of conditional formatting rules.
+        The expansion is breadth-first and stops after `max_kpis` KPIs.
+        """
+        return self.graph.transitive_dependencies(kpi_ids, max_nodes=max_kpis)
+
+    def select_context(self, question: str, top_k: int = 5, max_kpis: int = 40) -> RetrievalResult:
+        """
+        Selects the reference rows needed to answer a question.
+
+        Returns:
+            A RetrievalResult whose `tables` has the same shape as the full
+            reference data (filename -> list of records), restricted to the
+            matching KPIs, their dependency closure and the rows joined to them.
+        """
+        hits = self.search(question, top_k=top_k)
+        kpi_ids = self.dependency_closure([kpi_id for kpi_id, _ in hits], max_kpis=max_kpis)
+        selected = set(kpi_ids)
+
+        condition_ids = []
+        for kpi_id in kpi_ids:
+            row = self.kpis_by_id[kpi_id]
+            for column in ("ReadKPIConditionMetadataId", "ReadKPIForecastMetadataId"):
+                condition_id = _text(row.get(column))
+                if condition_id in self.condition_metadata_by_id and condition_id not in condition_ids:
+                    condition_ids.append(condition_id)
+
+        tables = {
+            KPI_TABLE: [self.kpis_by_id[kpi_id] for kpi_id in kpi_ids],
+            LOCALIZATION_TABLE: [
+                loc for kpi_id in kpi_ids for loc in self.localization_by_object.get(kpi_id, [])
+            ],
+            CONDITION_METADATA_TABLE: [self.condition_metadata_by_id[cid] for cid in condition_ids],
+            CONDITIONAL_FORMATTING_TABLE: [
+                row for row in self.tables.get(CONDITIONAL_FORMATTING_TABLE, [])
+                if _text(row.get("KPIId")) in selected or _text(row.get("ConditionKPIId")) in selected
+            ],
+        }
+        return RetrievalResult(hits=tuple(hits), kpi_ids=tuple(kpi_ids), tables=tables)
+
+    def kpi_name(self, kpi_id: str) -> Optional[str]:
+        row = self.kpis_by_id.get(kpi_id)
+        return _text(row.get("Name")) if row else None
@@ -0,0 +1,307 @@
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from chatbot.knowledge_base import KnowledgeBase
+from chatbot.kpi_graph import KpiDependencyGraph, FORMULA, FORECAST_CONDITION
+
+# Value mappings of the "Універсальний Шаблон Опису KPI" (promotool_settings.md)
+KPI_TYPES = {0: "Read", 1: "Edit", 2: "Calculate"}
+BUSINESS_OBJECT_TYPES = {0: "Activity", 1: "Activity - Product", 2: "Forecast"}
+DATA_TYPES = {0: "Decimal", 1: "Int", 2: "Bool", 3: "Drop-Down List", 4: "Text"}
+CONDITION_LEVELS = {1: "Продукт", 2: "Клієнт", 3: "Продукт + Клієнт", 4: "Forecast"}
+READ_TIME_FRAMES = {0: "Дати відвантаження", 1: "Дати активності", 2: "Загальний період"}
+READ_AGGREGATION_TYPES = {0: "Сума", 1: "Мін", 2: "Макс", 3: "Середнє", 4: "Середньозважене", 5: "Перше", 6: "Останнє"}
+FORECAST_CONDITION_TYPE = 4
+READ, EDIT, CALCULATE = 0, 1, 2
+
+# Lookup intents, in the order their template lines are rendered
+ID = "id"
+KPI_TYPE = "type"
+SCOPE = "scope"
+DATA_TYPE = "data_type"
+LOCALIZED_NAME = "localized_name"
+READ_SOURCE = "read_source"
+FORMULA_TEXT = "formula"
+
+_DATA_TYPE_RE = re.compile(r"тип\w*\s+даних|data\s*type")
+_KPI_TYPE_RE = re.compile(r"\bтип\w*\b|\btype\b|read\s*,?\s*edit|edit\s+чи\s+calculate")
+_INTENT_PATTERNS: Tuple[Tuple[str, "re.Pattern"], ...] = (
+    (ID, re.compile(r"\bid\b|\bайді\b|\bguid\b|ідентифікатор|identifier")),
+    (KPI_TYPE, _KPI_TYPE_RE),
+    (SCOPE, re.compile(r"област\w*\s+застосування|business\s*object|\bscope\b|рів\w*\s+застосування")),
+    (DATA_TYPE, _DATA_TYPE_RE),
+    (LOCALIZED_NAME, re.compile(r"локалізован|\bназв\w*|відображуван\w*\s+назв|display\s+name|localized|ui\s+name"
+                                r"|як\s+(?:він\s+|вона\s+|воно\s+)?називається")),
+    (READ_SOURCE, re.compile(r"джерел|звідки|умов\w*\s+читання|conditionmetadata|\bsource\b|reads?\s+from"
+                             r"|вичиту\w*|читається")),
+    (FORMULA_TEXT, re.compile(r"формул\w*|\bformula\b")),
+)
+# Asking for reasoning, comparisons or relations needs the model even if a lookup word appears
+_REASONING_RE = re.compile(
+    r"поясн|чому|навіщо|для\s+чого|як\s+працю|як\s+(?:\w+\s+)?вплива|впливає|залеж|різниц|порівн|відрізня"
+    r"|використовують|як\s+розрахову|як\s+рахує|explain|\bwhy\b|how\s+does|how\s+is|depend|differ|compar|affect"
+)
+# Reverse lookups ("which KPIs ..."), relations, conditionals and hypotheticals are
+# not lookups of one KPI's field, whatever lookup word they contain
+_NOT_LOOKUP_RE = re.compile(
+    r"\bякі\b|\bяких\b|\bwhich\b|\bkpis\b|\buses?\b|\bused\b|використов|той\s+же|\bтого\s+ж|\bтой\s+самий"
+    r"|\bsame\b|\bякщо\b|\bif\b|\bчи\s+може|\bможе\b|\bcan\b|\bcould\b|\bwould\b|замість|instead"
+)
+# Besides the KPI and the lookup fields, a lookup question may only contain these
+# words; anything else (a second ask, a condition, a place in the UI) goes to the model
+_LOOKUP_WORDS = frozenset("""
+    який яка яке якого якої яким якій що це цей ця цього цієї у в з із до і й та а його її нього неї
+    він вона має є kpi показник показника показнику покажи скажи підкажи даних дані
+    what what's whats is are the of for a an and its it has have does do in from show me tell give
+""".split())
+# The lookup field phrases as whole words, "тип даних" before "тип"
+_INTENT_WORDS_RES = tuple(re.compile(rf"\w*(?:{pattern.pattern})\w*")
+                          for pattern in (_DATA_TYPE_RE, *(pattern for _, pattern in _INTENT_PATTERNS)))
+_WORD_RE = re.compile(r"[\w'’ʼ]+")
+_KPI_TOKEN_RE = re.compile(r"\bkpi_\w+", re.IGNORECASE)
+# Longer questions usually ask for more than a lookup
+MAX_QUESTION_CHARS = 200
+# Localized names shorter than this are too ambiguous to match inside free text
+MIN_LOCALIZED_MATCH_CHARS = 6
+
+
+@dataclass(frozen=True)
+class LocalAnswer:
+    """An answer rendered from the settings tables without a model call."""
+    text: str
+    kpi_id: str
+    intents: Tuple[str, ...]
+    seconds: float
+
+
+class LocalAnswerEngine:
+    """
+    Answers structured KPI lookups (Id, type, scope, data type, localized name,
+    read source, formula) straight from the knowledge base, in the wording of the
+    "Універсальний Шаблон Опису KPI".
+
+    A question is answered locally only when it names exactly one known KPI (by
+    system name or its localized name), asks for at least one lookup field, does
+    not ask for an explanation, comparison or dependencies, has the shape of a
+    plain lookup (apart from the KPI and the fields, only the words of
+    `_LOOKUP_WORDS`; no reverse lookup, condition or second ask), and every
+    requested field is filled in the tables. Everything else returns None and
+    goes to the model (and its routing). The engine is read-only apart from its counters, so one instance is
+    shared by all sessions.
+    """
+
+    def __init__(self, knowledge_base: KnowledgeBase, graph: Optional[KpiDependencyGraph] = None,
+                 language: str = "en"):
+        self.kb = knowledge_base
+        # Localized names are looked up in `language`, then in English
+        self.language = language
+        self.graph = graph or KpiDependencyGraph(knowledge_base.tables)
+        self._names_lower: Dict[str, str] = {name.lower(): kpi.Id for name, kpi in knowledge_base.kpi_by_name.items()}
+        localized = [(value.lower(), kpi_id) for kpi_id in knowledge_base.kpi_by_id
+                     if (value := self._localized(kpi_id)) and len(value) >= MIN_LOCALIZED_MATCH_CHARS]
+        # A localized name that is part of another one ("Baseline" in "Baseline VBB (tech)") is ambiguous
+        self._localized_patterns: List[Tuple["re.Pattern", str]] = [
+            (re.compile(rf"(?<!\w){re.escape(value)}(?!\w)"), kpi_id) for value, kpi_id in localized
+            if not any(value != other and value in other for other, _ in localized)
+        ]
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    # --- Question Analysis --- #
+
+    def _localized(self, kpi_id: str) -> Optional[str]:
+        return self.kb.localized_name(kpi_id, self.language) or self.kb.localized_name(kpi_id, "en")
+
+    def resolve_kpis(self, question: str) -> List[str]:
+        """Ids of the KPIs a question names, by system name or, failing that, by localized name."""
+        lowered = question.lower()
+        kpi_ids = []
+        for token in _KPI_TOKEN_RE.findall(lowered):
+            kpi_id = self._names_lower.get(token)
+            if kpi_id is None:
+                # An unknown system name: only the model can say it does not exist
+                return []
+            if kpi_id not in kpi_ids:
+                kpi_ids.append(kpi_id)
+        if kpi_ids:
+            return kpi_ids
+        for pattern, kpi_id in self._localized_patterns:
+            if pattern.search(lowered) and kpi_id not in kpi_ids:
+                kpi_ids.append(kpi_id)
+        return kpi_ids
+
+    def is_lookup_shape(self, question: str) -> bool:
+        """
+        Whether the question only asks for fields of the KPI it names: every word
+        is part of the KPI name, a lookup field or one of `_LOOKUP_WORDS`.
+        """
+        lowered = question.lower()
+        if _NOT_LOOKUP_RE.search(lowered):
+            return False
+        rest = _KPI_TOKEN_RE.sub(" ", lowered)
+        for pattern, _ in self._localized_patterns:
+            rest = pattern.sub(" ", rest)
+        for pattern in _INTENT_WORDS_RES:
+            rest = pattern.sub(" ", rest)
+        return all(word in _LOOKUP_WORDS for word in _WORD_RE.findall(rest))
+
+    @staticmethod
+    def detect_intents(question: str) -> Tuple[str, ...]:
+        """The lookup fields a question asks for, in template order."""
+        lowered = question.lower()
+        intents = [intent for intent, pattern in _INTENT_PATTERNS if pattern.search(lowered)]
+        # "тип даних" is the data type, not the KPI type, unless "тип" also appears on its own
+        if DATA_TYPE in intents and KPI_TYPE in intents:
+            if not _KPI_TYPE_RE.search(_DATA_TYPE_RE.sub(" ", lowered)):
+                intents.remove(KPI_TYPE)
+        return tuple(intents)
+
+    # --- Rendering --- #
+
+    def _kpi_label(self, kpi_id: str) -> str:
+        kpi = self.kb.kpi_by_id.get(kpi_id)
+        if kpi is None:
+            return f"`{kpi_id}`"
+        localized = self._localized(kpi_id)
+        return f"`{kpi.Name}` ({localized})" if localized and localized != kpi.Name else f"`{kpi.Name}`"
+
+    def _read_source_lines(self, kpi) -> Optional[List[str]]:
+        condition = self.kb.condition_by_id.get(kpi.ReadKPIConditionMetadataId)
+        if condition is None or not condition.Name:
+            return None
+        if condition.Type == FORECAST_CONDITION_TYPE:
+            sources = [edge.source for edge in self.graph.used_by(condition.Id, [FORECAST_CONDITION])]
+            if not sources:
+                return None
+            return [
+                "*   **Логіка / Джерело:**",
+                "    Цей KPI **не виконує власних розрахунків**. Він вичитує готові дані з транзитного сховища.",
+                f"    *   **KPI-Джерело:** {', '.join(self._kpi_label(s) for s in sources)}",
+                f"    *   **Назва ForecastCondition:** `{condition.Name}`",
+            ]
+        level = CONDITION_LEVELS.get(condition.Type)
+        if level is None:
+            return None
+        lines = [
+            "*   **Логіка / Джерело:**",
+            f"    *   **Джерело:** Поле `{condition.Name}` з `mstr.ClientProductCondition`.",
+            f"    *   **Рівень даних:** `{level}` (з `ConditionMetadata.Type`).",
+        ]
+        time_frame = READ_TIME_FRAMES.get(kpi.ReadKPITimeFrame)
+        aggregation = READ_AGGREGATION_TYPES.get(kpi.ReadKPIAggregationType)
+        if kpi.BusinessObjectType == 1 and time_frame and aggregation:
+            lines += [
+                "",
+                "**Правила Завантаження Даних**",
+                f"*   **Часовий Період:** `{time_frame}` (з `ReadKPITimeFrame`).",
+                f"*   **Правило Агрегації:** `{aggregation}` (з `ReadKPIAggregationType`).",
+            ]
+        return lines
+
+    def _formula_lines(self, kpi) -> Optional[List[str]]:
+        if not kpi.CalculationKPIFormula:
+            return None
+        lines = ["*   **Логіка / Джерело:**", "", "```csharp", kpi.CalculationKPIFormula.strip(), "```", ""]
+        dependencies = [edge.target for edge in self.graph.depends_on(kpi.Id, [FORMULA])]
+        lines.append("*   **Залежності:** " + (", ".join(self._kpi_label(d) for d in dependencies)
+                                                if dependencies else "формула не посилається на інші KPI."))
+        return lines
+
+    def _render(self, kpi, intents: Tuple[str, ...]) -> Optional[str]:
+        kpi_type = KPI_TYPES.get(kpi.Type)
+        localized = self._localized(kpi.Id)
+        lines = [
+            f"*   **Назва KPI:** {localized or kpi.Name}",
+            f"*   **Системний ідентифікатор:** `{kpi.Name}`",
+        ]
+        for intent in intents:
+            if intent == ID:
+                lines.append(f"*   **ID:** `{kpi.Id}`")
+            elif intent == KPI_TYPE:
+                if kpi_type is None:
+                    return None
+                lines.append(f"*   **Тип:** `{kpi_type}`")
+            elif intent == SCOPE:
+                scope = BUSINESS_OBJECT_TYPES.get(kpi.BusinessObjectType)
+                if scope is None:
+                    return None
+                lines.append(f"*   **Область застосування:** `{scope}`")
+            elif intent == DATA_TYPE:
+                data_type = DATA_TYPES.get(kpi.DataType)
+                if data_type is None:
+                    return None
+                lines.append(f"*   **Тип даних:** `{data_type}` (з `DataType`)")
+            elif intent == LOCALIZED_NAME:
+                if not localized:
+                    lines.append("*   **Локалізована назва:** у `CustomLocalization` назву не задано, "
+                                 "в інтерфейсі відображається системне ім'я.")
+            elif intent in (READ_SOURCE, FORMULA_TEXT):
+                if kpi.Type == READ:
+                    block = self._read_source_lines(kpi)
+                elif kpi.Type == CALCULATE:
+                    block = self._formula_lines(kpi)
+                elif kpi.Type == EDIT:
+                    block = ["*   **Логіка / Джерело:** Це поле редагується користувачем, "
+                             "власної формули чи джерела даних немає."]
+                else:
+                    block = None
+                if block is None:
+                    return None
+                if block[0] not in lines:
+                    if intent == FORMULA_TEXT and kpi.Type == READ:
+                        lines.append("*   **Формула:** немає — це `Read` KPI, значення вичитується з джерела.")
+                    lines.extend(block)
+        return "\n".join(lines)
+
+    # --- Answering --- #
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.counters["questions"] += 1
+            self.counters[outcome] += 1
+
+    def answer(self, question: str) -> Optional[LocalAnswer]:
+        """
+        Answers a lookup question from the tables.
+
+        Args:
+            question: The user question, as typed.
+
+        Returns:
+            The rendered answer, or None if the question should go to the model.
+        """
+        start = time.perf_counter()
+        if len(question) > MAX_QUESTION_CHARS:
+            self._count("skipped_long")
+            return None
+        lowered = question.lower()
+        if _REASONING_RE.search(lowered):
+            self._count("skipped_reasoning")
+            return None
+        intents = self.detect_intents(question)
+        if not intents:
+            self._count("skipped_no_intent")
+            return None
+        kpi_ids = self.resolve_kpis(question)
+        if len(kpi_ids) != 1:
+            self._count("skipped_no_kpi" if not kpi_ids else "skipped_many_kpis")
+            return None
+        if not self.is_lookup_shape(question):
+            self._count("skipped_not_lookup")
+            return None
+        text = self._render(self.kb.kpi_by_id[kpi_ids[0]], intents)
+        if text is None:
+            self._count("skipped_missing_data")
+            return None
+        self._count("answered")
+        return LocalAnswer(text=text, kpi_id=kpi_ids[0], intents=intents, seconds=time.perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        questions = counters.get("questions", 0)
+        return {**counters, "coverage": counters.get("answered", 0) / questions if questions else 0.0}
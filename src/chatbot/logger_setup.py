@@ -1,13 +1,239 @@
-
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
+import random
 import sys
-from pythonjsonlogger import jsonlogger
+import threading
+import time
+from typing import Dict, List, Optional
 
-# Create logs directory if it doesn't exist
+# Logs directory; created when the first logger is set up, not at import
 LOGS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "logs"))
-os.makedirs(LOGS_DIR, exist_ok=True)
+
+# "async" hands records to a background writer thread; "sync" writes on the calling thread
+LOG_MODE_ENV = "LOG_MODE"
+# Longest `payload` kept in a record (characters, 0 = unlimited)
+LOG_PAYLOAD_MAX_CHARS_ENV = "LOG_PAYLOAD_MAX_CHARS"
+# Fraction of records that keep their `payload` at all (1.0 = every record)
+LOG_PAYLOAD_SAMPLE_RATE_ENV = "LOG_PAYLOAD_SAMPLE_RATE"
+# Records waiting for the writer; when full, new records are dropped and counted
+LOG_QUEUE_SIZE_ENV = "LOG_QUEUE_SIZE"
+
+# --- Payload Policy --- #
+
+class PayloadPolicy(logging.Filter):
+    """
+    Truncates and samples the `payload` field (questions, model answers) of log records.
+
+    A payload longer than `max_chars` is cut and the record gets `payload_truncated`
+    and the original `payload_length`. With `sample_rate` below 1.0, only that
+    fraction of records keeps its payload; the others keep `payload_length` and get
+    `payload_sampled_out`. Records are never dropped by this filter.
+    """
+
+    def __init__(self, max_chars: int = 2000, sample_rate: float = 1.0):
+        super().__init__()
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+        self.truncated = 0
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        payload = getattr(record, "payload", None)
+        if not isinstance(payload, str):
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            record.payload = None
+            record.payload_length = len(payload)
+            record.payload_sampled_out = True
+            self.sampled_out += 1
+        elif self.max_chars and len(payload) > self.max_chars:
+            record.payload = payload[:self.max_chars]
+            record.payload_length = len(payload)
+            record.payload_truncated = True
+            self.truncated += 1
+        return True
+
+# --- Batched File Output --- #
+
+class BatchedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    A RotatingFileHandler that can write many records with one write, one flush
+    and one rollover check (`emit_batch`), instead of formatting each record twice
+    and flushing after each one.
+    """
+
+    def emit_batch(self, records: List[logging.LogRecord]):
+        try:
+            text = "".join(self.format(record) + self.terminator for record in records)
+        except Exception:
+            for record in records:
+                self.handleError(record)
+            return
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0:
+                self.stream.seek(0, 2)
+                position = self.stream.tell()
+                if position and position + len(text.encode("utf-8")) >= self.maxBytes:
+                    self.doRollover()
+            self.stream.write(text)
+            self.stream.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
+
+# --- Background Writer --- #
+
+_STOP = object()
+
+class AsyncLogWriter:
+    """
+    Writes queued log records to their handlers on one background thread.
+
+    Producers (request threads) only put records on a bounded queue; when it is
+    full, records are dropped and counted instead of blocking the caller. The
+    writer collects up to `batch_size` records, or whatever arrived within
+    `flush_interval` seconds of the first one, and writes each handler's share of
+    the batch at once. `stop()` drains everything enqueued before it, so a clean
+    shutdown loses no records.
+    """
+
+    def __init__(self, max_queue_size: int = 10000, batch_size: int = 256, flush_interval: float = 0.5):
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.routes: Dict[str, List[logging.Handler]] = {}
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def add_route(self, logger_name: str, handler: logging.Handler):
+        """Sends the records of `logger_name` to `handler`."""
+        self.routes.setdefault(logger_name, []).append(handler)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+            self.stats["enqueued"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def stop(self, timeout: float = 10.0):
+        """Writes every record enqueued so far and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # Blocks if the queue is full: shutdown must not drop records
+        self.queue.put(_STOP)
+        thread.join(timeout)
+        for handlers in self.routes.values():
+            for handler in handlers:
+                handler.flush()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    record = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+
+    def _write(self, batch: List[logging.LogRecord]):
+        by_logger: Dict[str, List[logging.LogRecord]] = {}
+        for record in batch:
+            by_logger.setdefault(record.name, []).append(record)
+        for logger_name, records in by_logger.items():
+            for handler in self.routes.get(logger_name, []):
+                accepted = [r for r in records if r.levelno >= handler.level and handler.filter(r)]
+                if not accepted:
+                    continue
+                if isinstance(handler, BatchedRotatingFileHandler):
+                    handler.emit_batch(accepted)
+                else:
+                    for record in accepted:
+                        handler.handle(record)
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+
+class _WriterQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the AsyncLogWriter without blocking or raising when its queue is full."""
+
+    def __init__(self, writer: AsyncLogWriter):
+        super().__init__(writer.queue)
+        self.writer = writer
+
+    def enqueue(self, record: logging.LogRecord):
+        self.writer.enqueue(record)
+
+
+_writer: Optional[AsyncLogWriter] = None
+_writer_lock = threading.Lock()
+
+def get_log_writer() -> AsyncLogWriter:
+    """Returns the process-wide background writer, starting it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AsyncLogWriter(max_queue_size=int(os.getenv(LOG_QUEUE_SIZE_ENV, "10000")))
+            _writer.start()
+            # Registered after the logging module's own hook, so it runs before it
+            atexit.register(shutdown_logging)
+        return _writer
+
+def shutdown_logging():
+    """Drains the background writer; records logged before this call are written."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
+
+def attach_handler(logger: logging.Logger, handler: logging.Handler, mode: Optional[str] = None,
+                   writer: Optional[AsyncLogWriter] = None):
+    """
+    Connects a file handler to a logger, through the background writer (`mode="async"`)
+    or directly (`mode="sync"`). Defaults to the LOG_MODE environment variable and
+    the process-wide writer.
+    """
+    mode = mode or os.getenv(LOG_MODE_ENV, "async").lower()
+    if mode == "async":
+        writer = writer or get_log_writer()
+        writer.add_route(logger.name, handler)
+        logger.addHandler(_WriterQueueHandler(writer))
+    else:
+        logger.addHandler(handler)
+
+def payload_policy_from_env() -> PayloadPolicy:
+    return PayloadPolicy(
+        max_chars=int(os.getenv(LOG_PAYLOAD_MAX_CHARS_ENV, "2000")),
+        sample_rate=float(os.getenv(LOG_PAYLOAD_SAMPLE_RATE_ENV, "1.0")),
+    )
 
 # --- Detailed JSON Logger --- #
 
@@ -19,20 +245,24 @@ def setup_detailed_logger():
 
     # Avoid adding handlers if they already exist
     if not logger.handlers:
+        from pythonjsonlogger import jsonlogger
+        os.makedirs(LOGS_DIR, exist_ok=True)
         log_path = os.path.join(LOGS_DIR, "detailed_activity.log")
-        
+
         # Use a rotating file handler to prevent log files from growing indefinitely
-        handler = logging.handlers.RotatingFileHandler(
+        handler = BatchedRotatingFileHandler(
             log_path, maxBytes=10*1024*1024, backupCount=5, encoding='utf-8'
         )
-        
+
         # Use a custom JSON formatter
         formatter = jsonlogger.JsonFormatter(
             '%(asctime)s %(name)s %(levelname)s %(message)s %(session_id)s',
             json_ensure_ascii=False
         )
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        # Applied on the calling thread, so oversized payloads are never queued
+        logger.addFilter(payload_policy_from_env())
+        attach_handler(logger, handler)
 
     return logger
 
@@ -45,21 +275,82 @@ def setup_request_logger():
     logger.propagate = False
 
     if not logger.handlers:
+        os.makedirs(LOGS_DIR, exist_ok=True)
         log_path = os.path.join(LOGS_DIR, "requests.log")
-        
-        handler = logging.handlers.RotatingFileHandler(
+
+        handler = BatchedRotatingFileHandler(
             log_path, maxBytes=5*1024*1024, backupCount=5, encoding='utf-8'
         )
-        
+
         # Simple formatter, just the timestamp is needed for counting
         formatter = logging.Formatter('%(asctime)s')
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        attach_handler(logger, handler)
+
+    return logger
+
+# --- Metrics Event Logger --- #
+
+def setup_metrics_logger():
+    """Sets up the logger for metrics events (one JSON object per line, see metrics.py)."""
+    logger = logging.getLogger('metrics_logger')
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    if not logger.handlers:
+        os.makedirs(LOGS_DIR, exist_ok=True)
+        log_path = os.path.join(LOGS_DIR, "metrics.jsonl")
+
+        handler = BatchedRotatingFileHandler(
+            log_path, maxBytes=10*1024*1024, backupCount=5, encoding='utf-8'
+        )
+
+        # Messages are already serialized JSON objects
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        attach_handler(logger, handler)
 
     return logger
 
 # --- Get Loggers --- #
-# These will be imported by other modules
-detailed_logger = setup_detailed_logger()
-request_logger = setup_request_logger()
+# Loggers are set up on first use, so importing this module has no side effects
+
+_loggers = {}
+# Loggers are first used from several threads at once (the script thread and
+# the background executor); without the lock two of them could each attach a handler
+_loggers_lock = threading.Lock()
+
+def _get_logger(name: str, setup) -> logging.Logger:
+    logger = _loggers.get(name)
+    if logger is None:
+        with _loggers_lock:
+            logger = _loggers.get(name)
+            if logger is None:
+                logger = _loggers[name] = setup()
+    return logger
+
+def get_detailed_logger() -> logging.Logger:
+    return _get_logger('detailed_logger', setup_detailed_logger)
+
+def get_request_logger() -> logging.Logger:
+    return _get_logger('request_logger', setup_request_logger)
+
+def get_metrics_logger() -> logging.Logger:
+    return _get_logger('metrics_logger', setup_metrics_logger)
+
+def logging_stats() -> dict:
+    """Returns the background writer counters and how many payloads were truncated or sampled out."""
+    stats = dict(_writer.stats) if _writer is not None else {}
+    stats["queued"] = _writer.queue.qsize() if _writer is not None else 0
+    for f in logging.getLogger('detailed_logger').filters:
+        if isinstance(f, PayloadPolicy):
+            stats["payloads_truncated"] = f.truncated
+            stats["payloads_sampled_out"] = f.sampled_out
+    return stats
 
+def __getattr__(name):
+    # Keeps `from chatbot.logger_setup import detailed_logger` working for older modules
+    if name == 'detailed_logger':
+        return get_detailed_logger()
+    if name == 'request_logger':
+        return get_request_logger()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,304 @@
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Upper bounds of the Prometheus histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Span names recorded by the app
+PROMPT_BUILD = "prompt_build"
+SESSION_INIT = "session_init"
+SESSION_RESUME = "session_resume"
+TIME_TO_INTERACTIVE = "time_to_interactive"
+MODEL_CALL = "model_call"
+TIME_TO_FIRST_TOKEN = "ttft"
+RENDER_HISTORY = "render_history"
+RENDER_STREAM = "render_stream"
+SCHEDULER_WAIT = "scheduler_wait"
+LOCAL_ANSWER = "local_answer"
+SETTINGS_RELOAD = "settings_reload"
+
+
+def tiered(name: str, tier: str) -> str:
+    """The name under which a span or token kind is also recorded per model tier, e.g. "model_call:fast"."""
+    return f"{name}:{tier}"
+
+
+class Histogram:
+    """
+    Cumulative bucket counts (for Prometheus) plus a window of the most recent
+    observations, from which p50/p95/p99 are computed exactly.
+    """
+
+    def __init__(self, buckets: Iterable[float], window: int = 1024):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> dict:
+        result = {"count": self.count, "sum": self.sum, "max": self.max}
+        for q in QUANTILES:
+            result[f"p{int(q * 100)}"] = self.quantile(q)
+        return result
+
+
+class _SessionMetrics:
+    def __init__(self):
+        self.spans: Dict[str, Histogram] = {}
+        self.tokens: Dict[str, Histogram] = {}
+        # (turn, prompt tokens) per request, to see how the context grows over a conversation
+        self.prompt_growth: List[tuple] = []
+
+
+class MetricsRegistry:
+    """
+    Latency and token metrics for the whole process and for each session.
+
+    Spans (prompt build, session init, model call, time to first token, render)
+    and per-request token counts go into histograms twice: once per process and
+    once per session (the `max_sessions` most recently active sessions are kept).
+    Every observation is also passed to `event_sink` as a JSONL-ready dict.
+    `prometheus_text()` renders the process histograms in the Prometheus text
+    exposition format; `export()` writes it to `export_path` at most every
+    `export_interval` seconds.
+    """
+
+    def __init__(self, export_path: Optional[str] = None, export_interval: float = 15.0,
+                 max_sessions: int = 1000, event_sink: Optional[Callable[[dict], None]] = None):
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self.max_sessions = max_sessions
+        self.event_sink = event_sink
+        self.spans: Dict[str, Histogram] = {}
+        self.tokens: Dict[str, Histogram] = {}
+        self.gauges: Dict[str, float] = {}
+        self.counters: Dict[str, float] = {}
+        self.sessions: "OrderedDict[str, _SessionMetrics]" = OrderedDict()
+        self._last_export = 0.0
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> _SessionMetrics:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = _SessionMetrics()
+            if len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(session_id)
+        return session
+
+    def _emit(self, event: dict):
+        if self.event_sink is not None:
+            self.event_sink({"ts": time.time(), **event})
+
+    # --- Recording --- #
+
+    def observe(self, span: str, seconds: float, session_id: Optional[str] = None, **labels):
+        """Records the duration of one span."""
+        with self._lock:
+            self.spans.setdefault(span, Histogram(DURATION_BUCKETS)).observe(seconds)
+            if session_id:
+                self._session(session_id).spans.setdefault(span, Histogram(DURATION_BUCKETS)).observe(seconds)
+        self._emit({"type": "span", "span": span, "seconds": seconds, "session_id": session_id, **labels})
+
+    def set_gauge(self, name: str, value: float):
+        """Sets a process-wide gauge (e.g. current queue depth)."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def increment(self, name: str, amount: float = 1):
+        """Adds to a process-wide counter (e.g. retries)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def span(self, name: str, session_id: Optional[str] = None, **labels):
+        """Times the enclosed block and records it as span `name` (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, session_id, **labels)
+
+    def record_usage(self, session_id: Optional[str], usage=None, history_tokens: Optional[int] = None,
+                     tier: Optional[str] = None, **labels):
+        """
+        Records the token counts of one request.
+
+        Args:
+            session_id: The Streamlit session the request belongs to.
+            usage: The response's `usage_metadata` (prompt, candidates, total and
+                cached-content token counts).
+            history_tokens: Tokens of chat history sent with the request.
+            tier: The model tier that served the request; the process-wide counts
+                are also recorded per tier (e.g. "prompt:fast").
+        """
+        counts = {}
+        if usage is not None:
+            counts["prompt"] = getattr(usage, "prompt_token_count", None)
+            counts["candidates"] = getattr(usage, "candidates_token_count", None)
+            counts["total"] = getattr(usage, "total_token_count", None)
+            counts["cached"] = getattr(usage, "cached_content_token_count", None)
+        counts["history"] = history_tokens
+        counts = {kind: int(value) for kind, value in counts.items() if value is not None}
+
+        with self._lock:
+            session = self._session(session_id) if session_id else None
+            for kind, value in counts.items():
+                self.tokens.setdefault(kind, Histogram(TOKEN_BUCKETS)).observe(value)
+                if tier is not None:
+                    self.tokens.setdefault(tiered(kind, tier), Histogram(TOKEN_BUCKETS)).observe(value)
+                if session is not None:
+                    session.tokens.setdefault(kind, Histogram(TOKEN_BUCKETS)).observe(value)
+            turn = None
+            if session is not None and "prompt" in counts:
+                turn = len(session.prompt_growth) + 1
+                session.prompt_growth.append((turn, counts["prompt"]))
+        self._emit({"type": "usage", "session_id": session_id, "turn": turn, "tier": tier,
+                    **{f"{kind}_tokens": value for kind, value in counts.items()}, **labels})
+
+    # --- Reporting --- #
+
+    def process_summary(self) -> dict:
+        """Returns count/sum/max/p50/p95/p99 of every process-wide span and token histogram."""
+        with self._lock:
+            return {
+                "spans": {name: h.summary() for name, h in self.spans.items()},
+                "tokens": {kind: h.summary() for kind, h in self.tokens.items()},
+                "gauges": dict(self.gauges),
+                "counters": dict(self.counters),
+                "sessions": len(self.sessions),
+            }
+
+    def span_quantile(self, span: str, q: float) -> Optional[float]:
+        """Returns a process-wide quantile of one span, or None before its first observation."""
+        with self._lock:
+            histogram = self.spans.get(span)
+            return histogram.quantile(q) if histogram is not None else None
+
+    def session_summary(self, session_id: str) -> dict:
+        """Returns the histograms of one session and the prompt tokens of each of its requests."""
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return {"spans": {}, "tokens": {}, "prompt_growth": []}
+            return {
+                "spans": {name: h.summary() for name, h in session.spans.items()},
+                "tokens": {kind: h.summary() for kind, h in session.tokens.items()},
+                "prompt_growth": list(session.prompt_growth),
+            }
+
+    def prometheus_text(self) -> str:
+        """Renders the process-wide metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            families = (
+                ("chatbot_span_seconds", "span", self.spans, "Duration of app spans in seconds."),
+                ("chatbot_request_tokens", "kind", self.tokens, "Tokens per model request."),
+            )
+            for metric, label, histograms, help_text in families:
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for name, h in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets + (float("inf"),), h.bucket_counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f'{metric}_bucket{{{label}="{name}",le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{label}="{name}"}} {h.sum}')
+                    lines.append(f'{metric}_count{{{label}="{name}"}} {h.count}')
+                # Exact quantiles over the recent window, as a separate summary family
+                lines.append(f"# HELP {metric}_recent {help_text} Quantiles over recent observations.")
+                lines.append(f"# TYPE {metric}_recent summary")
+                for name, h in sorted(histograms.items()):
+                    for q in QUANTILES:
+                        value = h.quantile(q)
+                        if value is not None:
+                            lines.append(f'{metric}_recent{{{label}="{name}",quantile="{q}"}} {value}')
+                    lines.append(f'{metric}_recent_sum{{{label}="{name}"}} {sum(h.recent)}')
+                    lines.append(f'{metric}_recent_count{{{label}="{name}"}} {len(h.recent)}')
+            lines.append("# HELP chatbot_active_sessions Sessions with recorded metrics.")
+            lines.append("# TYPE chatbot_active_sessions gauge")
+            lines.append(f"chatbot_active_sessions {len(self.sessions)}")
+            for name, value in sorted(self.gauges.items()):
+                lines.append(f"# TYPE chatbot_{name} gauge")
+                lines.append(f"chatbot_{name} {value}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE chatbot_{name}_total counter")
+                lines.append(f"chatbot_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, force: bool = False) -> bool:
+        """
+        Writes `prometheus_text()` to `export_path` (atomically, for a node-exporter
+        textfile collector or any scraper), at most once per `export_interval`.
+
+        Returns:
+            True if the file was written.
+        """
+        if self.export_path is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_export < self.export_interval:
+                return False
+            self._last_export = now
+        directory = os.path.dirname(self.export_path)
+        os.makedirs(directory, exist_ok=True)
+        # A temporary file per writer: concurrent exports never share one
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False) as f:
+            f.write(self.prometheus_text())
+        try:
+            os.replace(f.name, self.export_path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+        return True
+
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """
+    Returns the process-wide registry. Events go to `logs/metrics.jsonl` and the
+    Prometheus text to `logs/metrics.prom` (METRICS_EXPORT_INTERVAL_SECONDS apart).
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            from chatbot.logger_setup import LOGS_DIR, get_metrics_logger
+            metrics_logger = get_metrics_logger()
+            _metrics = MetricsRegistry(
+                export_path=os.path.join(LOGS_DIR, "metrics.prom"),
+                export_interval=float(os.getenv("METRICS_EXPORT_INTERVAL_SECONDS", "15")),
+                event_sink=lambda event: metrics_logger.info(json.dumps(event, ensure_ascii=False, default=str)),
+            )
+            atexit.register(_metrics.export, True)
+        return _metrics
@@ -0,0 +1,90 @@
+import os
+import threading
+from typing import Iterable, List, Optional, Protocol
+
+
+class ChatSessionLike(Protocol):
+    """
+    The part of `google.generativeai.ChatSession` the app relies on.
+
+    `send_message(content, stream=True)` returns a response that yields chunks
+    with a `.text` and, once fully iterated, has a `.usage_metadata`. The exchange
+    is appended to `history` after the stream completes; `rewind()` removes the
+    last exchange. `history` can be replaced with {"role", "parts"} dicts.
+    """
+    history: List
+
+    def send_message(self, content: str, stream: bool = False): ...
+
+    def rewind(self): ...
+
+
+class ModelClient(Protocol):
+    """
+    A model backend for the chatbot: `GeminiApiClient` in production, the
+    deterministic `StubModelClient` for offline benchmarks and replays.
+    """
+    context_cache: Optional[object]
+
+    def start_chat_session(self, system_prompt: str, prompt_hash: str = None) -> ChatSessionLike: ...
+
+    def count_tokens(self, text: str) -> int: ...
+
+
+MODEL_CLIENTS: Iterable[str] = ("gemini", "stub")
+
+# Model tiers: "fast" for simple lookups and follow-ups, "pro" for analysis
+FAST_TIER = "fast"
+PRO_TIER = "pro"
+MODEL_TIERS: Iterable[str] = (FAST_TIER, PRO_TIER)
+DEFAULT_TIER_MODELS = {FAST_TIER: "gemini-2.5-flash", PRO_TIER: "gemini-2.5-pro"}
+
+
+def model_name_for_tier(tier: str = PRO_TIER) -> str:
+    """
+    Returns the Gemini model of a tier, from GEMINI_FAST_MODEL / GEMINI_PRO_MODEL.
+
+    Raises:
+        ValueError: If the tier is unknown.
+    """
+    if tier not in DEFAULT_TIER_MODELS:
+        raise ValueError(f"Unknown model tier: {tier} (expected one of {', '.join(MODEL_TIERS)})")
+    return os.getenv(f"GEMINI_{tier.upper()}_MODEL", DEFAULT_TIER_MODELS[tier])
+
+
+def create_model_client(kind: str = None, tier: str = PRO_TIER) -> ModelClient:
+    """
+    Creates the model client selected by `kind` or the MODEL_CLIENT environment
+    variable ("gemini" by default, "stub" for the offline stand-in), for the
+    model of the given tier.
+
+    Raises:
+        ValueError: If the client kind or tier is unknown, or the Gemini API key is missing.
+    """
+    kind = (kind or os.getenv("MODEL_CLIENT", "gemini")).lower()
+    model_name = model_name_for_tier(tier)
+    if kind == "stub":
+        from chatbot.stub_client import StubModelClient
+        return StubModelClient.from_env(tier)
+    if kind == "gemini":
+        from chatbot.gemini_api_client import GeminiApiClient
+        return GeminiApiClient(model_name=model_name)
+    raise ValueError(f"Unknown model client: {kind} (expected one of {', '.join(MODEL_CLIENTS)})")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_model_client(tier: str = PRO_TIER, kind: str = None) -> ModelClient:
+    """
+    Returns the process-wide client of a tier, created on first use. Clients hold
+    no conversation state (that lives in the chat sessions they start), so every
+    session shares them.
+    """
+    key = ((kind or os.getenv("MODEL_CLIENT", "gemini")).lower(), tier)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = create_model_client(kind=key[0], tier=tier)
+        return client
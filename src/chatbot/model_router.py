@@ -0,0 +1,197 @@
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Optional, Tuple
+
+from chatbot.history_manager import content_to_dict
+from chatbot.model_client import FAST_TIER, PRO_TIER, MODEL_TIERS, ModelClient, ChatSessionLike
+
+# Questions about how KPIs relate to each other need the pro model's reasoning
+_DEPENDENCY_ANALYSIS_RE = re.compile(
+    r"залеж|вплива|використову|ланцюж|зв'яз|звʼяз|зв’яз|пов'яза|пов’яза|трансфер|переда|"
+    r"depend|impact|affect|used\s+by|\buses?\s+(the\s+)?kpis?\b|chain|relationship|lineage|transfer",
+    re.IGNORECASE,
+)
+ROUTING_MODES = ("auto", FAST_TIER, PRO_TIER)
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """The tier chosen for one question and the local signals behind it."""
+    tier: str
+    reasons: Tuple[str, ...]
+    question_chars: int
+    kpi_count: int
+    dependency_analysis: bool
+    depth: int
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ModelRouter:
+    """
+    Sends each question to the fast or the pro model using cheap local signals.
+
+    The pro model is used when the user forces it, the question asks for
+    cross-KPI dependency analysis, references more than `fast_max_kpis` KPIs,
+    is longer than `fast_max_chars`, is an open first question that names no
+    KPI (the answer has to be found in the whole knowledge base), or the
+    conversation is `pro_min_depth` turns deep. Everything else — short lookups
+    about one KPI and short follow-ups — goes to the fast model. `mode` "fast"
+    or "pro" disables routing and always uses that tier.
+    """
+
+    def __init__(self, mode: str = "auto", fast_max_chars: int = 160, fast_max_kpis: int = 1,
+                 pro_min_depth: int = 8):
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unknown routing mode: {mode} (expected one of {', '.join(ROUTING_MODES)})")
+        self.mode = mode
+        self.fast_max_chars = fast_max_chars
+        self.fast_max_kpis = fast_max_kpis
+        self.pro_min_depth = pro_min_depth
+        self._lock = threading.Lock()
+        self.counters = Counter()
+
+    @classmethod
+    def from_env(cls) -> "ModelRouter":
+        """Reads MODEL_ROUTING, ROUTER_FAST_MAX_CHARS, ROUTER_FAST_MAX_KPIS and ROUTER_PRO_MIN_DEPTH."""
+        return cls(
+            mode=os.getenv("MODEL_ROUTING", "auto").lower(),
+            fast_max_chars=int(os.getenv("ROUTER_FAST_MAX_CHARS", "160")),
+            fast_max_kpis=int(os.getenv("ROUTER_FAST_MAX_KPIS", "1")),
+            pro_min_depth=int(os.getenv("ROUTER_PRO_MIN_DEPTH", "8")),
+        )
+
+    def route(self, question: str, kpi_count: int, depth: int, force_pro: bool = False) -> RoutingDecision:
+        """
+        Chooses the tier for a question.
+
+        Args:
+            question: The user question.
+            kpi_count: How many KPIs the question references by name.
+            depth: Completed turns in the conversation so far.
+            force_pro: The user asked to always use the pro model.
+
+        Returns:
+            The decision with the tier and the reasons for a pro choice.
+        """
+        dependency_analysis = bool(_DEPENDENCY_ANALYSIS_RE.search(question))
+        reasons = []
+        if force_pro:
+            reasons.append("forced")
+        if self.mode != "auto":
+            reasons.append(f"mode={self.mode}")
+        if dependency_analysis:
+            reasons.append("dependency_analysis")
+        if kpi_count > self.fast_max_kpis:
+            reasons.append("many_kpis")
+        if len(question) > self.fast_max_chars:
+            reasons.append("long_question")
+        if depth == 0 and kpi_count == 0:
+            reasons.append("open_question")
+        if depth >= self.pro_min_depth:
+            reasons.append("deep_conversation")
+
+        if force_pro:
+            tier = PRO_TIER
+        elif self.mode != "auto":
+            tier = self.mode
+        else:
+            tier = PRO_TIER if reasons else FAST_TIER
+        with self._lock:
+            self.counters[tier] += 1
+            self.counters.update(f"reason:{reason}" for reason in reasons)
+        return RoutingDecision(tier=tier, reasons=tuple(reasons), question_chars=len(question),
+                               kpi_count=kpi_count, dependency_analysis=dependency_analysis, depth=depth)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+
+class TieredChatSession:
+    """
+    One conversation that can move between model tiers.
+
+    A ChatSession is bound to one model, so a chat session is started per tier
+    on first use (clients come from `client_factory`, or `clients`). `use(tier)`
+    switches the active tier and carries the conversation history over; the
+    rest of the ChatSession interface is delegated to the active session.
+    """
+
+    def __init__(self, client_factory: Callable[[str], ModelClient], system_prompt: str,
+                 prompt_hash: Optional[str] = None, tier: str = PRO_TIER,
+                 clients: Optional[Dict[str, ModelClient]] = None):
+        self._client_factory = client_factory
+        self.clients: Dict[str, ModelClient] = dict(clients or {})
+        self.system_prompt = system_prompt
+        self.prompt_hash = prompt_hash
+        self.sessions: Dict[str, ChatSessionLike] = {}
+        self.tier = tier
+        self._session(tier)
+
+    def client(self, tier: str) -> ModelClient:
+        if tier not in MODEL_TIERS:
+            raise ValueError(f"Unknown model tier: {tier}")
+        if tier not in self.clients:
+            self.clients[tier] = self._client_factory(tier)
+        return self.clients[tier]
+
+    def _session(self, tier: str) -> ChatSessionLike:
+        session = self.sessions.get(tier)
+        if session is None:
+            session = self.sessions[tier] = self.client(tier).start_chat_session(
+                self.system_prompt, prompt_hash=self.prompt_hash
+            )
+        return session
+
+    @property
+    def active(self) -> ChatSessionLike:
+        return self.sessions[self.tier]
+
+    def use(self, tier: str) -> ChatSessionLike:
+        """Makes `tier` the active tier, copying the conversation so far to its session."""
+        if tier != self.tier:
+            history = [content_to_dict(content) for content in self.active.history]
+            target = self._session(tier)
+            target.history = history
+            self.tier = tier
+        return self.active
+
+    def restart(self, system_prompt: str, prompt_hash: Optional[str] = None):
+        """Starts over with a new system prompt (e.g. reloaded settings), keeping the conversation."""
+        history = [content_to_dict(content) for content in self.active.history]
+        self.system_prompt = system_prompt
+        self.prompt_hash = prompt_hash
+        self.sessions = {}
+        self._session(self.tier).history = history
+
+    @property
+    def history(self):
+        return self.active.history
+
+    @history.setter
+    def history(self, history):
+        self.active.history = history
+
+    def send_message(self, content: str, stream: bool = False):
+        return self.active.send_message(content, stream=stream)
+
+    def rewind(self):
+        return self.active.rewind()
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Returns the process-wide router, configured from the environment on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter.from_env()
+        return _router
@@ -0,0 +1,278 @@
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple, Union
+
+BuildResult = Union[str, Tuple[str, Dict[str, Any]], None]
+
+
+@dataclass(frozen=True)
+class PromptArtifact:
+    """
+    The fully built system prompt, shared read-only by every session in the process.
+    """
+    content_hash: str
+    text: str
+    build_seconds: float
+    built_at: float
+    # Derived structures built from the same data (e.g. the retrieval index)
+    indexes: Mapping[str, Any] = field(default_factory=lambda: MappingProxyType({}))
+    # Content hash of each source file (by basename), to tell which files a later change touched
+    file_hashes: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    # Source files (basenames) that differed from the previous artifact; every file for a first build
+    changed_files: FrozenSet[str] = frozenset()
+    # 1 for the first build, incremented on every rebuild
+    version: int = 1
+
+
+class PromptArtifactCache:
+    """
+    Builds the system prompt once per process and reuses it until the prompt
+    template or one of the settings tables changes on disk.
+
+    The cache is keyed by a SHA-256 hash of the template and every CSV file in the
+    settings tables directory. A cheap (mtime, size) signature is checked on every
+    lookup; the files are only re-hashed when that signature changes, and the
+    prompt is only rebuilt when the content hash actually differs.
+
+    An incremental builder (`get(builder, incremental=True)`) is called with the
+    artifact it replaces and the basenames of the files whose content changed, so it can re-parse and
+    re-serialize only those. Rebuilds run outside the lookup lock: while one is in
+    progress, other lookups keep getting the previous artifact, and the new one
+    is swapped in atomically when it is complete.
+    """
+
+    def __init__(self, template_path: str, tables_dir: str):
+        self.template_path = template_path
+        self.tables_dir = tables_dir
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._building = False
+        self._artifact: Optional[PromptArtifact] = None
+        self._signature: Optional[Tuple] = None
+        self._hits = 0
+        self._misses = 0
+        self._builds = 0
+        self._total_build_seconds = 0.0
+        self._failed_builds = 0
+        self._last_error: Optional[str] = None
+
+    def source_files(self) -> List[str]:
+        """Returns the files the prompt is built from, in a stable order."""
+        files = [self.template_path]
+        if os.path.isdir(self.tables_dir):
+            for filename in sorted(os.listdir(self.tables_dir)):
+                if filename.endswith(".csv"):
+                    files.append(os.path.join(self.tables_dir, filename))
+        return files
+
+    def _stat_signature(self, files: List[str]) -> Tuple:
+        signature = []
+        for path in files:
+            try:
+                st = os.stat(path)
+                signature.append((path, st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def compute_content_hash(self, files: Optional[List[str]] = None) -> str:
+        """
+        Hashes the name and content of every source file.
+
+        Args:
+            files: Files to hash. Defaults to `source_files()`.
+
+        Returns:
+            The hex digest identifying this version of the knowledge base.
+        """
+        return self._hash_files(files if files is not None else self.source_files())[0]
+
+    def _hash_files(self, files: List[str]) -> Tuple[str, Dict[str, str]]:
+        """Returns the combined content hash and the hash of each file (by basename)."""
+        digest = hashlib.sha256()
+        file_hashes = {}
+        for path in files:
+            name = os.path.basename(path)
+            digest.update(name.encode("utf-8"))
+            digest.update(b"\0")
+            try:
+                with open(path, "rb") as f:
+                    content = f.read()
+            except FileNotFoundError:
+                content = b"<missing>"
+            digest.update(content)
+            digest.update(b"\0")
+            file_hashes[name] = hashlib.sha256(content).hexdigest()
+        return digest.hexdigest(), file_hashes
+
+    def get(self, builder: Callable[..., BuildResult], incremental: bool = False) -> Optional[PromptArtifact]:
+        """
+        Returns the cached prompt artifact, rebuilding it if the sources changed.
+
+        Args:
+            builder: Called on a miss. Returns the prompt text, or a (text, indexes)
+                tuple to attach derived structures to the artifact. A `None`
+                result is treated as a failed build and is not cached; after a
+                failed rebuild the previous artifact is kept.
+            incremental: Call the builder with the previous artifact (None on the
+                first build) and the basenames of the changed source files,
+                instead of without arguments.
+
+        Returns:
+            The shared PromptArtifact, or None if the first build failed.
+        """
+        with self._lock:
+            files = self.source_files()
+            signature = self._stat_signature(files)
+            if self._artifact is not None and (signature == self._signature or self._building):
+                # Unchanged, or a rebuild is already running: serve the current artifact meanwhile
+                self._hits += 1
+                return self._artifact
+
+        with self._build_lock:
+            with self._lock:
+                # Another thread may have rebuilt while this one waited
+                files = self.source_files()
+                signature = self._stat_signature(files)
+                previous = self._artifact
+                if previous is not None and signature == self._signature:
+                    self._hits += 1
+                    return previous
+                self._building = True
+            try:
+                return self._rebuild(builder, incremental, previous, files, signature)
+            finally:
+                with self._lock:
+                    self._building = False
+
+    def _rebuild(self, builder: Callable[..., BuildResult], incremental: bool, previous: Optional[PromptArtifact],
+                 files: List[str], signature: Tuple) -> Optional[PromptArtifact]:
+        content_hash, file_hashes = self._hash_files(files)
+        if previous is not None and content_hash == previous.content_hash:
+            # Files were touched but their content is unchanged
+            with self._lock:
+                self._signature = signature
+                self._hits += 1
+            return previous
+
+        if previous is None:
+            changed = frozenset(file_hashes)
+        else:
+            changed = frozenset(name for name in set(file_hashes) | set(previous.file_hashes)
+                                if file_hashes.get(name) != previous.file_hashes.get(name))
+        start = time.perf_counter()
+        try:
+            result = builder(previous, changed) if incremental else builder()
+        except Exception as e:
+            if previous is None:
+                raise
+            # E.g. an edited table with a value the indexes cannot parse
+            result = None
+            with self._lock:
+                self._last_error = f"{type(e).__name__}: {e}"
+        build_seconds = time.perf_counter() - start
+        with self._lock:
+            self._misses += 1
+            if result is None:
+                self._failed_builds += 1
+                if previous is None:
+                    return None
+                # A failed reload (e.g. a half-written table) keeps serving the previous
+                # artifact; the next change to the files triggers another attempt
+                self._signature = signature
+                return previous
+            text, indexes = result if isinstance(result, tuple) else (result, {})
+            self._builds += 1
+            self._total_build_seconds += build_seconds
+            self._artifact = PromptArtifact(
+                content_hash=content_hash,
+                text=text,
+                build_seconds=build_seconds,
+                built_at=time.time(),
+                indexes=MappingProxyType(dict(indexes)),
+                file_hashes=MappingProxyType(file_hashes),
+                changed_files=changed,
+                version=previous.version + 1 if previous is not None else 1,
+            )
+            self._signature = signature
+            return self._artifact
+
+    def file_signature(self) -> Tuple:
+        """Returns the (path, mtime, size) signature of the source files, without reading them."""
+        return self._stat_signature(self.source_files())
+
+    def is_stale(self, signature: Optional[Tuple] = None) -> bool:
+        """True if the source files changed (by signature) since the current artifact was built."""
+        signature = signature if signature is not None else self.file_signature()
+        with self._lock:
+            return self._artifact is None or signature != self._signature
+
+    def current(self) -> Optional[PromptArtifact]:
+        """Returns the artifact built last, without checking the files."""
+        with self._lock:
+            return self._artifact
+
+    def invalidate(self):
+        """Drops the cached artifact so the next `get()` rebuilds it from scratch."""
+        with self._lock:
+            self._artifact = None
+            self._signature = None
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and build timings for diagnostics."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "builds": self._builds,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "last_build_seconds": self._artifact.build_seconds if self._artifact else None,
+                "total_build_seconds": self._total_build_seconds,
+                "content_hash": self._artifact.content_hash if self._artifact else None,
+                "version": self._artifact.version if self._artifact else None,
+                "failed_builds": self._failed_builds,
+                "last_error": self._last_error,
+            }
+
+
+# --- Process-wide Registry --- #
+# Streamlit re-executes the app script on every interaction, but imported modules
+# stay in sys.modules, so this registry lives for the lifetime of the server process.
+
+_caches: Dict[Tuple[str, str, str], PromptArtifactCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_prompt_cache(template_path: str, tables_dir: str, variant: str = "default") -> PromptArtifactCache:
+    """
+    Returns the process-wide cache for the given template and tables directory.
+
+    Args:
+        template_path: Path to the prompt template.
+        tables_dir: Directory with the settings tables.
+        variant: Distinguishes differently built prompts over the same sources
+            (e.g. the full data dump vs. retrieval mode).
+    """
+    key = (os.path.abspath(template_path), os.path.abspath(tables_dir), variant)
+    with _registry_lock:
+        if key not in _caches:
+            _caches[key] = PromptArtifactCache(key[0], key[1])
+        return _caches[key]
+
+
+def drop_prompt_cache(template_path: str, tables_dir: str, variant: str = "default") -> Optional[PromptArtifactCache]:
+    """
+    Removes a cache from the registry (e.g. an evicted tenant), so its artifact can
+    be freed once no session uses it. The next `get_prompt_cache()` starts empty.
+
+    Returns:
+        The removed cache, or None if there was none.
+    """
+    key = (os.path.abspath(template_path), os.path.abspath(tables_dir), variant)
+    with _registry_lock:
+        return _caches.pop(key, None)
@@ -0,0 +1,118 @@
+import re
+from typing import Dict, Iterable, List
+
+GUID_RE = re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b")
+ALIAS_RE = re.compile(r"\b[A-Z]-[0-9a-f]{4,32}\b")
+
+# Alias prefix for the GUIDs that are the primary key (`Id`) of each table
+TABLE_ALIAS_PREFIXES = {
+    "cnfg.kpi.csv": "K",
+    "cnfg.ConditionMetadata.csv": "C",
+    "cnfg.CustomLocalization.csv": "L",
+    "cnfg.KPIConditionalFormatting.csv": "F",
+}
+OTHER_ALIAS_PREFIX = "G"
+MIN_ALIAS_HEX_LENGTH = 4
+
+COMPACT_FORMAT_HEADER = "# Reference Data (Compact Tabular Format)"
+
+
+class GuidAliaser:
+    """
+    Maps the 36-character GUIDs in the reference data to short, stable aliases.
+
+    An alias is a one-letter prefix naming the table the GUID is the `Id` of
+    (`K` KPI, `C` ConditionMetadata, `L` CustomLocalization, `F`
+    KPIConditionalFormatting, `G` anything else) followed by the shortest hex
+    prefix of the GUID that is unique among the GUIDs with the same letter.
+    Because aliases are derived from the GUIDs themselves, they stay the same
+    across rebuilds unless a new GUID collides with an existing prefix.
+    """
+
+    def __init__(self, tables: Dict[str, List[dict]]):
+        groups: Dict[str, set] = {}
+        primary_keys = {}
+        for table_name, records in tables.items():
+            prefix = TABLE_ALIAS_PREFIXES.get(table_name)
+            if prefix is None:
+                continue
+            for record in records:
+                guid = record.get("Id")
+                if isinstance(guid, str) and GUID_RE.fullmatch(guid):
+                    primary_keys[guid.lower()] = prefix
+
+        for records in tables.values():
+            for record in records:
+                for value in record.values():
+                    if isinstance(value, str):
+                        for guid in GUID_RE.findall(value):
+                            guid = guid.lower()
+                            groups.setdefault(primary_keys.get(guid, OTHER_ALIAS_PREFIX), set()).add(guid)
+
+        self.alias_by_guid: Dict[str, str] = {}
+        for prefix, guids in groups.items():
+            hex_digits = {guid: guid.replace("-", "") for guid in guids}
+            length = MIN_ALIAS_HEX_LENGTH
+            while len({digits[:length] for digits in hex_digits.values()}) < len(hex_digits):
+                length += 1
+            for guid, digits in hex_digits.items():
+                self.alias_by_guid[guid] = f"{prefix}-{digits[:length]}"
+        self.guid_by_alias: Dict[str, str] = {alias: guid for guid, alias in self.alias_by_guid.items()}
+
+    def encode_text(self, text: str) -> str:
+        """Replaces every known GUID in the text with its alias."""
+        return GUID_RE.sub(lambda m: self.alias_by_guid.get(m.group(0).lower(), m.group(0)), text)
+
+    def decode_text(self, text: str) -> str:
+        """Replaces every known alias in the text (e.g. a model answer) with its GUID."""
+        return ALIAS_RE.sub(lambda m: self.guid_by_alias.get(m.group(0), m.group(0)), text)
+
+
+def format_value(value) -> str:
+    """Formats one cell of the compact format (escaped, with "" for an empty value)."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\r", "").replace("\n", "\\n")
+
+
+def encoded_columns(records: List[dict]) -> List[str]:
+    """The columns of a table in the compact format: in first-seen order, without the ones empty in every record."""
+    columns: List[str] = []
+    for record in records:
+        for column in record:
+            if column not in columns:
+                columns.append(column)
+    return [c for c in columns if any(format_value(r.get(c)) != "" for r in records)]
+
+
+def encode_table(name: str, records: List[dict], aliaser: GuidAliaser = None) -> str:
+    """
+    Encodes one table with the column names written once and one tab-separated
+    line per record. Columns that are empty in every record are omitted, and
+    trailing empty fields of each line are trimmed.
+    """
+    columns = encoded_columns(records)
+    lines = [f"## {name}", "columns: " + "\t".join(columns)]
+    for record in records:
+        line = "\t".join(format_value(record.get(column)) for column in columns).rstrip("\t")
+        lines.append(aliaser.encode_text(line) if aliaser else line)
+    return "\n".join(lines)
+
+
+def encode_tables(tables: Dict[str, List[dict]], aliaser: GuidAliaser = None) -> str:
+    """Encodes every table in the compact columnar format."""
+    return "\n\n".join(encode_table(name, records, aliaser) for name, records in tables.items())
+
+
+def collect_guids(tables: Dict[str, List[dict]]) -> Iterable[str]:
+    """Yields every GUID that appears in the tables (used to verify round-tripping)."""
+    for records in tables.values():
+        for record in records:
+            for value in record.values():
+                if isinstance(value, str):
+                    yield from (guid.lower() for guid in GUID_RE.findall(value))
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from chatbot.kpi_graph import LOCALIZATION_TABLE
+from chatbot.prompt_cache import PromptArtifact
+
+# Used for objects without a localization in the session's language; objects
+# without one either are shown by their system name (KPI.Name)
+FALLBACK_LANGUAGE = "en"
+
+_LANGUAGE_RANGE_RE = re.compile(r"^\s*([A-Za-z]{1,8})(?:-[A-Za-z0-9]{1,8})*\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$")
+
+
+def available_languages(tables: Dict[str, Iterable[dict]]) -> List[str]:
+    """The LocalizationCode values of the CustomLocalization table, sorted."""
+    return sorted({str(row.get("LocalizationCode") or "").strip()
+                   for row in tables.get(LOCALIZATION_TABLE, ())} - {""})
+
+
+def localization_for_language(records: Iterable[dict], language: str,
+                              fallback: str = FALLBACK_LANGUAGE) -> Tuple[dict, ...]:
+    """
+    Keeps one localization row per object (ObjectType, ObjectId): the one in
+    `language`, else the one in `fallback`. Objects with neither are dropped. Rows
+    keep their file order.
+    """
+    records = tuple(records)
+    chosen: Dict[Tuple[str, str], dict] = {}
+    for row in records:
+        code = row.get("LocalizationCode")
+        if code not in (language, fallback):
+            continue
+        key = (row.get("ObjectType"), row.get("ObjectId"))
+        if key not in chosen or code == language:
+            chosen[key] = row
+    kept = {id(row) for row in chosen.values()}
+    return tuple(row for row in records if id(row) in kept)
+
+
+def detect_language(accept_language: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """
+    Picks the available language a browser prefers most, from an Accept-Language
+    header (e.g. "uk-UA,uk;q=0.9,en;q=0.8"), matching primary language subtags.
+    Returns None if none of them is available.
+    """
+    available = {code.lower(): code for code in available}
+    preferences = []
+    for position, part in enumerate((accept_language or "").split(",")):
+        match = _LANGUAGE_RANGE_RE.match(part)
+        if not match:
+            continue
+        try:
+            quality = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        if quality > 0:
+            preferences.append((-quality, position, match.group(1).lower()))
+    for _, _, code in sorted(preferences):
+        if code in available:
+            return available[code]
+    return None
+
+
+def variant_hash(base_hash: str, language: str) -> str:
+    """Content hash of a language variant: distinct per language, so answer and context caches keep them apart."""
+    return hashlib.sha256(f"{base_hash}\0language:{language}".encode("utf-8")).hexdigest()
+
+
+class LanguageVariantCache:
+    """
+    Per-language prompt artifacts derived from a tenant's full prompt artifact.
+
+    `build(artifact, language)` returns the (text, indexes) of the variant; it is
+    called once per (tenant, language) and prompt version, and the result is
+    reused by every session of that language. When the tenant's artifact changes
+    (a settings reload), its variants are rebuilt on their next use. At most
+    `max_variants` variants are kept (least recently used evicted).
+    """
+
+    def __init__(self, build: Callable[[PromptArtifact, str], Tuple[str, dict]], max_variants: int = 16,
+                 count_tokens: Optional[Callable[[str], int]] = None, on_build: Optional[Callable[[dict], None]] = None):
+        self.build = build
+        self.max_variants = max_variants
+        self.count_tokens = count_tokens
+        self.on_build = on_build
+        self._variants: "OrderedDict[Tuple[str, str], Tuple[str, PromptArtifact]]" = OrderedDict()
+        self._reports: Dict[Tuple[str, str], dict] = {}
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.hits = 0
+        self.builds = 0
+
+    def get(self, tenant: str, artifact: Optional[PromptArtifact], language: str) -> Optional[PromptArtifact]:
+        """Returns the `language` variant of a tenant's artifact (None for None)."""
+        if artifact is None:
+            return None
+        key = (tenant, language)
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None and cached[0] == artifact.content_hash:
+                self._variants.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+        # One build at a time: concurrent sessions of a new language wait for the first one
+        with self._build_lock:
+            with self._lock:
+                cached = self._variants.get(key)
+                if cached is not None and cached[0] == artifact.content_hash:
+                    self.hits += 1
+                    return cached[1]
+            start = time.perf_counter()
+            text, indexes = self.build(artifact, language)
+            build_seconds = time.perf_counter() - start
+            variant = PromptArtifact(
+                content_hash=variant_hash(artifact.content_hash, language),
+                text=text,
+                build_seconds=build_seconds,
+                built_at=time.time(),
+                indexes=MappingProxyType(dict(indexes)),
+                file_hashes=artifact.file_hashes,
+                changed_files=artifact.changed_files,
+                version=artifact.version,
+            )
+            report = {"tenant": tenant, "language": language, "version": artifact.version,
+                      "chars": len(text), "full_chars": len(artifact.text),
+                      "chars_saved": len(artifact.text) - len(text), "build_seconds": build_seconds}
+            if self.count_tokens is not None:
+                tokens, full_tokens = self.count_tokens(text), self.count_tokens(artifact.text)
+                report.update(tokens=tokens, full_tokens=full_tokens, tokens_saved=full_tokens - tokens)
+            with self._lock:
+                self._variants[key] = (artifact.content_hash, variant)
+                self._variants.move_to_end(key)
+                self._reports[key] = report
+                while len(self._variants) > self.max_variants:
+                    evicted, _ = self._variants.popitem(last=False)
+                    self._reports.pop(evicted, None)
+                self.builds += 1
+        if self.on_build is not None:
+            self.on_build(dict(report))
+        return variant
+
+    def drop_tenant(self, tenant: str):
+        """Forgets a tenant's variants (e.g. when the tenant is evicted)."""
+        with self._lock:
+            for key in [key for key in self._variants if key[0] == tenant]:
+                del self._variants[key]
+                self._reports.pop(key, None)
+
+    def stats(self) -> dict:
+        """Per-variant size and savings against the full prompt, plus cache counters."""
+        with self._lock:
+            return {"variants": [dict(report) for report in self._reports.values()],
+                    "hits": self.hits, "builds": self.builds}
+
+
+_variants: Optional[LanguageVariantCache] = None
+_variants_lock = threading.Lock()
+
+
+def get_language_variants(build: Callable[[PromptArtifact, str], Tuple[str, dict]],
+                          count_tokens: Optional[Callable[[str], int]] = None,
+                          on_build: Optional[Callable[[dict], None]] = None) -> LanguageVariantCache:
+    """
+    Returns the process-wide variant cache (created with these arguments on first
+    use), sized by LANGUAGE_VARIANTS_MAX.
+    """
+    global _variants
+    with _variants_lock:
+        if _variants is None:
+            _variants = LanguageVariantCache(build, max_variants=int(os.getenv("LANGUAGE_VARIANTS_MAX", "16")),
+                                             count_tokens=count_tokens, on_build=on_build)
+        return _variants
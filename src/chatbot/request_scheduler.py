@@ -0,0 +1,279 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Optional
+
+from chatbot.metrics import MetricsRegistry, SCHEDULER_WAIT
+
+# Exception class names (google.api_core.exceptions and HTTP clients) that are worth retrying
+TRANSIENT_ERROR_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "Aborted",
+}
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+RATE_LIMIT_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    code = getattr(code, "value", code)
+    return code if isinstance(code, int) else None
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for quota / rate-limit errors (HTTP 429)."""
+    return type(error).__name__ in RATE_LIMIT_ERROR_NAMES or _status_code(error) == 429
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for errors a retry can fix: rate limits, server overload, timeouts, dropped connections."""
+    return (type(error).__name__ in TRANSIENT_ERROR_NAMES
+            or _status_code(error) in TRANSIENT_STATUS_CODES
+            or isinstance(error, (ConnectionError, TimeoutError)))
+
+
+class SchedulerTimeout(RuntimeError):
+    """A request waited longer than `max_wait_seconds` for a slot."""
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `capacity` units, refilled continuously at
+    `per_second`. The level may go negative when actual usage turns out higher
+    than reserved; later requests then wait for the debt to be repaid.
+    """
+
+    def __init__(self, capacity: float, per_second: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.clock = clock
+        self.level = capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.per_second
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class ScheduledResponse:
+    """
+    Wraps a streamed response: the concurrency slot is held until the stream is
+    consumed (or closed), then the token reservation is corrected with the actual
+    `usage_metadata`. Other attributes are passed through to the response.
+    """
+
+    def __init__(self, scheduler: "RequestScheduler", response, estimated_tokens: int):
+        self._scheduler = scheduler
+        self._response = response
+        self._estimated_tokens = estimated_tokens
+        self._finished = False
+
+    def __iter__(self):
+        try:
+            yield from self._response
+        finally:
+            self.close()
+
+    def close(self):
+        if self._finished:
+            return
+        self._finished = True
+        usage = getattr(self._response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None) if usage is not None else None
+        self._scheduler._release(actual - self._estimated_tokens if actual else 0)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+class RequestScheduler:
+    """
+    A process-wide gate in front of the model: every session's requests go through it.
+
+    Requests are admitted when a concurrency slot is free (`max_concurrency`) and
+    both the requests-per-minute and the tokens-per-minute buckets have room for
+    them; the token reservation is the caller's estimate of the prompt size and
+    is corrected with the real usage when the stream ends. Waiting requests are
+    served round-robin across sessions, so one busy session cannot starve the
+    others. Transient failures (429, 5xx, timeouts) raised when sending are
+    retried up to `max_retries` times with full-jitter exponential backoff; a
+    failure after streaming has started is not retried.
+    """
+
+    def __init__(self, requests_per_minute: float = 150, tokens_per_minute: float = 2_000_000,
+                 max_concurrency: int = 8, max_retries: int = 4, backoff_base_seconds: float = 1.0,
+                 backoff_max_seconds: float = 30.0, max_wait_seconds: float = 120.0,
+                 metrics: Optional[MetricsRegistry] = None, sleep: Callable[[float], None] = time.sleep,
+                 rng: Optional[random.Random] = None, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.rpm = TokenBucket(requests_per_minute, requests_per_minute / 60, clock)
+        self.tpm = TokenBucket(tokens_per_minute, tokens_per_minute / 60, clock)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.metrics = metrics
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self._cond = threading.Condition()
+        # session id -> waiting tickets; the first session in order is served next
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._waiting = 0
+        self._in_flight = 0
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "timeouts": 0,
+                      "max_queue_depth": 0, "total_wait_seconds": 0.0}
+
+    # --- Admission --- #
+
+    def _head(self):
+        for tickets in self._queues.values():
+            return tickets[0]
+        return None
+
+    def _remove(self, session_id: str, ticket):
+        tickets = self._queues[session_id]
+        tickets.remove(ticket)
+        if not tickets:
+            del self._queues[session_id]
+        else:
+            # Round-robin: the session goes to the back of the line
+            self._queues.move_to_end(session_id)
+
+    def _publish(self):
+        if self.metrics is not None:
+            self.metrics.set_gauge("scheduler_queue_depth", self._waiting)
+            self.metrics.set_gauge("scheduler_in_flight", self._in_flight)
+
+    def _acquire(self, session_id: str, tokens: int) -> float:
+        """Blocks until the request is admitted; returns the seconds waited."""
+        ticket = object()
+        start = self.clock()
+        deadline = start + self.max_wait_seconds
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            self._waiting += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._waiting)
+            self._publish()
+            try:
+                while True:
+                    timeout = None
+                    if self._head() is ticket and self._in_flight < self.max_concurrency:
+                        timeout = max(self.rpm.wait_time(1), self.tpm.wait_time(tokens))
+                        if timeout <= 0:
+                            self.rpm.consume(1)
+                            self.tpm.consume(tokens)
+                            self._in_flight += 1
+                            break
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise SchedulerTimeout(f"No model capacity within {self.max_wait_seconds:.0f} s")
+                    self._cond.wait(min(timeout, remaining) if timeout else remaining)
+            finally:
+                self._remove(session_id, ticket)
+                self._waiting -= 1
+                self._publish()
+                self._cond.notify_all()
+            waited = self.clock() - start
+            self.stats["total_wait_seconds"] += waited
+        return waited
+
+    def _release(self, token_correction: float = 0):
+        with self._cond:
+            self._in_flight -= 1
+            if token_correction:
+                self.tpm.consume(token_correction)
+            self._publish()
+            self._cond.notify_all()
+
+    def _count(self, name: str):
+        with self._cond:
+            self.stats[name] += 1
+
+    def backoff_seconds(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+        return self.rng.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+
+    # --- Requests --- #
+
+    def send_message(self, session_id: str, chat_session, message: str, estimated_tokens: int) -> ScheduledResponse:
+        """
+        Sends a streamed message through the scheduler.
+
+        Args:
+            session_id: The session the request belongs to (the unit of fair queuing).
+            chat_session: The session's ChatSession (or stub).
+            message: The message to send.
+            estimated_tokens: Expected prompt tokens (system prompt + history + message).
+
+        Returns:
+            The streamed response; iterate it to the end to free the slot.
+
+        Raises:
+            SchedulerTimeout: If the request could not be admitted in time.
+            Exception: The last error, if it is not transient or retries are exhausted.
+        """
+        self._count("requests")
+        attempt = 0
+        while True:
+            waited = self._acquire(session_id, estimated_tokens)
+            if self.metrics is not None:
+                self.metrics.observe(SCHEDULER_WAIT, waited, session_id, attempt=attempt)
+            try:
+                response = chat_session.send_message(message, stream=True)
+            except Exception as e:
+                self._release()
+                if not is_transient_error(e) or attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                if self.metrics is not None:
+                    self.metrics.increment("scheduler_retries")
+                self.sleep(self.backoff_seconds(attempt))
+                attempt += 1
+                continue
+            return ScheduledResponse(self, response, estimated_tokens)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {**self.stats, "queue_depth": self._waiting, "in_flight": self._in_flight,
+                    "rpm_available": self.rpm.level, "tpm_available": self.tpm.level}
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler() -> RequestScheduler:
+    """
+    Returns the process-wide scheduler, configured from GEMINI_RPM, GEMINI_TPM,
+    GEMINI_MAX_CONCURRENCY, GEMINI_MAX_RETRIES and GEMINI_MAX_WAIT_SECONDS.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from chatbot.metrics import get_metrics
+            _scheduler = RequestScheduler(
+                requests_per_minute=float(os.getenv("GEMINI_RPM", "150")),
+                tokens_per_minute=float(os.getenv("GEMINI_TPM", "2000000")),
+                max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+                max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "4")),
+                max_wait_seconds=float(os.getenv("GEMINI_MAX_WAIT_SECONDS", "120")),
+                metrics=get_metrics(),
+            )
+        return _scheduler
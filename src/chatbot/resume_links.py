@@ -0,0 +1,85 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from typing import Optional
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache"))
+DEFAULT_SECRET_PATH = os.path.join(CACHE_DIR, "resume_link.key")
+
+# Secret signing the `?conversation=` links; without it one is generated into DEFAULT_SECRET_PATH
+RESUME_LINK_SECRET_ENV = "RESUME_LINK_SECRET"
+
+
+class ResumeLinks:
+    """
+    Signs conversation ids for the `?conversation=` URL parameter.
+
+    The parameter is `<conversation id>.<signature>`, an HMAC-SHA256 of the id
+    under a server secret. A conversation can only be resumed through a link the
+    app handed out: ids seen elsewhere (logs, metrics, the transcript database)
+    cannot be turned into a link without the secret.
+
+    The link itself is still a credential: whoever has the full URL can open
+    the conversation, so it must be shared like one.
+    """
+
+    def __init__(self, secret: bytes):
+        self._secret = secret
+
+    def _signature(self, conversation_id: str) -> str:
+        return hmac.new(self._secret, conversation_id.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def token(self, conversation_id: str) -> str:
+        """Returns the URL parameter value that resumes `conversation_id`."""
+        return f"{conversation_id}.{self._signature(conversation_id)}"
+
+    def conversation_id(self, token: Optional[str]) -> Optional[str]:
+        """Returns the conversation id of a valid token, or None if it is missing or not signed by this server."""
+        if not token or "." not in token:
+            return None
+        conversation_id, signature = token.rsplit(".", 1)
+        if not hmac.compare_digest(signature, self._signature(conversation_id)):
+            return None
+        return conversation_id
+
+
+def load_secret(path: str = DEFAULT_SECRET_PATH) -> bytes:
+    """
+    Returns the secret from RESUME_LINK_SECRET, else from `path`, generating it
+    there (readable by the owner only) on first use. Every process of the app
+    reads the same file, so their links stay valid across restarts.
+    """
+    secret = os.getenv(RESUME_LINK_SECRET_ENV)
+    if secret:
+        return secret.encode("utf-8")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        # Written in full under another name, then linked: a concurrent first
+        # start never reads a partial secret, and only one secret wins
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+_links: Optional[ResumeLinks] = None
+_links_lock = threading.Lock()
+
+
+def get_resume_links() -> ResumeLinks:
+    """Returns the process-wide link signer."""
+    global _links
+    with _links_lock:
+        if _links is None:
+            _links = ResumeLinks(load_secret())
+        return _links
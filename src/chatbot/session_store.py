@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+from chatbot.history_manager import content_to_dict
+from chatbot.transcripts import TranscriptStore
+
+
+@dataclass(eq=False)
+class Conversation:
+    """
+    The chat state of one browser session. The prompt artifact and the model
+    clients are shared by the whole process; a conversation only references them.
+    """
+    id: str
+    tenant: Optional[str]
+    # The shared PromptArtifact the conversation was started (or refreshed) with
+    artifact: Any
+    # The TieredChatSession holding the model-side history
+    chat_session: Any
+    prompt_tokens: int = 0
+    # The most recent displayed messages; older ones are only in the transcript
+    messages: List[dict] = field(default_factory=list)
+    # Displayed messages before `messages[0]`
+    archived_messages: int = 0
+    # Displayed messages (from the start of the conversation) already in the transcript
+    persisted_messages: int = 0
+    last_active: float = field(default_factory=time.monotonic)
+    resumed: bool = False
+    # The UI language whose prompt variant the conversation uses (see chatbot_app.language_artifact())
+    language: Optional[str] = None
+    # Futures of the background setup of a new conversation; `artifact` and
+    # `chat_session` are None until they resolve
+    artifact_ready: Any = None
+    session_ready: Any = None
+
+    @property
+    def prompt_hash(self) -> Optional[str]:
+        return self.artifact.content_hash if self.artifact is not None else None
+
+    @property
+    def message_count(self) -> int:
+        return self.archived_messages + len(self.messages)
+
+
+class SessionStore:
+    """
+    Holds the conversations of all browser sessions of the process, so their
+    memory is bounded and idle ones can be released (st.session_state only keeps
+    the conversation id).
+
+    At most `max_messages` displayed messages of a conversation are kept in
+    memory. Conversations inactive for `idle_seconds` are evicted: with a
+    `transcripts` store they are saved first and resumed from it on their next
+    use (model-side history included, no model call); without one they are lost.
+    Idle conversations are swept on lookups, at most every `sweep_interval` seconds.
+    """
+
+    def __init__(self, idle_seconds: float = 1800.0, max_messages: int = 100,
+                 transcripts: Optional[TranscriptStore] = None, sweep_interval: float = 60.0):
+        self.idle_seconds = idle_seconds
+        self.max_messages = max_messages
+        self.transcripts = transcripts
+        self.sweep_interval = sweep_interval
+        self._conversations: Dict[str, Conversation] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+        self.counters = Counter()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def add(self, conversation: Conversation) -> Conversation:
+        with self._lock:
+            self._conversations[conversation.id] = conversation
+            self.counters["resumed" if conversation.resumed else "started"] += 1
+        self._maybe_sweep()
+        return conversation
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        """Returns a conversation held in memory and marks it active, or None."""
+        self._maybe_sweep()
+        with self._lock:
+            conversation = self._conversations.get(conversation_id)
+            if conversation is not None:
+                conversation.last_active = time.monotonic()
+            return conversation
+
+    def append(self, conversation: Conversation, message: dict):
+        """Adds a displayed message, moving the oldest ones out of memory beyond `max_messages`."""
+        conversation.messages.append(message)
+        conversation.last_active = time.monotonic()
+        overflow = len(conversation.messages) - self.max_messages
+        if overflow > 0:
+            # Dropped messages must be in the transcript first
+            if self.transcripts is not None:
+                self.transcripts.append_messages(conversation.id, self._unsaved_messages(conversation),
+                                                 conversation.persisted_messages)
+                conversation.persisted_messages = conversation.message_count
+            del conversation.messages[:overflow]
+            conversation.archived_messages += overflow
+
+    def save(self, conversation: Conversation):
+        """Writes the conversation's new messages and its model-side history to the transcript store."""
+        if self.transcripts is None:
+            return
+        history = [content_to_dict(content) for content in conversation.chat_session.history] \
+            if conversation.chat_session is not None else []
+        self.transcripts.save(conversation.id, conversation.tenant, conversation.prompt_hash, history,
+                              self._unsaved_messages(conversation), conversation.persisted_messages)
+        conversation.persisted_messages = conversation.message_count
+
+    @staticmethod
+    def _unsaved_messages(conversation: Conversation) -> List[dict]:
+        return conversation.messages[max(conversation.persisted_messages - conversation.archived_messages, 0):]
+
+    def load(self, conversation_id: str) -> Optional[dict]:
+        """
+        Returns what is needed to resume an evicted conversation: the transcript's
+        tenant, prompt hash, model-side history and message count, plus its last
+        `max_messages` displayed messages and how many came before them.
+        """
+        if self.transcripts is None:
+            return None
+        transcript = self.transcripts.load(conversation_id)
+        if transcript is None:
+            return None
+        archived = max(0, transcript["message_count"] - self.max_messages)
+        transcript["archived_messages"] = archived
+        transcript["messages"] = self.transcripts.load_messages(conversation_id, offset=archived)
+        return transcript
+
+    def messages_between(self, conversation: Conversation, start: int, end: int) -> List[dict]:
+        """
+        Returns the displayed messages of a conversation from position `start` to
+        `end` (exclusive): the ones moved out of memory from the transcript, the
+        rest from memory. Without a transcript store, moved-out messages are missing.
+        """
+        archived = conversation.archived_messages
+        messages = []
+        if start < archived and self.transcripts is not None:
+            messages = self.transcripts.load_messages(conversation.id, offset=start, limit=min(end, archived) - start)
+        return messages + conversation.messages[max(start - archived, 0):max(end - archived, 0)]
+
+    def discard(self, conversation_id: str):
+        """Removes a conversation from memory; its transcript is kept."""
+        with self._lock:
+            self._conversations.pop(conversation_id, None)
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval:
+                return
+            self._last_sweep = now
+        self.evict_idle(now)
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """Saves and drops every conversation idle for `idle_seconds`. Returns their ids."""
+        now = now if now is not None else time.monotonic()
+        with self._lock:
+            idle = [c for c in self._conversations.values() if now - c.last_active >= self.idle_seconds]
+            for conversation in idle:
+                del self._conversations[conversation.id]
+            self.counters["evicted"] += len(idle)
+        for conversation in idle:
+            self.save(conversation)
+        return [conversation.id for conversation in idle]
+
+    def prompt_hashes(self) -> Set[str]:
+        """The prompt hashes of the conversations held in memory (the prompts still in use)."""
+        with self._lock:
+            return {c.prompt_hash for c in self._conversations.values() if c.prompt_hash}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "active": len(self._conversations),
+                "messages_in_memory": sum(len(c.messages) for c in self._conversations.values()),
+                "persistence": self.transcripts is not None,
+            }
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """
+    Returns the process-wide session store, configured from SESSION_IDLE_MINUTES,
+    SESSION_MAX_MESSAGES, TRANSCRIPTS_ENABLED and TRANSCRIPT_TTL_DAYS on first use.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            transcripts = None
+            if os.getenv("TRANSCRIPTS_ENABLED", "1") == "1":
+                transcripts = TranscriptStore(ttl_seconds=float(os.getenv("TRANSCRIPT_TTL_DAYS", "30")) * 24 * 3600)
+                transcripts.purge_expired()
+            _store = SessionStore(
+                idle_seconds=float(os.getenv("SESSION_IDLE_MINUTES", "30")) * 60,
+                max_messages=int(os.getenv("SESSION_MAX_MESSAGES", "100")),
+                transcripts=transcripts,
+            )
+        return _store
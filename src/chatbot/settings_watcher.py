@@ -0,0 +1,126 @@
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from chatbot.prompt_cache import PromptArtifactCache
+
+
+class SettingsWatcher:
+    """
+    Watches the prompt template and the settings tables and rebuilds the prompt
+    artifact in the background when they change, so no user request pays for it.
+
+    The files' (mtime, size) signature is polled every `interval` seconds (a few
+    `stat` calls, no reading). A change is acted on once the signature has been
+    stable for one poll, so a table that is still being written is not parsed
+    half-way. The rebuild goes through the prompt cache, which re-parses only the
+    changed files and swaps the new artifact in atomically for new sessions.
+    `incremental` is passed on to `PromptArtifactCache.get()`.
+    `on_reload` receives a report of every reload: version, changed files,
+    changed-row counts per table and the reload latency.
+    """
+
+    def __init__(self, prompt_cache: PromptArtifactCache, builder: Callable, interval: float = 2.0,
+                 on_reload: Optional[Callable[[dict], None]] = None, incremental: bool = False):
+        self.prompt_cache = prompt_cache
+        self.builder = builder
+        self.incremental = incremental
+        self.interval = interval
+        self.on_reload = on_reload
+        self._pending: Optional[Tuple] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"checks": 0, "reloads": 0, "failures": 0, "last_reload": None}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="settings-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                self.stats["failures"] += 1
+
+    def check(self, debounce: bool = True) -> Optional[dict]:
+        """
+        Polls the files once and reloads if they changed.
+
+        Args:
+            debounce: Wait until the change has been stable for one poll.
+
+        Returns:
+            The reload report, or None if nothing was reloaded.
+        """
+        self.stats["checks"] += 1
+        signature = self.prompt_cache.file_signature()
+        if not self.prompt_cache.is_stale(signature):
+            self._pending = None
+            return None
+        if debounce and signature != self._pending:
+            self._pending = signature
+            return None
+        self._pending = None
+
+        previous = self.prompt_cache.current()
+        failed_builds = self.prompt_cache.stats()["failed_builds"]
+        start = time.perf_counter()
+        artifact = self.prompt_cache.get(self.builder, incremental=self.incremental)
+        reload_seconds = time.perf_counter() - start
+        if artifact is None:
+            self.stats["failures"] += 1
+            return None
+        if artifact is previous:
+            # Touched but unchanged, or the rebuild failed and the previous artifact is kept
+            if self.prompt_cache.stats()["failed_builds"] > failed_builds:
+                self.stats["failures"] += 1
+            return None
+
+        row_changes: Dict[str, dict] = dict(artifact.indexes.get("row_changes") or {})
+        report = {
+            "version": artifact.version,
+            "content_hash": artifact.content_hash,
+            "changed_files": sorted(artifact.changed_files),
+            "row_changes": row_changes,
+            "rows_changed": sum(sum(counts.values()) for counts in row_changes.values()),
+            "reload_seconds": reload_seconds,
+            "build_seconds": artifact.build_seconds,
+        }
+        self.stats["reloads"] += 1
+        self.stats["last_reload"] = report
+        if self.on_reload is not None:
+            self.on_reload(report)
+        return report
+
+
+_watchers: Dict[int, SettingsWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def start_settings_watcher(prompt_cache: PromptArtifactCache, builder: Callable, interval: float = 2.0,
+                           on_reload: Optional[Callable[[dict], None]] = None,
+                           incremental: bool = False) -> SettingsWatcher:
+    """Starts (once per prompt cache and process) a background watcher for the cache's source files."""
+    with _watchers_lock:
+        watcher = _watchers.get(id(prompt_cache))
+        if watcher is None:
+            watcher = _watchers[id(prompt_cache)] = SettingsWatcher(prompt_cache, builder, interval, on_reload,
+                                                                  incremental)
+            watcher.start()
+        return watcher
+
+
+def stop_settings_watcher(prompt_cache: PromptArtifactCache):
+    """Stops the watcher of a prompt cache (e.g. when the cache is dropped), if one is running."""
+    with _watchers_lock:
+        watcher = _watchers.pop(id(prompt_cache), None)
+    if watcher is not None:
+        watcher.stop()
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+_process_initialized = False
+_warm_up_report: Optional[dict] = None
+_lock = threading.Lock()
+
+
+def initialize_process():
+    """
+    Runs the one-time, per-process setup: loads `.env` into the environment.
+
+    Streamlit re-executes the app script on every interaction, but imported
+    modules (and the flag kept here) persist for the life of the server, so
+    calling this on every rerun costs a single flag check.
+    """
+    global _process_initialized
+    if _process_initialized:
+        return
+    with _lock:
+        if not _process_initialized:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _process_initialized = True
+
+
+def run_warm_up(steps: Dict[str, Callable[[], object]]) -> dict:
+    """
+    Runs the warm-up steps once per process, in order, before the first session.
+
+    A failing step is logged in the report and does not stop the others; the
+    session that needs the state will build it (and surface the error) itself.
+
+    Args:
+        steps: Step name -> callable that builds one piece of shared state.
+
+    Returns:
+        Step name -> {"seconds": float, "error": str | None}. Later calls return
+        the report of the first run without running the steps again.
+    """
+    global _warm_up_report
+    with _lock:
+        if _warm_up_report is not None:
+            return _warm_up_report
+        report = {}
+        for name, step in steps.items():
+            start = time.perf_counter()
+            error = None
+            try:
+                step()
+            except Exception as e:
+                error = str(e)
+            report[name] = {"seconds": time.perf_counter() - start, "error": error}
+        _warm_up_report = report
+        return report
+
+
+def warm_up_report() -> Optional[dict]:
+    """Returns the report of the warm-up run, or None if it has not run in this process."""
+    return _warm_up_report
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+# Separate from _lock: warm-up steps (holding _lock) submit to the executor
+_executor_lock = threading.Lock()
+
+
+def get_background_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide executor for work kept off the script run: session
+    setup (model client, prompt artifact, chat session) and diagnostics (the
+    debugging copy of the prompt, token count verification). Sized by
+    BACKGROUND_WORKERS (4 by default).
+
+    Tasks run without a Streamlit script context, so they must not call `st.*`:
+    they return or raise what the session should see, and the script thread
+    shows it (see chatbot_app.await_artifact() and await_chat_session()).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=int(os.getenv("BACKGROUND_WORKERS", "4")),
+                                           thread_name_prefix="chatbot-background")
+        return _executor
@@ -0,0 +1,230 @@
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, List
+
+from chatbot.history_manager import content_to_dict
+from chatbot.token_estimator import estimate_tokens
+
+_KPI_NAME_RE = re.compile(r"\bkpi_\w+")
+
+# Sentences the stub answers are assembled from (deterministically per question)
+_ANSWER_SENTENCES = (
+    "Цей KPI розраховується на основі формули, наведеної в таблиці cnfg.kpi.csv.",
+    "Значення агрегується за ієрархією продуктів відповідно до налаштування HierarchyAggregationType.",
+    "Для читання даних використовується умова з таблиці ConditionMetadata.",
+    "Результат впливає на прогноз обсягу та маржі промоакції.",
+    "Умовне форматування підсвічує значення, що виходять за межі рекомендацій.",
+    "Розподіл за продуктами виконується пропорційно до KPI розподілу.",
+    "Показник доступний у картці промо та в звітах планування.",
+    "Дані перераховуються щомісяця, якщо увімкнено DisaggregateMonthly.",
+)
+
+
+class StubRateLimitError(Exception):
+    """The stub's stand-in for a 429 ResourceExhausted error."""
+    code = 429
+
+
+@dataclass
+class StubUsageMetadata:
+    """Mirrors the token fields of Gemini's `usage_metadata`."""
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+    cached_content_token_count: int = 0
+
+
+@dataclass
+class StubChunk:
+    text: str
+
+
+class StubResponse:
+    """
+    A streamed answer. Iterating yields the chunks with the simulated delays; the
+    exchange is added to the session history once the stream completes, as with
+    the real ChatSession.
+    """
+
+    def __init__(self, session: "StubChatSession", message: str, answer: str, usage: StubUsageMetadata,
+                 ttft_seconds: float, seconds_per_chunk: float, chunk_chars: int):
+        self._session = session
+        self._message = message
+        self.text = answer
+        self.usage_metadata = usage
+        self._ttft_seconds = ttft_seconds
+        self._seconds_per_chunk = seconds_per_chunk
+        self._chunk_chars = chunk_chars
+
+    def __iter__(self) -> Iterator[StubChunk]:
+        client = self._session.client
+        client.sleep(self._ttft_seconds)
+        for start in range(0, len(self.text), self._chunk_chars):
+            if start:
+                client.sleep(self._seconds_per_chunk)
+            yield StubChunk(self.text[start:start + self._chunk_chars])
+        self._session._history.append({"role": "user", "parts": [self._message]})
+        self._session._history.append({"role": "model", "parts": [self.text]})
+
+
+class StubChatSession:
+    """A ChatSession stand-in: keeps the history and answers through its StubModelClient."""
+
+    def __init__(self, client: "StubModelClient", system_prompt: str, cached: bool):
+        self.client = client
+        self.system_prompt = system_prompt
+        self.cached = cached
+        self._history: List[dict] = []
+
+    @property
+    def history(self) -> List[dict]:
+        return self._history
+
+    @history.setter
+    def history(self, history):
+        self._history = [content_to_dict(content) for content in history]
+
+    def send_message(self, content: str, stream: bool = False) -> StubResponse:
+        self.client._maybe_fail()
+        response = self.client._respond(self, content)
+        if not stream:
+            for _ in response:
+                pass
+        return response
+
+    def rewind(self):
+        if len(self._history) >= 2:
+            del self._history[-2:]
+
+
+class StubModelClient:
+    """
+    A deterministic, offline stand-in for GeminiApiClient.
+
+    Answers depend only on `seed` and the message, so replays are repeatable.
+    `model_name` only labels the client; per-tier latency profiles are set
+    through the timing parameters (see `from_env`).
+    Latency is simulated as a time to first token that grows with the prompt
+    size (`ttft_seconds` + `prefill_seconds_per_1k_tokens` per 1000 prompt tokens)
+    followed by chunks streamed at `tokens_per_second`, with +-`jitter` relative
+    variation. All delays are multiplied by `time_scale` (0 = no sleeping, for
+    measuring the app's own overhead) and passed to `sleep`. Token counts come
+    from the local estimator; with `context_cache` enabled the system prompt is
+    reported as cached content, as with a server-side cached context.
+    `error_rate` is the fraction of `send_message` calls that fail with a
+    StubRateLimitError (HTTP 429), drawn from a generator seeded with `seed`.
+    """
+
+    def __init__(self, seed: int = 0, ttft_seconds: float = 0.8, prefill_seconds_per_1k_tokens: float = 0.01,
+                 tokens_per_second: float = 80.0, chunk_tokens: int = 20, answer_tokens: tuple = (150, 600),
+                 jitter: float = 0.2, time_scale: float = 1.0, context_cache: bool = True,
+                 error_rate: float = 0.0, sleep: Callable[[float], None] = time.sleep,
+                 model_name: str = "stub-pro"):
+        self.seed = seed
+        self.model_name = model_name
+        self.ttft_seconds = ttft_seconds
+        self.prefill_seconds_per_1k_tokens = prefill_seconds_per_1k_tokens
+        self.tokens_per_second = tokens_per_second
+        self.chunk_tokens = chunk_tokens
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self.time_scale = time_scale
+        self.simulate_context_cache = context_cache
+        self.error_rate = error_rate
+        self._sleep = sleep
+        self._error_rng = random.Random(seed)
+        self._error_lock = threading.Lock()
+        # No server-side context cache manager; `cached_content_token_count` is simulated instead
+        self.context_cache = None
+        self.requests = 0
+        self.injected_errors = 0
+
+    @classmethod
+    def from_env(cls, tier: str = "pro") -> "StubModelClient":
+        """
+        Reads STUB_SEED, STUB_TIME_SCALE, STUB_TTFT_SECONDS and STUB_ERROR_RATE from
+        the environment. The "fast" tier uses STUB_FAST_TTFT_SECONDS and
+        STUB_FAST_TOKENS_PER_SECOND instead, defaulting to a flash-like profile.
+        """
+        if tier == "fast":
+            ttft_seconds = float(os.getenv("STUB_FAST_TTFT_SECONDS", "0.3"))
+            tokens_per_second = float(os.getenv("STUB_FAST_TOKENS_PER_SECOND", "200"))
+        else:
+            ttft_seconds = float(os.getenv("STUB_TTFT_SECONDS", "0.8"))
+            tokens_per_second = 80.0
+        return cls(
+            seed=int(os.getenv("STUB_SEED", "0")),
+            time_scale=float(os.getenv("STUB_TIME_SCALE", "1.0")),
+            ttft_seconds=ttft_seconds,
+            tokens_per_second=tokens_per_second,
+            error_rate=float(os.getenv("STUB_ERROR_RATE", "0")),
+            model_name=f"stub-{tier}",
+        )
+
+    def sleep(self, seconds: float):
+        if seconds > 0 and self.time_scale > 0:
+            self._sleep(seconds * self.time_scale)
+
+    def start_chat_session(self, system_prompt: str, prompt_hash: str = None) -> StubChatSession:
+        return StubChatSession(self, system_prompt, cached=self.simulate_context_cache and bool(prompt_hash))
+
+    def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def _maybe_fail(self):
+        if self.error_rate <= 0:
+            return
+        with self._error_lock:
+            fail = self._error_rng.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if fail:
+            raise StubRateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+    def _rng(self, message: str) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}\0{message}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "big"))
+
+    def _answer(self, message: str, rng: random.Random) -> str:
+        target_tokens = rng.randint(*self.answer_tokens)
+        kpis = list(dict.fromkeys(_KPI_NAME_RE.findall(message)))
+        lines = [f"**{kpis[0]}**" if kpis else "**Відповідь**", ""]
+        text_tokens = 0
+        while text_tokens < target_tokens:
+            sentence = rng.choice(_ANSWER_SENTENCES)
+            if kpis and rng.random() < 0.3:
+                sentence = f"{rng.choice(kpis)}: {sentence}"
+            lines.append(f"- {sentence}")
+            text_tokens += estimate_tokens(sentence)
+        return "\n".join(lines)
+
+    def _respond(self, session: StubChatSession, message: str) -> StubResponse:
+        self.requests += 1
+        rng = self._rng(message)
+        answer = self._answer(message, rng)
+
+        system_tokens = estimate_tokens(session.system_prompt)
+        history_tokens = sum(estimate_tokens("".join(m["parts"])) for m in session.history)
+        prompt_tokens = system_tokens + history_tokens + estimate_tokens(message)
+        answer_tokens = estimate_tokens(answer)
+        usage = StubUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=answer_tokens,
+            total_token_count=prompt_tokens + answer_tokens,
+            cached_content_token_count=system_tokens if session.cached else 0,
+        )
+
+        def vary(seconds: float) -> float:
+            return seconds * (1 + rng.uniform(-self.jitter, self.jitter))
+
+        # Cached context tokens are not prefilled again
+        prefill_tokens = prompt_tokens - usage.cached_content_token_count
+        ttft = vary(self.ttft_seconds + self.prefill_seconds_per_1k_tokens * prefill_tokens / 1000)
+        chunk_chars = max(1, round(len(answer) * self.chunk_tokens / max(answer_tokens, 1)))
+        seconds_per_chunk = vary(self.chunk_tokens / self.tokens_per_second)
+        return StubResponse(session, message, answer, usage, ttft, seconds_per_chunk, chunk_chars)
@@ -0,0 +1,258 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import BuiltinFunctionType, FunctionType, MappingProxyType, MethodType, ModuleType
+from typing import Any, Callable, Dict, List, Optional
+
+from chatbot.prompt_cache import PromptArtifact
+
+DEFAULT_TENANT = "default"
+# What a tenant directory (a subdirectory of TENANTS_DIR) contains
+TENANT_PROMPT_FILE = "promotool_settings.md"
+TENANT_TABLES_DIR = "settings_tables"
+
+
+@dataclass(frozen=True)
+class Tenant:
+    """One PromoTool customer: its prompt template and its settings tables."""
+    name: str
+    prompt_path: str
+    tables_dir: str
+
+
+def discover_tenants(tenants_dir: Optional[str], default: Tenant) -> Dict[str, Tenant]:
+    """
+    Lists the available tenants: `default` first, then every subdirectory of
+    `tenants_dir` that contains a prompt template and a settings tables directory.
+    """
+    tenants = {default.name: default}
+    if tenants_dir and os.path.isdir(tenants_dir):
+        for name in sorted(os.listdir(tenants_dir)):
+            prompt_path = os.path.join(tenants_dir, name, TENANT_PROMPT_FILE)
+            tables_dir = os.path.join(tenants_dir, name, TENANT_TABLES_DIR)
+            if name not in tenants and os.path.isfile(prompt_path) and os.path.isdir(tables_dir):
+                tenants[name] = Tenant(name, os.path.abspath(prompt_path), os.path.abspath(tables_dir))
+    return tenants
+
+
+_NOT_FOLLOWED = (type, ModuleType, FunctionType, MethodType, BuiltinFunctionType)
+
+
+def estimate_size(obj: Any) -> int:
+    """
+    Approximates the memory held by an object graph in bytes (`sys.getsizeof`
+    summed over containers, instance attributes and slots, each object once).
+    Modules, classes and functions are not followed.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _NOT_FOLLOWED):
+            continue
+        seen.add(id(current))
+        total += sys.getsizeof(current)
+        if isinstance(current, (str, bytes, int, float, bool)) or current is None:
+            continue
+        if isinstance(current, (dict, MappingProxyType)):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            stack.extend(current)
+        if hasattr(current, "__dict__"):
+            stack.append(vars(current))
+        for slot in getattr(type(current), "__slots__", ()):
+            if hasattr(current, slot):
+                stack.append(getattr(current, slot))
+    return total
+
+
+class _TenantState:
+    def __init__(self):
+        self.artifact: Optional[PromptArtifact] = None
+        self.load_seconds: Optional[float] = None
+        self.memory_bytes = 0
+        self.last_used = 0.0
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        # Why the last load failed, for the caller to report
+        self.error: Optional[str] = None
+
+
+class TenantRegistry:
+    """
+    Serves the prompt artifact of each tenant, side by side in one process.
+
+    A tenant is loaded on first use through `loader` (which normally goes through
+    the process-wide prompt cache, so the artifact is built once and shared
+    read-only by every session of that tenant). Its memory is estimated on every
+    (re)load. When the loaded tenants together exceed `memory_cap_bytes`, the
+    least recently used tenants that have been idle for `idle_seconds` are
+    evicted (`on_evict` releases their prompt cache); they are loaded again on
+    their next use. Sessions that still hold an evicted artifact keep working.
+    `on_load` receives the load time and memory of every (re)load.
+    """
+
+    def __init__(self, tenants: Dict[str, Tenant], loader: Callable[[Tenant], Optional[PromptArtifact]],
+                 memory_cap_bytes: int = 512 * 1024 * 1024, idle_seconds: float = 600.0,
+                 on_load: Optional[Callable[[Tenant, dict], None]] = None,
+                 on_evict: Optional[Callable[[Tenant], None]] = None, default: str = DEFAULT_TENANT):
+        if default not in tenants:
+            raise ValueError(f"Unknown default tenant: {default}")
+        self.tenants = dict(tenants)
+        self.default = default
+        self.loader = loader
+        self.memory_cap_bytes = memory_cap_bytes
+        self.idle_seconds = idle_seconds
+        self.on_load = on_load
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._states: Dict[str, _TenantState] = {name: _TenantState() for name in tenants}
+        # Loaded tenants, least recently used first
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()
+
+    def names(self) -> List[str]:
+        return list(self.tenants)
+
+    def get(self, name: Optional[str] = None) -> Optional[PromptArtifact]:
+        """
+        Returns the current artifact of a tenant, loading it on first use.
+
+        Args:
+            name: The tenant name; the default tenant if None.
+
+        Returns:
+            The shared PromptArtifact, or None if the tenant could not be built
+            (see `last_error()`).
+
+        Raises:
+            KeyError: If the tenant does not exist.
+        """
+        name = name or self.default
+        tenant = self.tenants[name]
+        state = self._states[name]
+        start = time.perf_counter()
+        error = None
+        try:
+            # The loader is cheap when nothing changed (the prompt cache only stats the files)
+            artifact = self.loader(tenant)
+        except Exception as e:
+            artifact, error = None, str(e) or type(e).__name__
+        load_seconds = time.perf_counter() - start
+        if artifact is None:
+            with self._lock:
+                state.error = error or "The prompt could not be built"
+            return None
+
+        with self._lock:
+            state.error = None
+            reloaded = artifact is not state.artifact
+        # Measured outside the lock: walking a large artifact takes a few milliseconds
+        memory_bytes = estimate_size(artifact) if reloaded else None
+        with self._lock:
+            if reloaded:
+                state.artifact = artifact
+                state.load_seconds = load_seconds
+                state.memory_bytes = memory_bytes
+                state.loads += 1
+            else:
+                state.hits += 1
+            state.last_used = time.monotonic()
+            self._loaded[name] = None
+            self._loaded.move_to_end(name)
+            evicted = self._evict_idle(keep=name)
+        if reloaded and self.on_load is not None:
+            self.on_load(tenant, {"version": artifact.version, "load_seconds": load_seconds,
+                                  "memory_mb": memory_bytes / (1024 * 1024), "evicted": evicted})
+        for tenant_name in evicted:
+            if self.on_evict is not None:
+                self.on_evict(self.tenants[tenant_name])
+        return artifact
+
+    def last_error(self, name: Optional[str] = None) -> Optional[str]:
+        """Why the last load of a tenant failed, or None if it succeeded."""
+        with self._lock:
+            return self._states[name or self.default].error
+
+    def touch(self, name: Optional[str] = None):
+        """Marks a tenant as in use (e.g. on every interaction of one of its sessions)."""
+        name = name or self.default
+        with self._lock:
+            if name in self._loaded:
+                self._states[name].last_used = time.monotonic()
+                self._loaded.move_to_end(name)
+
+    def _evict_idle(self, keep: str) -> List[str]:
+        """Drops least recently used idle tenants until the memory cap is met. Called under the lock."""
+        evicted = []
+        now = time.monotonic()
+        for name in list(self._loaded):
+            if self._memory_bytes() <= self.memory_cap_bytes:
+                break
+            state = self._states[name]
+            if name == keep or now - state.last_used < self.idle_seconds:
+                continue
+            del self._loaded[name]
+            state.artifact = None
+            state.evictions += 1
+            evicted.append(name)
+        return evicted
+
+    def _memory_bytes(self) -> int:
+        return sum(self._states[name].memory_bytes for name in self._loaded)
+
+    def stats(self) -> dict:
+        """Returns per-tenant load time, memory and counters, and the registry totals."""
+        with self._lock:
+            now = time.monotonic()
+            tenants = {}
+            for name, state in self._states.items():
+                tenants[name] = {
+                    "loaded": name in self._loaded,
+                    "load_seconds": state.load_seconds,
+                    "memory_mb": state.memory_bytes / (1024 * 1024),
+                    "idle_seconds": now - state.last_used if state.last_used else None,
+                    "loads": state.loads,
+                    "hits": state.hits,
+                    "evictions": state.evictions,
+                    "error": state.error,
+                    "content_hash": state.artifact.content_hash if state.artifact else None,
+                }
+            return {
+                "tenants": tenants,
+                "loaded": len(self._loaded),
+                "memory_mb": self._memory_bytes() / (1024 * 1024),
+                "memory_cap_mb": self.memory_cap_bytes / (1024 * 1024),
+            }
+
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry(default: Tenant, loader: Callable[[Tenant], Optional[PromptArtifact]],
+                        on_load: Optional[Callable[[Tenant, dict], None]] = None,
+                        on_evict: Optional[Callable[[Tenant], None]] = None) -> TenantRegistry:
+    """
+    Returns the process-wide registry, created on first use from TENANTS_DIR,
+    DEFAULT_TENANT, TENANT_MEMORY_CAP_MB and TENANT_IDLE_SECONDS (later calls
+    return the same registry and ignore their arguments).
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TenantRegistry(
+                discover_tenants(os.getenv("TENANTS_DIR"), default),
+                loader,
+                memory_cap_bytes=int(float(os.getenv("TENANT_MEMORY_CAP_MB", "512")) * 1024 * 1024),
+                idle_seconds=float(os.getenv("TENANT_IDLE_SECONDS", "600")),
+                on_load=on_load,
+                on_evict=on_evict,
+                default=os.getenv("DEFAULT_TENANT", default.name),
+            )
+        return _registry
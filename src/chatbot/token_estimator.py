@@ -0,0 +1,288 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache"))
+CALIBRATION_PATH = os.path.join(CACHE_DIR, "token_calibration.json")
+
+# Most recent samples kept in the calibration set
+MAX_CALIBRATION_SAMPLES = 500
+
+FEATURES = ("cyrillic", "latin", "digit", "whitespace", "other")
+
+# Tokens per character of each class. Used until real counts have been recorded
+# with `--verify` (see debug_token_count.py) and the estimator recalibrated.
+DEFAULT_COEFFICIENTS = {
+    "cyrillic": 0.33,
+    "latin": 0.25,
+    "digit": 1.0,
+    "whitespace": 0.08,
+    "other": 0.6,
+}
+
+
+def character_features(text: str) -> Dict[str, int]:
+    """Counts the characters of each class in the text."""
+    counts = dict.fromkeys(FEATURES, 0)
+    for char in text:
+        if char.isspace():
+            counts["whitespace"] += 1
+        elif char.isdigit():
+            counts["digit"] += 1
+        elif char.isalpha():
+            if "\u0400" <= char <= "\u052f":
+                counts["cyrillic"] += 1
+            else:
+                counts["latin"] += 1
+        else:
+            counts["other"] += 1
+    return counts
+
+
+def _solve_least_squares(rows: List[List[float]], targets: List[float], prior: List[float],
+                         ridge: float = 1e-3) -> Optional[List[float]]:
+    """
+    Solves ridge-regularized normal equations with Gaussian elimination. The
+    regularization pulls coefficients toward `prior`, so character classes that
+    are rare in the samples keep their default weight. Returns None if singular.
+    """
+    n = len(prior)
+    ata = [[sum(r[i] * r[j] for r in rows) for j in range(n)] for i in range(n)]
+    atb = [sum(r[i] * t for r, t in zip(rows, targets)) for i in range(n)]
+    lam = ridge * max(sum(ata[i][i] for i in range(n)) / n, 1.0)
+    for i in range(n):
+        ata[i][i] += lam
+        atb[i] += lam * prior[i]
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(ata[r][col]))
+        if abs(ata[pivot][col]) < 1e-12:
+            return None
+        ata[col], ata[pivot] = ata[pivot], ata[col]
+        atb[col], atb[pivot] = atb[pivot], atb[col]
+        for r in range(n):
+            if r != col:
+                factor = ata[r][col] / ata[col][col]
+                ata[r] = [a - factor * c for a, c in zip(ata[r], ata[col])]
+                atb[r] -= factor * atb[col]
+    return [atb[i] / ata[i][i] for i in range(n)]
+
+
+class TokenEstimator:
+    """
+    Estimates Gemini token counts locally, without `count_tokens` round-trips.
+
+    The estimate is a linear model over per-class character counts (Cyrillic,
+    Latin, digits, whitespace, other). Coefficients are fitted by least squares
+    on recorded (text, real token count) samples from the calibration file.
+    Estimates are memoized by content hash.
+
+    `verify()` counts a text with a real counter (e.g. `GeminiApiClient.count_tokens`,
+    passed in or set as `verify_with`), records the sample and refits the
+    coefficients. Samples are keyed by content hash, so the same text counted
+    again replaces its sample; the newest `max_samples` are kept. Real counts
+    are remembered by content hash too: a text is only counted remotely once
+    per process.
+    """
+
+    def __init__(self, calibration_path: str = CALIBRATION_PATH, memo_size: int = 4096,
+                 verify_with: Optional[Callable[[str], int]] = None, max_samples: int = MAX_CALIBRATION_SAMPLES):
+        self.calibration_path = calibration_path
+        self.memo_size = memo_size
+        self.verify_with = verify_with
+        self.max_samples = max_samples
+        self.samples: List[dict] = []
+        self.coefficients = dict(DEFAULT_COEFFICIENTS)
+        self._memo: "OrderedDict[str, int]" = OrderedDict()
+        # Real counts by content hash, so verify() does not count a text again
+        self._verified: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Guards `samples` and the calibration file
+        self._samples_lock = threading.Lock()
+        self.memo_hits = 0
+        self.memo_misses = 0
+        self.verify_hits = 0
+        self._load_calibration()
+
+    # --- Calibration --- #
+
+    def _load_calibration(self):
+        try:
+            with open(self.calibration_path, "r", encoding="utf-8") as f:
+                samples = json.load(f).get("samples", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            samples = []
+        # Files written before samples had a content hash can repeat a text
+        unique = {}
+        for sample in samples:
+            key = sample.get("hash") or (sample.get("label"), tuple(sorted(sample["features"].items())))
+            unique.pop(key, None)
+            unique[key] = sample
+        self.samples = list(unique.values())[-self.max_samples:]
+        self.calibrate()
+
+    def calibrate(self) -> bool:
+        """
+        Refits the coefficients on the recorded samples.
+
+        Returns:
+            True if the fit succeeded; otherwise the defaults stay in place.
+        """
+        with self._samples_lock:
+            usable = [s for s in self.samples if s.get("tokens")]
+        if not usable:
+            return False
+        rows = [[float(s["features"].get(f, 0)) for f in FEATURES] for s in usable]
+        solution = _solve_least_squares(rows, [float(s["tokens"]) for s in usable],
+                                        [DEFAULT_COEFFICIENTS[f] for f in FEATURES])
+        if solution is None or any(c < 0 for c in solution):
+            return False
+        with self._lock:
+            self.coefficients = dict(zip(FEATURES, solution))
+            self._memo.clear()
+        return True
+
+    def record_sample(self, text: str, real_tokens: int, label: str = "", save: bool = True):
+        """
+        Adds a (text, real token count) pair to the calibration set, replacing an
+        earlier sample of the same text, and refits the coefficients.
+        """
+        content_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        sample = {"label": label, "hash": content_hash, "features": character_features(text),
+                  "tokens": int(real_tokens)}
+        with self._samples_lock:
+            self.samples = [s for s in self.samples if s.get("hash") != content_hash] + [sample]
+            del self.samples[:-self.max_samples]
+            if save:
+                self._write_calibration()
+        self.calibrate()
+
+    def save_calibration(self):
+        with self._samples_lock:
+            self._write_calibration()
+
+    def _write_calibration(self):
+        # Written to a temporary file and moved into place, so readers never see a partial file
+        directory = os.path.dirname(self.calibration_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=directory, suffix=".tmp", delete=False) as f:
+            json.dump({"samples": self.samples}, f, ensure_ascii=False, indent=2)
+        try:
+            os.replace(f.name, self.calibration_path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    def error_report(self) -> dict:
+        """
+        Compares the current estimates with the recorded real counts.
+
+        Returns:
+            Sample count, mean absolute percentage error, worst error and total
+            bias (positive = overestimate) over the calibration set.
+        """
+        errors = []
+        total_real = total_estimated = 0
+        with self._samples_lock:
+            samples = list(self.samples)
+        for sample in samples:
+            real = sample.get("tokens")
+            if not real:
+                continue
+            estimated = self._estimate_features(sample["features"])
+            errors.append(abs(estimated - real) / real)
+            total_real += real
+            total_estimated += estimated
+        if not errors:
+            return {"samples": 0, "calibrated": False}
+        return {
+            "samples": len(errors),
+            "calibrated": self.coefficients != DEFAULT_COEFFICIENTS,
+            "mean_abs_pct_error": 100 * sum(errors) / len(errors),
+            "max_abs_pct_error": 100 * max(errors),
+            "total_bias_pct": 100 * (total_estimated - total_real) / total_real,
+        }
+
+    # --- Estimation --- #
+
+    def _estimate_features(self, features: Dict[str, int]) -> int:
+        return max(0, round(sum(self.coefficients[f] * features.get(f, 0) for f in FEATURES)))
+
+    def estimate(self, text: str) -> int:
+        """Returns the estimated token count of the text (memoized by content hash)."""
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                self.memo_hits += 1
+                return self._memo[key]
+        count = self._estimate_features(character_features(text))
+        with self._lock:
+            self.memo_misses += 1
+            self._memo[key] = count
+            if len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return count
+
+    def estimate_unrounded(self, text: str) -> float:
+        """
+        Returns the estimate before rounding (not memoized). The model is linear, so
+        the unrounded estimates of the parts of a text add up to that of the whole.
+        """
+        features = character_features(text)
+        return sum(self.coefficients[f] * features.get(f, 0) for f in FEATURES)
+
+    def estimate_many(self, texts: Iterable[str]) -> List[int]:
+        """Estimates many strings at once; duplicates are only counted once."""
+        results: Dict[str, int] = {}
+        counts = []
+        for text in texts:
+            if text not in results:
+                results[text] = self.estimate(text)
+            counts.append(results[text])
+        return counts
+
+    def verify(self, text: str, label: str = "", counter: Optional[Callable[[str], int]] = None) -> int:
+        """
+        Counts tokens with a real counter (`counter`, else `verify_with`) and
+        records the sample. A text already counted returns its remembered count
+        without calling the counter. Falls back to the estimate when there is no
+        counter.
+        """
+        counter = counter or self.verify_with
+        if counter is None:
+            return self.estimate(text)
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            if key in self._verified:
+                self._verified.move_to_end(key)
+                self.verify_hits += 1
+                return self._verified[key]
+        real = counter(text)
+        self.record_sample(text, real, label=label)
+        with self._lock:
+            self._verified[key] = int(real)
+            if len(self._verified) > self.memo_size:
+                self._verified.popitem(last=False)
+        return real
+
+
+_estimator: Optional[TokenEstimator] = None
+_estimator_lock = threading.Lock()
+
+
+def get_token_estimator() -> TokenEstimator:
+    """Returns the process-wide estimator, so the memo is shared by all sessions."""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = TokenEstimator()
+        return _estimator
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the token count of the text with the process-wide estimator."""
+    return get_token_estimator().estimate(text)
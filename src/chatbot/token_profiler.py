@@ -0,0 +1,207 @@
+import csv
+import json
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from chatbot.kpi_graph import KPI_TABLE, LOCALIZATION_TABLE, CONDITION_METADATA_TABLE
+from chatbot.prompt_encoding import GuidAliaser, encode_table, encoded_columns, format_value
+from chatbot.token_estimator import TokenEstimator, get_token_estimator
+
+DATA_FORMATS = ("json", "compact")
+LEVELS = ("table", "column", "group", "row", "cell")
+
+# Categorical columns broken down by value, e.g. the cost of each localization language
+DEFAULT_GROUP_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    LOCALIZATION_TABLE: ("LocalizationCode", "ObjectType"),
+    KPI_TABLE: ("Type", "DataType"),
+    CONDITION_METADATA_TABLE: ("Type",),
+}
+
+
+@dataclass
+class Attribution:
+    """
+    The prompt tokens one table, column, row, cell or group of rows (rows sharing
+    a value of a categorical column) costs in the reference data.
+    """
+    level: str
+    table: str
+    tokens: float
+    chars: int
+    column: str = ""
+    row: str = ""
+    row_index: int = -1
+    group: str = ""
+    rows: int = 1
+    share_pct: float = 0.0
+
+
+@dataclass
+class TokenProfile:
+    """Token attribution of the reference data in one serialization format."""
+    data_format: str
+    total_tokens: float
+    entries: List[Attribution]
+    # Table -> real token count, for the tables counted with the model's tokenizer
+    verified_tables: Dict[str, int] = field(default_factory=dict)
+
+    def top(self, level: str, n: int = 10, table: Optional[str] = None) -> List[Attribution]:
+        """The `n` most expensive entries of a level, optionally of one table only."""
+        entries = [e for e in self.entries if e.level == level and (table is None or e.table == table)]
+        return sorted(entries, key=lambda e: e.tokens, reverse=True)[:n]
+
+    def write_csv(self, path: str):
+        """Writes every entry as a CSV row, most expensive first within each level."""
+        names = [f.name for f in fields(Attribution)]
+        ordered = sorted(self.entries, key=lambda e: (LEVELS.index(e.level), -e.tokens))
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=names)
+            writer.writeheader()
+            for entry in ordered:
+                writer.writerow({**asdict(entry), "tokens": round(entry.tokens, 2),
+                                 "share_pct": round(entry.share_pct, 4)})
+
+    def write_json(self, path: str):
+        ordered = sorted(self.entries, key=lambda e: (LEVELS.index(e.level), -e.tokens))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"data_format": self.data_format, "total_tokens": self.total_tokens,
+                       "verified_tables": self.verified_tables, "entries": [asdict(e) for e in ordered]},
+                      f, ensure_ascii=False, indent=1)
+
+
+def row_label(record: dict, index: int) -> str:
+    """A readable label of a row: its Name, else its Id, else its position."""
+    for column in ("Name", "Id"):
+        value = record.get(column)
+        if value not in (None, ""):
+            return str(value)
+    return f"#{index}"
+
+
+class TokenProfiler:
+    """
+    Attributes the tokens of the reference data to tables, columns, rows and
+    cells, in the exact serialization the app sends (PROMPT_DATA_FORMAT "json" or
+    "compact"), so the report points at what pruning would save.
+
+    Token counts come from the local estimator, unrounded: the estimator is linear
+    in character counts, so the cells of a row plus its punctuation add up to the
+    row, and the rows plus the table's framing add up to the table. Repeated
+    strings (flags, codes, empty values) are counted once. Tables given in
+    `verified_tables` (real counts, one tokenizer call per table) have all their
+    entries scaled to the real count.
+
+    In the JSON format a cell includes its `"column": ` key, which is repeated in
+    every record; in the compact format a column also owns its name in the header.
+    """
+
+    def __init__(self, data_format: str = "json", aliaser: GuidAliaser = None,
+                 estimator: TokenEstimator = None, group_columns: Dict[str, Iterable[str]] = None):
+        if data_format not in DATA_FORMATS:
+            raise ValueError(f"Unknown data format: {data_format} (expected one of {', '.join(DATA_FORMATS)})")
+        self.data_format = data_format
+        self.aliaser = aliaser if data_format == "compact" else None
+        self.estimator = estimator or get_token_estimator()
+        self.group_columns = DEFAULT_GROUP_COLUMNS if group_columns is None else group_columns
+        self._memo: Dict[str, float] = {}
+
+    def count(self, text: str) -> float:
+        tokens = self._memo.get(text)
+        if tokens is None:
+            tokens = self._memo[text] = self.estimator.estimate_unrounded(text)
+        return tokens
+
+    def serialize_table(self, name: str, records: List[dict]) -> str:
+        """The table as it appears in the prompt (see chatbot_app.format_table_segment())."""
+        if self.data_format == "compact":
+            return encode_table(name, records, self.aliaser)
+        return (f"{json.dumps(name, ensure_ascii=False)}: "
+                f"{json.dumps(list(records), indent=None, ensure_ascii=False, default=dict)}")
+
+    def _cells(self, records: List[dict]) -> Tuple[List[str], List[Tuple[str, List[Tuple[str, str]]]]]:
+        """The table's columns, and per record its serialized line and (column, cell fragment) pairs."""
+        rows = []
+        if self.data_format == "compact":
+            columns = encoded_columns(records)
+            for record in records:
+                values = [format_value(record.get(column)) for column in columns]
+                if self.aliaser:
+                    values = [self.aliaser.encode_text(value) for value in values]
+                rows.append(("\t".join(values).rstrip("\t"),
+                             [(column, value) for column, value in zip(columns, values) if value]))
+            return columns, rows
+        columns = []
+        for record in records:
+            record = dict(record)
+            for column in record:
+                if column not in columns:
+                    columns.append(column)
+            fragments = [(column, f"{json.dumps(column, ensure_ascii=False)}: "
+                                  f"{json.dumps(value, ensure_ascii=False, default=dict)}")
+                         for column, value in record.items()]
+            rows.append((json.dumps(record, ensure_ascii=False, default=dict), fragments))
+        return columns, rows
+
+    def profile_table(self, name: str, records: List[dict], real_tokens: Optional[int] = None) -> List[Attribution]:
+        """Entries of one table: the table, its columns, groups, rows and non-empty cells."""
+        columns, rows = self._cells(records)
+        segment = self.serialize_table(name, records)
+        table_tokens = self.count(segment)
+        scale = real_tokens / table_tokens if real_tokens and table_tokens else 1.0
+
+        entries = []
+        column_tokens = defaultdict(float)
+        column_chars = defaultdict(int)
+        if self.data_format == "compact":
+            # The header names every column once
+            for column in columns:
+                column_tokens[column] += self.count(column + "\t")
+                column_chars[column] += len(column) + 1
+        row_tokens = []
+        for index, (line, fragments) in enumerate(rows):
+            label = row_label(records[index], index)
+            tokens = self.count(line)
+            row_tokens.append(tokens)
+            entries.append(Attribution("row", name, tokens * scale, len(line), row=label, row_index=index))
+            for column, fragment in fragments:
+                cell_tokens = self.count(fragment)
+                column_tokens[column] += cell_tokens
+                column_chars[column] += len(fragment)
+                entries.append(Attribution("cell", name, cell_tokens * scale, len(fragment), column=column,
+                                           row=label, row_index=index))
+
+        for column in columns:
+            entries.append(Attribution("column", name, column_tokens[column] * scale, column_chars[column],
+                                       column=column, rows=len(records)))
+        for column in self.group_columns.get(name, ()):
+            if column not in columns:
+                continue
+            group_tokens, group_chars, group_rows = defaultdict(float), defaultdict(int), defaultdict(int)
+            for index, record in enumerate(records):
+                value = format_value(record.get(column))
+                group_tokens[value] += row_tokens[index]
+                group_chars[value] += len(rows[index][0])
+                group_rows[value] += 1
+            for value, tokens in group_tokens.items():
+                entries.append(Attribution("group", name, tokens * scale, group_chars[value], column=column,
+                                           group=value or "(empty)", rows=group_rows[value]))
+        entries.append(Attribution("table", name, table_tokens * scale, len(segment), rows=len(records)))
+        return entries
+
+    def profile(self, tables: Dict[str, List[dict]], verified_tables: Dict[str, int] = None) -> TokenProfile:
+        """
+        Profiles every table.
+
+        Args:
+            tables: Table name -> records, as in KnowledgeBase.tables.
+            verified_tables: Table name -> real token count of its serialization.
+        """
+        verified_tables = verified_tables or {}
+        entries = []
+        for name, records in tables.items():
+            entries.extend(self.profile_table(name, records, verified_tables.get(name)))
+        total = sum(e.tokens for e in entries if e.level == "table")
+        for entry in entries:
+            entry.share_pct = 100 * entry.tokens / total if total else 0.0
+        return TokenProfile(self.data_format, total, entries, dict(verified_tables))
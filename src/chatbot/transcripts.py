@@ -0,0 +1,138 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache"))
+DEFAULT_DB_PATH = os.path.join(CACHE_DIR, "transcripts.sqlite3")
+
+
+class TranscriptStore:
+    """
+    Conversation transcripts in a local SQLite database, so a conversation that
+    was evicted from memory can be resumed without asking the model anything.
+
+    The displayed messages are appended (each message is written once), and the
+    model-side history (already trimmed to the history budget), the tenant and the
+    prompt hash are replaced on every save. Conversations not updated for
+    `ttl_seconds` are purged.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, ttl_seconds: float = 30 * 24 * 3600):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.counters = {"saves": 0, "messages_written": 0, "loads": 0, "purged": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS conversations (
+                id TEXT PRIMARY KEY,
+                tenant TEXT,
+                prompt_hash TEXT,
+                history TEXT NOT NULL,
+                message_count INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS messages (
+                conversation_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                message TEXT NOT NULL,
+                PRIMARY KEY (conversation_id, seq)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_conversations_updated_at ON conversations(updated_at)")
+        self._conn.commit()
+
+    def save(self, conversation_id: str, tenant: Optional[str], prompt_hash: Optional[str], history: List[dict],
+             new_messages: List[dict], first_seq: int):
+        """
+        Appends messages to a transcript and replaces its model-side history.
+
+        Args:
+            conversation_id: The conversation.
+            tenant: The tenant the conversation belongs to.
+            prompt_hash: Content hash of the prompt the conversation uses.
+            history: The model-side history as {"role", "parts"} dicts.
+            new_messages: Displayed messages not written yet.
+            first_seq: Position of `new_messages[0]` in the whole conversation.
+        """
+        now = time.time()
+        with self._lock:
+            self._insert_messages(conversation_id, new_messages, first_seq)
+            self._conn.execute(
+                "INSERT INTO conversations (id, tenant, prompt_hash, history, message_count, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET tenant = excluded.tenant, "
+                "prompt_hash = excluded.prompt_hash, history = excluded.history, "
+                "message_count = excluded.message_count, updated_at = excluded.updated_at",
+                (conversation_id, tenant, prompt_hash, json.dumps(history, ensure_ascii=False),
+                 first_seq + len(new_messages), now, now),
+            )
+            self._conn.commit()
+            self.counters["saves"] += 1
+            self.counters["messages_written"] += len(new_messages)
+
+    def append_messages(self, conversation_id: str, new_messages: List[dict], first_seq: int):
+        """Appends displayed messages only (the next `save()` updates the rest of the transcript)."""
+        with self._lock:
+            self._insert_messages(conversation_id, new_messages, first_seq)
+            self._conn.commit()
+            self.counters["messages_written"] += len(new_messages)
+
+    def _insert_messages(self, conversation_id: str, new_messages: List[dict], first_seq: int):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO messages (conversation_id, seq, message) VALUES (?, ?, ?)",
+            [(conversation_id, first_seq + i, json.dumps(message, ensure_ascii=False))
+             for i, message in enumerate(new_messages)],
+        )
+
+    def load(self, conversation_id: str) -> Optional[dict]:
+        """
+        Returns a transcript's tenant, prompt hash, model-side history and message
+        count, or None if there is none (or it expired).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT tenant, prompt_hash, history, message_count, updated_at FROM conversations WHERE id = ?",
+                (conversation_id,),
+            ).fetchone()
+            if row is None or time.time() - row[4] > self.ttl_seconds:
+                return None
+            self.counters["loads"] += 1
+        return {"tenant": row[0], "prompt_hash": row[1], "history": json.loads(row[2]), "message_count": row[3]}
+
+    def load_messages(self, conversation_id: str, offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """Returns displayed messages of a transcript, in order, starting at position `offset`."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message FROM messages WHERE conversation_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (conversation_id, offset, -1 if limit is None else limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def purge_expired(self) -> int:
+        """Deletes transcripts not updated within the TTL. Returns how many were deleted."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [row[0] for row in
+                       self._conn.execute("SELECT id FROM conversations WHERE updated_at < ?", (cutoff,)).fetchall()]
+            self._conn.executemany("DELETE FROM messages WHERE conversation_id = ?", [(i,) for i in expired])
+            self._conn.executemany("DELETE FROM conversations WHERE id = ?", [(i,) for i in expired])
+            self._conn.commit()
+            self.counters["purged"] += len(expired)
+        return len(expired)
+
+    def stats(self) -> dict:
+        """Returns write/read counters and the size of the store."""
+        with self._lock:
+            conversations, = self._conn.execute("SELECT COUNT(*) FROM conversations").fetchone()
+            messages, = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+            return {**self.counters, "conversations": conversations, "messages": messages}
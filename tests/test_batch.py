@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from chatbot.batch import STATUS_ERROR, STATUS_OK, BatchItem, BatchRunner, load_questions, read_checkpoint
+
+
+def read_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def make_runner(output_path, fail=()):
+    asked = []
+
+    def answer(item: BatchItem) -> dict:
+        asked.append(item.id)
+        if item.id in fail:
+            raise RuntimeError("model unavailable")
+        return {"answer": f"answer to {item.question}"}
+
+    return BatchRunner(answer, str(output_path), workers=2), asked
+
+
+ITEMS = [BatchItem("a", "question a"), BatchItem("b", "question b"), BatchItem("c", "question c")]
+
+
+def test_resume_skips_answered_items_and_ignores_a_cut_off_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    runner, asked = make_runner(output)
+    runner.run(ITEMS[:2])
+    # An interruption in the middle of writing the next record
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "c", "status": "o')
+    assert read_checkpoint(str(output)) == {"a", "b"}
+
+    runner, asked = make_runner(output)
+    summary = runner.run(ITEMS)
+    assert asked == ["c"]
+    assert summary["skipped"] == 2 and summary["answered"] == 1 and summary["remaining"] == 0
+    assert read_checkpoint(str(output)) == {"a", "b", "c"}
+
+
+def test_failed_items_are_recorded_and_retried_on_resume(tmp_path):
+    output = tmp_path / "out.jsonl"
+    runner, _ = make_runner(output, fail={"b"})
+    summary = runner.run(ITEMS)
+    assert summary["answered"] == 2 and summary["failed"] == 1
+    failed = [r for r in read_records(output) if r["status"] == STATUS_ERROR]
+    assert [r["id"] for r in failed] == ["b"] and failed[0]["error"] == "RuntimeError: model unavailable"
+
+    runner, asked = make_runner(output)
+    summary = runner.run(ITEMS)
+    assert asked == ["b"]
+    assert summary["answered"] == 1 and summary["failed"] == 0
+    assert read_checkpoint(str(output)) == {"a", "b", "c"}
+
+
+def test_without_resume_the_output_is_overwritten(tmp_path):
+    output = tmp_path / "out.jsonl"
+    make_runner(output)[0].run(ITEMS)
+    runner, asked = make_runner(output)
+    runner.run(ITEMS[:1], resume=False)
+    assert asked == ["a"]
+    assert [r["id"] for r in read_records(output)] == ["a"]
+    assert read_records(output)[0]["status"] == STATUS_OK
+
+
+def test_load_questions_uses_ids_or_line_numbers(tmp_path):
+    path = tmp_path / "questions.jsonl"
+    path.write_text('{"id": "q1", "question": " First? "}\n\n{"question": "Second?"}\n', encoding="utf-8")
+    assert load_questions(str(path)) == [BatchItem("q1", "First?"), BatchItem("3", "Second?")]
+
+
+@pytest.mark.parametrize("content, message", [
+    ('{"id": "q1", "question": "First?"}\n{"id": "q1", "question": "Again?"}\n', "duplicate id 'q1'"),
+    ('{"question": "First?"}\n{"question": \n', ":2: invalid JSON"),
+    ('["not", "an", "object"]\n', "expected an object"),
+    ('{"id": "q1", "question": "  "}\n', "expected an object"),
+])
+def test_load_questions_rejects_invalid_files(tmp_path, content, message):
+    path = tmp_path / "questions.jsonl"
+    path.write_text(content, encoding="utf-8")
+    with pytest.raises(ValueError, match=message):
+        load_questions(str(path))
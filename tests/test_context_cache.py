@@ -0,0 +1,199 @@
+import threading
+
+import pytest
+
+from chatbot.context_cache import CachedChatSession, ContextCacheManager, InMemoryCachingBackend
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_manager(clock=None, **kwargs):
+    backend = InMemoryCachingBackend(model_factory=lambda instruction: ("model", instruction),
+                                     fail_create=kwargs.pop("fail_create", False))
+    manager = ContextCacheManager("gemini-test", backend=backend, ttl_seconds=3600, refresh_margin_seconds=600,
+                                  retry_after_seconds=300, clock=clock or FakeClock(), **kwargs)
+    return manager, backend
+
+
+def test_creates_once_per_prompt_hash():
+    manager, backend = make_manager()
+    assert manager.get_model("hash-a", "prompt a") == ("model", "prompt a")
+    assert manager.get_model("hash-b", "prompt b") == ("model", "prompt b")
+    assert [h["system_instruction"] for h in backend.created] == ["prompt a", "prompt b"]
+    assert backend.created[0]["display_name"] == "promotool-hash-a"
+    assert manager.stats["created"] == 2
+
+
+def test_reuses_the_entry_for_later_sessions():
+    manager, backend = make_manager()
+    for _ in range(3):
+        manager.get_model("hash-a", "prompt a")
+    assert len(backend.created) == 1
+    assert manager.stats["reused"] == 2
+    assert manager.snapshot()["entries"] == {"hash-a": 3600}
+
+
+def test_refreshes_the_ttl_near_expiry():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    manager.get_model("hash-a", "prompt a")
+    clock.now += 2000
+    manager.get_model("hash-a", "prompt a")
+    assert backend.updated == []
+    clock.now += 1200  # 400 s left, within the refresh margin
+    manager.get_model("hash-a", "prompt a")
+    assert backend.updated == [("cachedContents/0", 3600)]
+    assert manager.stats["refreshed"] == 1
+    assert manager.snapshot()["entries"] == {"hash-a": 3600}
+    assert len(backend.created) == 1
+
+
+def test_recreates_an_expired_entry():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    manager.get_model("hash-a", "prompt a")
+    clock.now += 3600
+    manager.get_model("hash-a", "prompt a")
+    assert [h["name"] for h in backend.created] == ["cachedContents/0", "cachedContents/1"]
+    assert manager.stats["created"] == 2
+
+
+def test_falls_back_and_retries_after_a_failed_create():
+    clock = FakeClock()
+    manager, backend = make_manager(clock, fail_create=True)
+    assert manager.get_model("hash-a", "prompt a") is None
+    backend.fail_create = False
+    assert manager.get_model("hash-a", "prompt a") is None  # within retry_after_seconds
+    clock.now += 300
+    assert manager.get_model("hash-a", "prompt a") == ("model", "prompt a")
+    assert manager.stats["fallbacks"] == 2
+
+
+def test_evict_deletes_all_but_the_kept_hashes():
+    manager, backend = make_manager()
+    for name in ("a", "b", "c"):
+        manager.get_model(f"hash-{name}", f"prompt {name}")
+    assert manager.evict(keep_hash="hash-b") == ["hash-a", "hash-c"]
+    assert backend.deleted == ["cachedContents/0", "cachedContents/2"]
+    assert manager.evict(keep_hashes={"hash-b"}) == []
+    assert manager.evict() == ["hash-b"]
+    assert manager.stats["deleted"] == 3
+    # An evicted prompt is created again on its next use
+    manager.get_model("hash-a", "prompt a")
+    assert len(backend.created) == 4
+
+
+def test_concurrent_sessions_share_one_create_without_blocking_other_prompts():
+    manager, backend = make_manager()
+    started, release = threading.Event(), threading.Event()
+    create = backend.create
+
+    def slow_create(model_name, system_instruction, ttl_seconds, display_name):
+        if system_instruction == "prompt a":
+            started.set()
+            release.wait(5)
+        return create(model_name, system_instruction, ttl_seconds, display_name)
+    backend.create = slow_create
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(manager.get_model("hash-a", "prompt a")))
+               for _ in range(3)]
+    threads[0].start()
+    assert started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # The lock is not held during the remote create
+    assert manager.get_model("hash-b", "prompt b") == ("model", "prompt b")
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [("model", "prompt a")] * 3
+    assert [h["system_instruction"] for h in backend.created] == ["prompt b", "prompt a"]
+    assert manager.stats["reused"] == 2
+
+
+class NotFound(Exception):
+    """Named like google.api_core.exceptions.NotFound."""
+
+
+class FakeChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+        self.fail_with = None
+
+    def send_message(self, content, stream=False):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.history.append(content)
+        return (self.model, content)
+
+
+class FakeModel:
+    def __init__(self, name):
+        self.name = name
+
+    def start_chat(self, history):
+        return FakeChat(self.name, history)
+
+
+def make_session(manager, backend):
+    backend.model_for = lambda handle: FakeModel(handle["name"])
+    return CachedChatSession(manager, "hash-a", "prompt a", manager.bind("hash-a", "prompt a"),
+                             fallback_model=lambda: FakeModel("plain"))
+
+
+def test_long_conversation_extends_the_ttl_while_sending():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    session = make_session(manager, backend)
+    for _ in range(4):
+        clock.now += 3100  # past the original TTL, but within the margin at each message
+        assert session.send_message("q")[0] == "cachedContents/0"
+    assert len(backend.created) == 1
+    assert len(backend.updated) == 4
+    assert session.history == ["q"] * 4
+
+
+def test_expired_cached_context_is_recreated_with_the_history():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    session = make_session(manager, backend)
+    session.send_message("first")
+    clock.now += 4000  # no message within the TTL
+    assert session.send_message("second") == ("cachedContents/1", "second")
+    assert session.history == ["first", "second"]
+
+
+def test_cached_context_gone_on_the_server_is_recreated_and_the_message_resent():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    session = make_session(manager, backend)
+    session.send_message("first")
+    session.session.fail_with = NotFound("CachedContent not found (or permission denied)")
+    assert session.send_message("second") == ("cachedContents/1", "second")
+    assert session.history == ["first", "second"]
+
+    session.session.fail_with = ValueError("bad request")
+    with pytest.raises(ValueError):
+        session.send_message("third")
+    assert len(backend.created) == 2
+
+
+def test_falls_back_to_the_plain_prompt_when_recreating_fails():
+    clock = FakeClock()
+    manager, backend = make_manager(clock)
+    session = make_session(manager, backend)
+    session.send_message("first")
+    backend.fail_create = True
+    clock.now += 4000
+    assert session.send_message("second") == ("plain", "second")
+    clock.now += 4000
+    assert session.send_message("third") == ("plain", "third")
+    assert session.history == ["first", "second", "third"]
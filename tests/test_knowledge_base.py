@@ -0,0 +1,14 @@
+import os
+import pickle
+
+from chatbot.knowledge_base import KPI, load_knowledge_base
+
+SETTINGS_TABLES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src", "chatbot",
+                                                    "config_data", "settings_tables"))
+
+
+def test_record_types_belong_to_the_module_and_pickle():
+    assert KPI.__module__ == "chatbot.knowledge_base"
+    kpi = next(iter(load_knowledge_base(SETTINGS_TABLES_PATH).kpi_by_id.values()))
+    copy = pickle.loads(pickle.dumps(kpi))
+    assert type(copy) is KPI and dict(copy) == dict(kpi)
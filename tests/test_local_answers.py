@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from chatbot.knowledge_base import load_knowledge_base
+from chatbot.local_answers import LocalAnswerEngine
+
+SETTINGS_TABLES_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src", "chatbot",
+                                                    "config_data", "settings_tables"))
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return LocalAnswerEngine(load_knowledge_base(SETTINGS_TABLES_PATH))
+
+
+@pytest.mark.parametrize("question", [
+    "Який ID у kpi_other_baseline?",
+    "Який тип даних у kpi_SentToApprove?",
+    "Яка формула kpi_ActNetRevenueSKU?",
+    "Звідки читається kpi_other_baseline?",
+    "Яке джерело даних у kpi_factNumberOfPromoRead?",
+    "Який тип і область застосування kpi_Manual_Adjustment_VBB?",
+    "What is the data type of kpi_ForecastPromoVolume?",
+])
+def test_single_kpi_lookups_are_answered_locally(engine, question):
+    assert engine.answer(question) is not None
+
+
+@pytest.mark.parametrize("question", [
+    # Reverse lookups: the answer is about other KPIs
+    "Which KPIs have a formula that uses kpi_other_baseline?",
+    "Які KPI вичитуються з того ж джерела, що і kpi_other_baseline?",
+    # Hypotheticals and conditions
+    "Чи може kpi_other_baseline мати тип Edit замість Read?",
+    "Що повертає формула kpi_InOutGuideline, якщо значення порожнє?",
+    # A lookup combined with another ask
+    "Де в інтерфейсі знайти kpi_other_baseline і яка у нього назва?",
+])
+def test_questions_that_are_not_plain_lookups_go_to_the_model(engine, question):
+    assert engine.answer(question) is None
+    assert engine.stats()["skipped_not_lookup"] >= 1
+
+
+def test_explanations_and_unknown_kpis_go_to_the_model(engine):
+    assert engine.answer("Поясни формулу kpi_ActNetRevenueSKU") is None
+    assert engine.answer("Яка формула kpi_does_not_exist?") is None
+    assert engine.answer("Яка формула kpi_ActNetRevenueSKU і kpi_SentToApprove?") is None
@@ -0,0 +1,32 @@
+from chatbot.prompt_cache import PromptArtifactCache
+
+
+def make_cache(tmp_path):
+    template = tmp_path / "prompt.md"
+    template.write_text("Prompt {data}", encoding="utf-8")
+    tables = tmp_path / "tables"
+    tables.mkdir()
+    (tables / "kpis.csv").write_text("id,name\n1,kpi_a\n", encoding="utf-8")
+    return PromptArtifactCache(str(template), str(tables)), tables
+
+
+def test_plain_builder_is_called_without_arguments(tmp_path):
+    cache, _ = make_cache(tmp_path)
+    artifact = cache.get(lambda *args: f"built with {len(args)} arguments")
+    assert artifact.text == "built with 0 arguments"
+
+
+def test_incremental_builder_gets_the_previous_artifact_and_changed_files(tmp_path):
+    cache, tables = make_cache(tmp_path)
+    calls = []
+
+    def builder(previous, changed_files):
+        calls.append((previous, changed_files))
+        return f"version {len(calls)}"
+
+    first = cache.get(builder, incremental=True)
+    assert calls == [(None, frozenset({"prompt.md", "kpis.csv"}))]
+    (tables / "kpis.csv").write_text("id,name\n1,kpi_renamed\n", encoding="utf-8")
+    second = cache.get(builder, incremental=True)
+    assert calls[1] == (first, frozenset({"kpis.csv"}))
+    assert second.version == 2 and second.text == "version 2"
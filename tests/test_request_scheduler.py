@@ -0,0 +1,193 @@
+import random
+import threading
+import time
+
+import pytest
+
+from chatbot.request_scheduler import RequestScheduler, SchedulerTimeout, TokenBucket
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ResourceExhausted(Exception):
+    """Named like google.api_core.exceptions.ResourceExhausted (HTTP 429)."""
+
+
+class Usage:
+    def __init__(self, total_token_count: int):
+        self.total_token_count = total_token_count
+
+
+class Stream:
+    def __init__(self, chunks, error=None, total_tokens=None):
+        self.chunks = chunks
+        self.error = error
+        self.usage_metadata = Usage(total_tokens) if total_tokens else None
+
+    def __iter__(self):
+        yield from self.chunks
+        if self.error is not None:
+            raise self.error
+
+
+class FakeChatSession:
+    """Returns (or raises) the given results in turn and records every message sent."""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.sent = []
+
+    def send_message(self, message, stream=True):
+        self.sent.append(message)
+        result = self.results.pop(0) if self.results else Stream(["chunk"])
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+def make_scheduler(clock=None, **kwargs):
+    sleeps = []
+    kwargs.setdefault("requests_per_minute", 1000)
+    kwargs.setdefault("tokens_per_minute", 1_000_000)
+    scheduler = RequestScheduler(sleep=sleeps.append, rng=random.Random(0), clock=clock or FakeClock(), **kwargs)
+    return scheduler, sleeps
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_token_bucket_refills_at_its_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=60, per_second=1, clock=clock)
+    bucket.consume(60)
+    assert bucket.wait_time(10) == 10
+    clock.now += 4
+    assert bucket.wait_time(10) == 6
+    clock.now += 1000
+    assert bucket.wait_time(10) == 0
+    assert bucket.level == 60
+
+
+def test_requests_per_minute_throttle_until_the_bucket_refills():
+    clock = FakeClock()
+    scheduler, _ = make_scheduler(clock, requests_per_minute=1, max_wait_seconds=0)
+    list(scheduler.send_message("a", FakeChatSession(), "first", estimated_tokens=10))
+    with pytest.raises(SchedulerTimeout):
+        scheduler.send_message("a", FakeChatSession(), "second", estimated_tokens=10)
+    assert scheduler.stats["timeouts"] == 1
+
+    clock.now += 60
+    chat = FakeChatSession()
+    list(scheduler.send_message("a", chat, "second", estimated_tokens=10))
+    assert chat.sent == ["second"]
+    assert scheduler.snapshot()["queue_depth"] == 0
+
+
+def test_waiting_requests_are_served_round_robin_across_sessions():
+    scheduler, _ = make_scheduler(max_concurrency=1)
+    held = scheduler.send_message("holder", FakeChatSession(), "hold", estimated_tokens=1)
+    admitted = []
+
+    def ask(session_id, label):
+        response = scheduler.send_message(session_id, FakeChatSession(), label, estimated_tokens=1)
+        admitted.append(label)
+        list(response)
+
+    threads = []
+    for session_id, label in (("a", "a1"), ("a", "a2"), ("b", "b1")):
+        thread = threading.Thread(target=ask, args=(session_id, label))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: scheduler._waiting == len(threads))
+
+    list(held)
+    for thread in threads:
+        thread.join(5)
+    assert admitted == ["a1", "b1", "a2"]
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_transient_error_before_the_first_chunk_is_retried():
+    scheduler, sleeps = make_scheduler(backoff_base_seconds=1.0)
+    chat = FakeChatSession(ResourceExhausted("quota"), Stream(["hello"]))
+    response = scheduler.send_message("a", chat, "question", estimated_tokens=10)
+    assert list(response) == ["hello"]
+    assert chat.sent == ["question", "question"]
+    assert scheduler.stats["retries"] == 1
+    assert len(sleeps) == 1 and 0 <= sleeps[0] <= 1.0
+
+
+def test_other_errors_and_exhausted_retries_are_raised():
+    scheduler, sleeps = make_scheduler(max_retries=1)
+    with pytest.raises(ValueError):
+        scheduler.send_message("a", FakeChatSession(ValueError("bad request")), "q", estimated_tokens=10)
+    assert sleeps == []
+
+    chat = FakeChatSession(ResourceExhausted("quota"), ResourceExhausted("quota"))
+    with pytest.raises(ResourceExhausted):
+        scheduler.send_message("a", chat, "q", estimated_tokens=10)
+    assert len(chat.sent) == 2
+    assert scheduler.stats["failures"] == 2
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_error_after_the_first_chunk_is_not_retried():
+    scheduler, sleeps = make_scheduler()
+    chat = FakeChatSession(Stream(["partial"], error=ResourceExhausted("quota")))
+    response = scheduler.send_message("a", chat, "question", estimated_tokens=10)
+    chunks = []
+    with pytest.raises(ResourceExhausted):
+        for chunk in response:
+            chunks.append(chunk)
+    assert chunks == ["partial"]
+    assert chat.sent == ["question"]
+    assert sleeps == []
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_slot_is_held_until_the_stream_ends_and_tokens_are_corrected():
+    scheduler, _ = make_scheduler(tokens_per_minute=1000)
+    response = scheduler.send_message("a", FakeChatSession(Stream(["x"], total_tokens=150)), "q",
+                                      estimated_tokens=100)
+    assert scheduler.snapshot()["in_flight"] == 1
+    assert scheduler.tpm.level == 900
+    list(response)
+    snapshot = scheduler.snapshot()
+    assert snapshot["in_flight"] == 0
+    assert snapshot["tpm_available"] == 850
+
+
+def test_closing_an_unconsumed_stream_releases_the_slot_once():
+    scheduler, _ = make_scheduler()
+    response = scheduler.send_message("a", FakeChatSession(), "q", estimated_tokens=10)
+    response.close()
+    response.close()
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_stats_add_up_under_concurrent_requests():
+    scheduler, _ = make_scheduler(clock=time.monotonic, max_concurrency=4)
+
+    def converse(session_id):
+        for _ in range(20):
+            chat = FakeChatSession(ResourceExhausted("quota"), Stream(["answer"]))
+            list(scheduler.send_message(session_id, chat, "q", estimated_tokens=10))
+
+    threads = [threading.Thread(target=converse, args=(f"s{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    snapshot = scheduler.snapshot()
+    assert snapshot["requests"] == 160 and snapshot["retries"] == 160 and snapshot["failures"] == 0
+    assert snapshot["in_flight"] == 0 and snapshot["total_wait_seconds"] >= 0
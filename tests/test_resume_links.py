@@ -0,0 +1,30 @@
+from chatbot.resume_links import RESUME_LINK_SECRET_ENV, ResumeLinks, load_secret
+
+
+def test_token_round_trips_to_the_conversation_id():
+    links = ResumeLinks(b"secret")
+    token = links.token("abc123")
+    assert token.startswith("abc123.")
+    assert links.conversation_id(token) == "abc123"
+
+
+def test_bare_forged_and_foreign_tokens_are_rejected():
+    links = ResumeLinks(b"secret")
+    token = links.token("abc123")
+    assert links.conversation_id("abc123") is None
+    assert links.conversation_id(None) is None
+    assert links.conversation_id("abc123." + "0" * 32) is None
+    assert links.conversation_id(token.replace("abc123", "abc124")) is None
+    assert ResumeLinks(b"other secret").conversation_id(token) is None
+
+
+def test_generated_secret_is_kept_across_loads(tmp_path, monkeypatch):
+    monkeypatch.delenv(RESUME_LINK_SECRET_ENV, raising=False)
+    path = str(tmp_path / "resume_link.key")
+    secret = load_secret(path)
+    assert len(secret) == 32
+    assert load_secret(path) == secret
+    assert [p.name for p in tmp_path.iterdir()] == ["resume_link.key"]
+
+    monkeypatch.setenv(RESUME_LINK_SECRET_ENV, "from-env")
+    assert load_secret(path) == b"from-env"
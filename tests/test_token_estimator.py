@@ -0,0 +1,53 @@
+import json
+import threading
+
+from chatbot.token_estimator import DEFAULT_COEFFICIENTS, TokenEstimator
+
+
+def real_count(text: str) -> int:
+    return len(text) // 3
+
+
+def test_verify_records_one_sample_per_text_and_refits(tmp_path):
+    path = tmp_path / "calibration.json"
+    estimator = TokenEstimator(str(path))
+    for _ in range(3):
+        assert estimator.verify("Привіт, PromoTool 2025", label="prompt", counter=real_count) == 7
+    assert len(json.loads(path.read_text(encoding="utf-8"))["samples"]) == 1
+    assert estimator.coefficients != DEFAULT_COEFFICIENTS
+    assert TokenEstimator(str(path)).coefficients == estimator.coefficients
+
+
+def test_calibration_set_is_capped_and_written_atomically(tmp_path):
+    path = tmp_path / "calibration.json"
+    estimator = TokenEstimator(str(path), max_samples=4)
+    texts = [f"{'Ціна KPI ' * i} value {i}" for i in range(1, 9)]
+    threads = [threading.Thread(target=lambda t=t: [estimator.verify(t, counter=real_count) for _ in range(3)])
+               for t in texts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(json.loads(path.read_text(encoding="utf-8"))["samples"]) == 4
+    assert [p.name for p in tmp_path.iterdir()] == ["calibration.json"]
+    assert estimator.error_report()["samples"] == 4
+
+
+def test_verify_without_a_counter_estimates(tmp_path):
+    estimator = TokenEstimator(str(tmp_path / "calibration.json"))
+    assert estimator.verify("text") == estimator.estimate("text")
+    assert not (tmp_path / "calibration.json").exists()
+
+
+def test_verified_counts_are_remembered_per_text(tmp_path):
+    calls = []
+
+    def counter(text: str) -> int:
+        calls.append(text)
+        return real_count(text)
+
+    estimator = TokenEstimator(str(tmp_path / "cache" / "calibration.json"))
+    assert [estimator.verify(t, counter=counter) for t in ("prompt a", "prompt a", "prompt b")] == [2, 2, 2]
+    assert calls == ["prompt a", "prompt b"]
+    assert estimator.verify_hits == 1
+    assert (tmp_path / "cache" / "calibration.json").exists()